@@ -28,10 +28,12 @@ from __future__ import print_function
 import abc
 import collections
 import json
+import struct
 
 # GOOGLE-INITIALIZATION
 
 import numpy as np
+import six
 import tensorflow as tf
 from tensorflow_transform import nodes
 
@@ -174,7 +176,7 @@ class Combiner(object):
 
   @property
   def accumulator_coder(self):
-    return JsonNumpyCacheCoder()
+    return BinaryNumpyCacheCoder()
 
 
 class CacheCoder(object):
@@ -185,6 +187,15 @@ class CacheCoder(object):
   def __repr__(self):
     return '<{}>'.format(self.__class__.__name__)
 
+  @property
+  def hashed_repr(self):
+    """The representation of this coder in the paths of cacheable operations.
+
+    Cache entry keys are derived from these paths, so a coder which can decode
+    the cache entries of another coder should use the same `hashed_repr`.
+    """
+    return repr(self)
+
   @abc.abstractmethod
   def encode_cache(self, cache):
     pass
@@ -201,7 +212,184 @@ class JsonNumpyCacheCoder(CacheCoder):
     return tf.compat.as_bytes(json.dumps(np.array(accumulator).tolist()))
 
   def decode_cache(self, encoded_accumulator):
-    return np.array(json.loads(tf.compat.as_text(encoded_accumulator)))
+    accumulator = json.loads(tf.compat.as_text(encoded_accumulator))
+    # Combiners may produce a `None` accumulator when they have seen no inputs.
+    if accumulator is None:
+      return None
+    return np.array(accumulator)
+
+
+# Prefix of cache entries encoded by the binary coders below.  Cache entries
+# written by the JSON coders never start with a NUL byte, which allows decoding
+# both formats.
+_BINARY_CACHE_HEADER = b'\x00tft\x01'
+
+_UINT8 = struct.Struct('<B')
+_UINT64 = struct.Struct('<Q')
+_INT64 = struct.Struct('<q')
+_FLOAT64 = struct.Struct('<d')
+
+
+def _encode_binary(value, pieces):
+  """Appends a binary encoding of `value` to the list `pieces`.
+
+  Supports None, bytes, text, python ints and floats, lists, tuples (including
+  namedtuples, which are decoded as plain tuples), and numpy arrays and scalars.
+  Numeric numpy values are encoded as dtype-tagged raw buffers.
+
+  Args:
+    value: The value to encode.
+    pieces: A list of bytes to append the encoding to.
+
+  Raises:
+    TypeError: If `value` contains a value of an unsupported type.
+  """
+  if value is None:
+    pieces.append(b'N')
+  elif isinstance(value, bytes):
+    pieces.extend((b'B', _UINT64.pack(len(value)), value))
+  elif isinstance(value, six.text_type):
+    encoded = value.encode('utf-8')
+    pieces.extend((b'U', _UINT64.pack(len(encoded)), encoded))
+  elif isinstance(value, (list, tuple)):
+    pieces.extend((b'L' if isinstance(value, list) else b'T',
+                   _UINT64.pack(len(value))))
+    for item in value:
+      _encode_binary(item, pieces)
+  elif (isinstance(value, six.integer_types) and
+        not isinstance(value, (bool, np.bool_))):
+    if -2**63 <= value < 2**63:
+      pieces.extend((b'I', _INT64.pack(value)))
+    else:
+      encoded = tf.compat.as_bytes(str(value))
+      pieces.extend((b'J', _UINT64.pack(len(encoded)), encoded))
+  elif isinstance(value, float):
+    pieces.extend((b'F', _FLOAT64.pack(value)))
+  else:
+    array = np.asarray(value)
+    shape = b''.join(_UINT64.pack(dim) for dim in array.shape)
+    if array.dtype.hasobject:
+      if not array.ndim:
+        raise TypeError('Unsupported cache value {!r} of type {}'.format(
+            value, type(value)))
+      pieces.extend((b'O', _UINT8.pack(array.ndim), shape))
+      for item in array.ravel():
+        _encode_binary(item, pieces)
+    else:
+      dtype = tf.compat.as_bytes(array.dtype.str)
+      pieces.extend((b'A', _UINT8.pack(len(dtype)), dtype,
+                     _UINT8.pack(array.ndim), shape,
+                     np.ascontiguousarray(array).tobytes()))
+
+
+class _BinaryDecoder(object):
+  """Decodes values encoded by `_encode_binary`."""
+
+  def __init__(self, encoded, offset=0):
+    self._encoded = encoded
+    self._offset = offset
+
+  def _read(self, size):
+    start = self._offset
+    self._offset += size
+    if self._offset > len(self._encoded):
+      raise ValueError('Truncated binary cache entry')
+    return self._encoded[start:self._offset]
+
+  def _read_bytes(self, size):
+    return self._read(size).tobytes()
+
+  def _unpack(self, struct_format):
+    return struct_format.unpack(self._read_bytes(struct_format.size))[0]
+
+  def _read_shape(self):
+    ndim = self._unpack(_UINT8)
+    return tuple(self._unpack(_UINT64) for _ in range(ndim))
+
+  def decode(self):
+    """Decodes the next value."""
+    tag = self._read(1)
+    if tag == b'N':
+      return None
+    if tag == b'B':
+      return self._read_bytes(self._unpack(_UINT64))
+    if tag == b'U':
+      return self._read_bytes(self._unpack(_UINT64)).decode('utf-8')
+    if tag in (b'L', b'T'):
+      items = [self.decode() for _ in range(self._unpack(_UINT64))]
+      return items if tag == b'L' else tuple(items)
+    if tag == b'I':
+      return self._unpack(_INT64)
+    if tag == b'J':
+      return int(self._read_bytes(self._unpack(_UINT64)))
+    if tag == b'F':
+      return self._unpack(_FLOAT64)
+    if tag == b'O':
+      shape = self._read_shape()
+      array = np.empty(shape, dtype=object)
+      for index in range(array.size):
+        array.flat[index] = self.decode()
+      return array
+    if tag == b'A':
+      dtype = np.dtype(
+          tf.compat.as_str(self._read_bytes(self._unpack(_UINT8))))
+      shape = self._read_shape()
+      size = int(np.prod(shape, dtype=np.int64))
+      buf = self._read(size * dtype.itemsize)
+      # Copy so that the decoded array is writable and does not keep the whole
+      # encoded cache entry alive.
+      array = np.frombuffer(buf, dtype=dtype, count=size).reshape(shape).copy()
+      # 0-d arrays are decoded as numpy scalars so that they remain hashable.
+      return array[()] if not shape else array
+    raise ValueError('Unknown binary cache tag: {!r}'.format(tag))
+
+  @property
+  def exhausted(self):
+    return self._offset == len(self._encoded)
+
+
+def encode_binary_cache(value):
+  """Encodes a value as a binary cache entry."""
+  pieces = [_BINARY_CACHE_HEADER]
+  _encode_binary(value, pieces)
+  return b''.join(pieces)
+
+
+def is_binary_cache(encoded_cache):
+  """Returns whether `encoded_cache` was encoded by `encode_binary_cache`."""
+  return (isinstance(encoded_cache, bytes) and
+          encoded_cache.startswith(_BINARY_CACHE_HEADER))
+
+
+def decode_binary_cache(encoded_cache):
+  """Decodes a cache entry encoded by `encode_binary_cache`."""
+  decoder = _BinaryDecoder(memoryview(encoded_cache), len(_BINARY_CACHE_HEADER))
+  result = decoder.decode()
+  if not decoder.exhausted:
+    raise ValueError('Trailing bytes in binary cache entry')
+  return result
+
+
+class BinaryNumpyCacheCoder(CacheCoder):
+  """Encodes accumulators of numpy values as compact, dtype-preserving bytes.
+
+  Cache entries previously written by `JsonNumpyCacheCoder` can still be
+  decoded.
+  """
+
+  @property
+  def hashed_repr(self):
+    # Keeps the cache entry keys of accumulators cached by JsonNumpyCacheCoder,
+    # which this coder decodes.
+    return JsonNumpyCacheCoder().hashed_repr
+
+  def encode_cache(self, accumulator):
+    return encode_binary_cache(accumulator)
+
+  def decode_cache(self, encoded_accumulator):
+    if is_binary_cache(encoded_accumulator):
+      return decode_binary_cache(encoded_accumulator)
+    return JsonNumpyCacheCoder().decode_cache(encoded_accumulator)
 
 
 class AnalyzerDef(nodes.OperationDef):
@@ -351,6 +539,65 @@ class CacheableCombinePerKeyMerge(CacheableCombineMerge):
     ]
 
 
+class CacheableCombineMergeAccumulators(
+    collections.namedtuple('CacheableCombineMergeAccumulators',
+                           ['combiner', 'label']), nodes.OperationDef):
+  """An operation that merges accumulators without extracting outputs.
+
+  This is used to compact the cache of a `CacheableCombineAccumulate` over
+  several dataset keys into a single accumulator.
+
+  This operation is implemented by
+  `tensorflow_transform.beam.analyzer_impls._MergeAccumulatorsOnlyCombineImpl`.
+
+  Fields:
+    combiner: The Combiner to use for merging.
+    label: A unique label for this operation.
+  """
+
+  def __new__(cls, combiner, label=None):
+    if label is None:
+      scope = tf.compat.v1.get_default_graph().get_name_scope()
+      label = '{}[{}]'.format(cls.__name__, scope)
+    return super(CacheableCombineMergeAccumulators, cls).__new__(
+        cls, combiner=combiner, label=label)
+
+  @property
+  def num_outputs(self):
+    return 1
+
+  @property
+  def is_partitionable(self):
+    return True
+
+  @property
+  def cache_coder(self):
+    return self.combiner.accumulator_coder
+
+
+class CacheableCombinePerKeyMergeAccumulators(
+    CacheableCombineMergeAccumulators):
+  """An operation that merges keyed accumulators without extracting outputs.
+
+  This is used to compact the cache of a `CacheableCombinePerKeyAccumulate`
+  over several dataset keys.
+
+  This operation is implemented by
+  `tensorflow_transform.beam.analyzer_impls._MergeAccumulatorsOnlyCombinePerKeyImpl`.
+
+  Fields:
+    combiner: The Combiner to use for merging.
+    label: A unique label for this operation.
+  """
+
+  def __new__(cls, combiner, label=None):
+    if label is None:
+      scope = tf.compat.v1.get_default_graph().get_name_scope()
+      label = '{}[{}]'.format(cls.__name__, scope)
+    return super(CacheableCombinePerKeyMergeAccumulators, cls).__new__(
+        cls, combiner=combiner, label=label)
+
+
 class VocabularyAccumulate(
     collections.namedtuple('VocabularyAccumulate',
                            ['vocab_ordering_type', 'input_dtype', 'label']),
@@ -384,33 +631,62 @@ class VocabularyAccumulate(
     return _VocabularyAccumulatorCoder(input_dtype=self.input_dtype)
 
 
+class VocabularyMergeAccumulators(
+    collections.namedtuple('VocabularyMergeAccumulators',
+                           ['vocab_ordering_type', 'input_dtype', 'label']),
+    nodes.OperationDef):
+  """An operation that merges vocabulary accumulators of (token, num) pairs.
+
+  Unlike `VocabularyMerge` this produces an accumulator, and is used to compact
+  the cache of a `VocabularyAccumulate` over several dataset keys.
+
+  This operation is implemented by
+  `tensorflow_transform.beam.analyzer_impls.VocabularyMergeAccumulatorsImpl`.
+  """
+
+  def __new__(cls, vocab_ordering_type, input_dtype=tf.string.name, label=None):
+    if label is None:
+      scope = tf.compat.v1.get_default_graph().get_name_scope()
+      label = '{}[{}]'.format(cls.__name__, scope)
+    return super(VocabularyMergeAccumulators, cls).__new__(
+        cls,
+        vocab_ordering_type=vocab_ordering_type,
+        input_dtype=input_dtype,
+        label=label)
+
+  @property
+  def num_outputs(self):
+    return 1
+
+  @property
+  def is_partitionable(self):
+    return True
+
+  @property
+  def cache_coder(self):
+    return _VocabularyAccumulatorCoder(input_dtype=self.input_dtype)
+
+
 class _VocabularyAccumulatorCoder(CacheCoder):
-  """Coder for vocabulary accumulators."""
+  """Coder for vocabulary accumulators.
+
+  Accumulators are encoded using the binary cache format.  Cache entries
+  previously written as JSON can still be decoded.
+  """
 
   def __init__(self, input_dtype=tf.string.name):
     self._input_dtype = tf.dtypes.as_dtype(input_dtype)
 
   def encode_cache(self, accumulator):
-    # Need to wrap in np.array and call tolist to make it JSON serializable.
     token, value = accumulator
-    if self._input_dtype == tf.string:
-      token = tf.compat.as_text(token)
-    # If the value is a _WeightedMeanAndVarAccumulator, cast each field to a
-    # list for serialization.
-    try:
-      value = value._replace(
-          count=value.count.tolist(),
-          mean=value.mean.tolist(),
-          variance=value.variance.tolist(),
-          weight=value.weight.tolist())
-    except AttributeError:
-      pass
-    accumulator = (token, value)
-    return tf.compat.as_bytes(
-        json.dumps(np.array(accumulator, dtype=object).tolist()))
+    return encode_binary_cache((token, value))
 
   def decode_cache(self, encoded_accumulator):
+    if is_binary_cache(encoded_accumulator):
+      return decode_binary_cache(encoded_accumulator)
+    return self._decode_json_cache(encoded_accumulator)
 
+  def _decode_json_cache(self, encoded_accumulator):
     accumulator = json.loads(tf.compat.as_text(encoded_accumulator))
     token, value = accumulator
     try:
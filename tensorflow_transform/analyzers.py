@@ -201,6 +201,90 @@ class NumPyCombiner(analyzer_nodes.Combiner):
     ]
 
 
+class _InPlaceNumPyCombiner(NumPyCombiner):
+  """Combines the PCollection on the 0th dimension using an in-place ufunc.
+
+  Unlike `NumPyCombiner`, which allocates a new array for every batch and stacks
+  all accumulators when merging, this folds each batch into a preallocated
+  accumulator using `ufunc(accumulator, value, out=accumulator)`.  Accumulators
+  are lists of ndarrays of the output dtypes, so they remain compatible with
+  `NumPyCombiner` accumulators (including cached ones).
+
+  When no inputs were seen the outputs are filled with the identity of the
+  reduction, as long as the output shapes are fully defined.
+
+  Args:
+    fn: A binary numpy ufunc, one of np.add, np.maximum or np.fmax.
+    output_dtypes: The numpy dtype to cast each output to.
+    output_shapes: The shapes of the outputs.
+  """
+
+  def __repr__(self):
+    # The repr of a combiner is part of the hashed path of its analyzer, and so
+    # of its cache entry keys.  Accumulators are compatible with those of
+    # `NumPyCombiner`, so this keeps the keys of the existing cache.
+    return '<NumPyCombiner>'
+
+  def add_input(self, accumulator, batch_values):
+    # TODO(b/112414577): Go back to accepting only a single input.
+    # See comment in _numeric_combine.
+    if accumulator is None:
+      return self._copy_as_accumulator(batch_values)
+    for sub_accumulator, value in zip(accumulator, batch_values):
+      self._fn(sub_accumulator, value, out=sub_accumulator, casting='unsafe')
+    return accumulator
+
+  def merge_accumulators(self, accumulators):
+    # The first accumulator is copied rather than reused since it may be an
+    # element of the input PCollection, e.g. when it was decoded from cache.
+    result = None
+    for accumulator in accumulators:
+      if accumulator is None:
+        continue
+      if result is None:
+        result = self._copy_as_accumulator(accumulator)
+        continue
+      for sub_result, sub_accumulator in zip(result, accumulator):
+        self._fn(sub_result, sub_accumulator, out=sub_result, casting='unsafe')
+    return result
+
+  def extract_output(self, accumulator):
+    if accumulator is None:
+      return self._default_output()
+    return super(_InPlaceNumPyCombiner, self).extract_output(accumulator)
+
+  @property
+  def has_default_output(self):
+    """Whether `extract_output` can produce outputs for a `None` accumulator."""
+    return all(
+        tf.TensorShape(shape).is_fully_defined()
+        for shape in self._output_shapes)
+
+  def _copy_as_accumulator(self, values):
+    return [
+        np.array(value, dtype=output_dtype)
+        for value, output_dtype in zip(values, self._output_dtypes)
+    ]
+
+  def _default_value(self, dtype):
+    if self._fn is np.add:
+      return 0
+    # Max reductions use the same missing value as
+    # tf_utils.reduce_batch_minus_min_and_max uses for batches without values.
+    if np.issubdtype(dtype, np.floating):
+      return np.nan
+    return np.iinfo(dtype).min + 1
+
+  def _default_output(self):
+    if not self.has_default_output:
+      return None
+    return [
+        np.full(
+            tf.TensorShape(shape).as_list(), self._default_value(dtype), dtype)
+        for dtype, shape in zip(self._output_dtypes, self._output_shapes)
+    ]
+
+
 def _get_output_shape_from_input(x):
   if isinstance(x, tf.SparseTensor):
     return x.get_shape()[1:]
@@ -223,8 +307,8 @@ def _numeric_combine(inputs,
 
   Args:
     inputs: A list of tensors, which will be independently reduced.
-    fn: A function to reduce tensors across instances/batches, to get a single
-        output.
+    fn: A binary numpy ufunc used to reduce tensors across instances/batches,
+        to get a single output. One of np.add, np.maximum or np.fmax.
     reduce_instance_dims: By default collapses the batch and instance dimensions
         to arrive at a single scalar output. If False, only collapses the batch
         dimension and outputs a vector of the same shape as the input.
@@ -248,7 +332,7 @@ def _numeric_combine(inputs,
   else:
     # Reducing over batch dimensions.
     output_shapes = [x.get_shape() for x in inputs]
-  combiner = NumPyCombiner(
+  combiner = _InPlaceNumPyCombiner(
       fn, [dtype.as_numpy_dtype for dtype in output_dtypes], output_shapes)
   return _apply_cacheable_combiner(combiner, *inputs)
 
@@ -318,10 +402,10 @@ def _min_and_max(x, reduce_instance_dims=True, name=None):
     TypeError: If the type of `x` is not supported.
   """
   with tf.compat.v1.name_scope(name, 'min_and_max'):
-    combine_fn = np.max
+    combine_fn = np.maximum
     if (not reduce_instance_dims and isinstance(x, tf.SparseTensor) and
         x.dtype.is_floating):
-      combine_fn = np.nanmax
+      combine_fn = np.fmax
 
     output_dtype = x.dtype
 
@@ -333,15 +417,11 @@ def _min_and_max(x, reduce_instance_dims=True, name=None):
     return tf.cast(0 - minus_x_min, output_dtype), tf.cast(x_max, output_dtype)
 
 
-def _sum_combine_fn_and_dtype(input_dtype):
+def _get_sum_output_dtype(input_dtype):
   output_dtype = _SUM_OUTPUT_DTYPE_MAP.get(input_dtype)
   if output_dtype is None:
     raise TypeError('Tensor type %r is not supported' % input_dtype)
-
-  def sum_fn_with_dtype(a, axis=None):
-    return np.sum(a, axis=axis, dtype=output_dtype.as_numpy_dtype)
-
-  return output_dtype, sum_fn_with_dtype
+  return output_dtype
 
 
 def sum(x, reduce_instance_dims=True, name=None):  # pylint: disable=redefined-builtin
@@ -379,8 +459,8 @@ def sum(x, reduce_instance_dims=True, name=None):  # pylint: disable=redefined-b
       x = tf.sparse.reduce_sum(x, axis=0)
     else:
       x = tf.reduce_sum(input_tensor=x, axis=0)
-    output_dtype, sum_fn = _sum_combine_fn_and_dtype(x.dtype)
-    return _numeric_combine([x], sum_fn, reduce_instance_dims,
+    output_dtype = _get_sum_output_dtype(x.dtype)
+    return _numeric_combine([x], np.add, reduce_instance_dims,
                             [output_dtype])[0]
 
 
@@ -62,6 +62,53 @@ _SUM_OF_SIZE_ZERO_TENSORS_TEST = dict(
     expected_outputs=[np.array([], np.int64) * 2],
 )
 
+_IN_PLACE_SUM_TEST = dict(
+    testcase_name='InPlaceSum',
+    combiner=analyzers._InPlaceNumPyCombiner(
+        np.add, output_dtypes=[np.int64], output_shapes=[(6,)]),
+    batches=[
+        (np.array([1, 2, 3, 4, 5, 6], np.int32),),
+        (np.array([1, 2, 3, 4, 5, 6], np.int32),),
+        (np.array([1, 2, 3, 4, 5, 6], np.int32),),
+    ],
+    expected_outputs=[np.array([3, 6, 9, 12, 15, 18])],
+)
+
+_IN_PLACE_SUM_SCALAR_TEST = dict(
+    testcase_name='InPlaceSumScalar',
+    combiner=analyzers._InPlaceNumPyCombiner(
+        np.add, output_dtypes=[np.float32], output_shapes=[()]),
+    batches=[
+        (np.array(1.5, np.float32),),
+        (np.array(2.5, np.float32),),
+    ],
+    expected_outputs=[np.array(4, np.float32)],
+)
+
+_IN_PLACE_MAX_TEST = dict(
+    testcase_name='InPlaceMax',
+    combiner=analyzers._InPlaceNumPyCombiner(
+        np.maximum,
+        output_dtypes=[np.int64, np.int64],
+        output_shapes=[(3,), (3,)]),
+    batches=[
+        (np.array([-1, 2, 3]), np.array([1, 2, 3])),
+        (np.array([4, 0, -3]), np.array([7, -2, 3])),
+    ],
+    expected_outputs=[np.array([4, 2, 3]), np.array([7, 2, 3])],
+)
+
+_IN_PLACE_MAX_IGNORE_NAN_TEST = dict(
+    testcase_name='InPlaceMaxIgnoreNaN',
+    combiner=analyzers._InPlaceNumPyCombiner(
+        np.fmax, output_dtypes=[np.float32], output_shapes=[(None,)]),
+    batches=[
+        (np.array([np.nan, 2, np.nan], np.float32),),
+        (np.array([4, np.nan, np.nan], np.float32),),
+    ],
+    expected_outputs=[np.array([4, 2, np.nan], np.float32)],
+)
+
 _COVARIANCE_SIZE_ZERO_TENSORS_TEST = dict(
     testcase_name='CovarianceSizeZeroTensors',
     combiner=analyzers.CovarianceCombiner(numpy_dtype=np.float64),
@@ -275,6 +322,10 @@ class AnalyzersTest(test_case.TransformTestCase):
       _SUM_TEST,
       _SUM_SCALAR_TEST,
       _SUM_OF_SIZE_ZERO_TENSORS_TEST,
+      _IN_PLACE_SUM_TEST,
+      _IN_PLACE_SUM_SCALAR_TEST,
+      _IN_PLACE_MAX_TEST,
+      _IN_PLACE_MAX_IGNORE_NAN_TEST,
       _COVARIANCE_SIZE_ZERO_TENSORS_TEST,
       _COVARIANCE_WITH_DEGENERATE_COVARIANCE_MATRIX_TEST,
       _COVARIANCE_WITH_LARGE_NUMBERS_TEST,
@@ -326,6 +377,71 @@ class AnalyzersTest(test_case.TransformTestCase):
                        tf.as_dtype(expected_output.dtype))
       self.assertAllEqual(output, expected_output)
 
+  def testInPlaceNumPyCombinerKeepsNumPyCombinerCacheKeys(self):
+    # The repr is part of the cache entry keys of the combiner's analyzer.
+    self.assertEqual(
+        repr(
+            analyzers._InPlaceNumPyCombiner(
+                np.add, output_dtypes=[np.int64], output_shapes=[(2,)])),
+        repr(
+            analyzers.NumPyCombiner(
+                np.sum, output_dtypes=[np.int64], output_shapes=[(2,)])))
+
+  def testInPlaceNumPyCombinerDoesNotModifyInputs(self):
+    combiner = analyzers._InPlaceNumPyCombiner(
+        np.add, output_dtypes=[np.int64], output_shapes=[(2,)])
+    batch = (np.array([1, 2]),)
+    accumulator = combiner.add_input(combiner.create_accumulator(), batch)
+    accumulator = combiner.add_input(accumulator, batch)
+    cached_accumulator = np.array([[10, 20]])
+    merged = combiner.merge_accumulators([None, cached_accumulator,
+                                          accumulator])
+    self.assertAllEqual(combiner.extract_output(merged)[0], [12, 24])
+    self.assertAllEqual(batch[0], [1, 2])
+    self.assertAllEqual(cached_accumulator, [[10, 20]])
+
+  @test_case.named_parameters(
+      dict(
+          testcase_name='Sum',
+          fn=np.add,
+          output_dtype=np.float32,
+          output_shape=(2,),
+          expected_output=np.array([0, 0], np.float32)),
+      dict(
+          testcase_name='MaxFloat',
+          fn=np.maximum,
+          output_dtype=np.float32,
+          output_shape=(),
+          expected_output=np.array(np.nan, np.float32)),
+      dict(
+          testcase_name='MaxInt',
+          fn=np.fmax,
+          output_dtype=np.int32,
+          output_shape=(),
+          expected_output=np.array(np.iinfo(np.int32).min + 1, np.int32)),
+      dict(
+          testcase_name='UnknownShape',
+          fn=np.add,
+          output_dtype=np.int64,
+          output_shape=(None,),
+          expected_output=None),
+  )
+  def testInPlaceNumPyCombinerDefaultOutput(self, fn, output_dtype,
+                                            output_shape, expected_output):
+    combiner = analyzers._InPlaceNumPyCombiner(
+        fn, output_dtypes=[output_dtype], output_shapes=[output_shape])
+    accumulator = combiner.merge_accumulators(
+        [combiner.create_accumulator(),
+         combiner.create_accumulator()])
+    outputs = combiner.extract_output(accumulator)
+    if expected_output is None:
+      self.assertFalse(combiner.has_default_output)
+      self.assertIsNone(outputs)
+    else:
+      self.assertTrue(combiner.has_default_output)
+      self.assertEqual(outputs[0].dtype, expected_output.dtype)
+      self.assertAllEqual(outputs[0], expected_output)
+
   @test_case.named_parameters(
       {
           'testcase_name': '1d',
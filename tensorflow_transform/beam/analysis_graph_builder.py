@@ -23,9 +23,11 @@ import hashlib
 
 # GOOGLE-INITIALIZATION
 
+import six
 import tensorflow as tf
 from tensorflow_transform import analyzer_nodes
 from tensorflow_transform import graph_tools
+from tensorflow_transform import impl_helper
 from tensorflow_transform import nodes
 from tensorflow_transform.beam import analyzer_cache
 from tensorflow_transform.beam import beam_nodes
@@ -34,6 +36,9 @@ from tensorflow_transform.beam import beam_nodes
 # Used for debugging only. This will point to the most recent graph built.
 _ANALYSIS_GRAPH = None
 
+# The dataset key used to compute the cache entry keys of an analysis graph.
+_DRY_RUN_DATASET_KEY = 'dry_run'
+
 
 def _serialize_op_attr(op_attr):
   """Deterministicly serializes tf.Operation attrs since it is a map."""
@@ -90,6 +95,143 @@ def _describe_path_as_analyzer_cache_hash(x, parents=None):
   return h.digest()
 
 
+# Ops which forward their only input, these are skipped in canonical paths.
+_IDENTITY_OP_TYPES = frozenset(['Identity', 'Snapshot', 'StopGradient'])
+
+# Ops whose output doesn't depend on the order of their inputs.
+_COMMUTATIVE_OP_TYPES = frozenset([
+    'Add', 'AddN', 'AddV2', 'Equal', 'LogicalAnd', 'LogicalOr', 'Maximum',
+    'Minimum', 'Mul', 'NotEqual'
+])
+
+
+def _is_identity_op(op):
+  return op.type in _IDENTITY_OP_TYPES and len(op.inputs) == 1
+
+
+def _serialize_canonical_op_attr(op):
+  """Serializes the attrs of an op that are set to a non default value."""
+  default_values = {
+      attr_def.name: attr_def.default_value
+      for attr_def in op.op_def.attr
+      if attr_def.HasField('default_value')
+  }
+  return _serialize_op_attr({
+      key: attr_value for key, attr_value in op.node_def.attr.items()
+      if not key.startswith('_') and attr_value != default_values.get(key)
+  })
+
+
+def _describe_path_as_canonical_analyzer_cache_hash(x, parents=None):
+  """Constructs a hash to describe a TF graph path, ignoring irrelevant details.
+
+  Unlike `_describe_path_as_analyzer_cache_hash`, the resulting paths are the
+  same for graphs that only differ in the following ways:
+    * Identity ops are added or removed.
+    * Inputs of commutative ops (e.g. Add) are reordered.
+    * Attrs are set to their default values, e.g. by a newer version of TF which
+      added them, or internal attrs (those starting with '_') are set.
+  The op type is a part of the path.
+
+  Args:
+    x: One of (None, tf.Operation, tf.Tensor, str), the current TF graph node.
+    parents: (Optional) a list of bytes, results of previous calls to this
+      function, where x was an ancestor to the current node x.
+
+  Returns:
+    A bytes hash of the path from x to its sources. None if x is None.
+  """
+  if x is None:
+    assert parents is None
+    return None
+  parents = parents or []
+  if any(p is None for p in parents):
+    return None
+
+  if isinstance(x, tf.Operation):
+    if _is_identity_op(x) and parents:
+      return parents[0]
+    values = [x.type] + _serialize_canonical_op_attr(x)
+    if x.type in _COMMUTATIVE_OP_TYPES:
+      parents = sorted(parents)
+  elif isinstance(x, tf.Tensor):
+    if _is_identity_op(x.op) and parents:
+      return parents[0]
+    values = [tf.compat.as_str_any(x.value_index)]
+  else:
+    assert isinstance(x, (str, bytes))
+    values = [x]
+
+  h = hashlib.sha1()
+  for value in values:
+    h.update(tf.compat.as_bytes(value))
+  for p in parents:
+    h.update(p)
+  return h.digest()
+
+
+class _PathProvenance(
+    collections.namedtuple('_PathProvenance',
+                           ['description', 'parents', 'label'])):
+  """Describes how a hashed path was computed.
+
+  Fields:
+    description: A human readable description of the node with this path.
+    parents: A tuple of the hashed paths that this path was computed from.
+    label: The label of the analyzer operation if this is a cache entry key,
+      suffixed by the output index for analyzer outputs cache, else None.
+  """
+
+  def __new__(cls, description, parents, label=None):
+    return super(_PathProvenance, cls).__new__(
+        cls, description=description, parents=tuple(parents), label=label)
+
+
+def _describe_graph_node(x):
+  if isinstance(x, tf.Operation):
+    return '{} op {}'.format(x.type, x.name)
+  if isinstance(x, tf.Tensor):
+    return 'tensor {}'.format(x.name)
+  return 'input {}'.format(tf.compat.as_str_any(x))
+
+
+class _PathProvenanceRecorder(object):
+  """Wraps a function which describes TF graph paths, recording provenance."""
+
+  def __init__(self, describe_path_fn, path_provenance):
+    self._describe_path_fn = describe_path_fn
+    self._path_provenance = path_provenance
+
+  def __call__(self, x, parents=None):
+    path = self._describe_path_fn(x, parents)
+    # Paths of nodes that are skipped are the same as their parent's, which are
+    # already recorded.
+    if path is not None and path not in self._path_provenance:
+      self._path_provenance[path] = _PathProvenance(
+          _describe_graph_node(x), parents or [])
+    return path
+
+
+def _describe_attr_for_hashed_path(name, value):
+  """Returns the bytes which describe an operation attribute in a hashed path.
+
+  Cache coders are described by their `hashed_repr`, so that replacing a coder
+  by one which can decode the same cache entries doesn't change the cache entry
+  keys.
+
+  Args:
+    name: The name of the attribute or field.
+    value: The value of the attribute or field.
+
+  Returns:
+    The bytes to hash.
+  """
+  if isinstance(value, analyzer_nodes.CacheCoder):
+    # Same as str() of the tuple below.
+    return tf.compat.as_bytes('({!r}, {})'.format(name, value.hashed_repr))
+  return tf.compat.as_bytes(str((name, value)))
+
+
 def _tensor_name(tensor):
   """Get a name of a tensor without trailing ":0" when relevant."""
   # tensor.name is unicode in Python 3 and bytes in Python 2 so convert to
@@ -202,8 +344,15 @@ class _OptimizeVisitor(nodes.Visitor):
   input data, according to the `is_partitionable` annotation.
   """
 
-  def __init__(self, dataset_keys, cache_dict, tensor_keys_to_paths,
-               cache_output_nodes):
+  def __init__(self,
+               dataset_keys,
+               cache_dict,
+               tensor_keys_to_paths,
+               cache_output_nodes,
+               merged_dataset_keys=None,
+               cache_analyzer_outputs=False,
+               canonical_cache_keys=False,
+               path_provenance=None):
     """Init method for _OptimizeVisitor.
 
     Args:
@@ -217,11 +366,40 @@ class _OptimizeVisitor(nodes.Visitor):
         path hash.
       cache_output_nodes: A dictionary from (dataset_key, cache_key) to encoded
         cache ValueNode. This is the output cache for this graph.
+      merged_dataset_keys: (Optional) An iterable of
+        `analyzer_cache.MergedDatasetKey`s to compact the cache into. Only
+        those which merge a subset of `dataset_keys` are produced.
+      cache_analyzer_outputs: (Optional) If True, the final outputs of
+        analyzers are also cached, keyed by all of `dataset_keys`.
+      canonical_cache_keys: (Optional) If True, cache entry keys don't depend
+        on the labels of analyzers.
+      path_provenance: (Optional) A dictionary which is updated with a
+        `_PathProvenance` for every hashed path and cache entry key.
     """
     self._dataset_keys = sorted(dataset_keys)
     self._cache_dict = cache_dict
     self._tensor_keys_to_paths = tensor_keys_to_paths
     self.cache_output_nodes = cache_output_nodes
+    self._cached_merged_dataset_keys = [
+        key for key in (cache_dict or {})
+        if isinstance(key, analyzer_cache.MergedDatasetKey)
+    ]
+    self._merged_dataset_keys_to_write = sorted(
+        (key for key in merged_dataset_keys or []
+         if set(key.dataset_keys).issubset(self._dataset_keys)),
+        key=lambda key: key.dataset_keys)
+    self._cache_analyzer_outputs = cache_analyzer_outputs
+    # Analyzer outputs are cached for the entire dataset.
+    if self._dataset_keys:
+      self._full_dataset_key = analyzer_cache.AnalyzerOutputsDatasetKey(
+          self._dataset_keys)
+    else:
+      self._full_dataset_key = None
+    # A map from hashed paths to the keys of output cache that is only needed
+    # for computing the operation with that hashed path.
+    self._upstream_cache_output_keys = collections.defaultdict(set)
+    self._canonical_cache_keys = canonical_cache_keys
+    self._path_provenance = path_provenance
 
   def _validate_operation_def(self, operation_def):
     if operation_def.cache_coder is not None:
@@ -237,27 +415,59 @@ class _OptimizeVisitor(nodes.Visitor):
     paths_to_hash.append(tf.compat.as_bytes(operation_def.__class__.__name__))
 
     if isinstance(operation_def, beam_nodes.ExtractFromDict):
-      for key in operation_def.keys:
-        path = self._tensor_keys_to_paths[key]
-        paths_to_hash.append(path)
+      tensor_paths = [
+          self._tensor_keys_to_paths[key] for key in operation_def.keys
+      ]
+      paths_to_hash.extend(tensor_paths)
     else:
+      tensor_paths = []
       for attr in sorted(
           [x for x in dir(operation_def) if x not in operation_def._fields]):
         if attr.startswith('_') or callable(getattr(operation_def, attr)):
           continue
         paths_to_hash.append(
-            tf.compat.as_bytes(str((attr, getattr(operation_def, attr)))))
+            _describe_attr_for_hashed_path(attr,
+                                           getattr(operation_def, attr)))
       for field in operation_def._fields:
+        # The label is derived from the name of the analyzer.
+        if self._canonical_cache_keys and field == 'label':
+          continue
         paths_to_hash.append(
-            tf.compat.as_bytes(
-                str((field, operation_def.get_field_str(field)))))
+            _describe_attr_for_hashed_path(
+                field, operation_def.get_field_str(field)))
 
     hash_container = hashlib.sha1()
     for path in paths_to_hash:
       if path is None:
         return None
       hash_container.update(path)
-    return hash_container.digest()
+    result = hash_container.digest()
+    if self._path_provenance is not None:
+      self._path_provenance.setdefault(
+          result,
+          _PathProvenance(
+              '{} operation {}'.format(operation_def.__class__.__name__,
+                                       operation_def.label),
+              list(parent_hashed_paths) + tensor_paths))
+    return result
+
+  def _make_cache_entry_key(self, operation_def, hashed_path, suffix=''):
+    """Returns the cache entry key of an operation with the given path."""
+    if self._canonical_cache_keys:
+      prefix = operation_def.__class__.__name__
+    else:
+      prefix = operation_def.label
+    cache_entry_key = analyzer_cache.make_cache_entry_key(
+        tf.compat.as_bytes(prefix) + b'-' + hashed_path +
+        tf.compat.as_bytes(suffix))
+    if self._path_provenance is not None:
+      self._path_provenance.setdefault(
+          cache_entry_key,
+          _PathProvenance(
+              'cache entry key of {}'.format(operation_def.label),
+              [hashed_path],
+              label=operation_def.label + suffix))
+    return cache_entry_key
 
   def visit(self, operation_def, input_values):
     self._validate_operation_def(operation_def)
@@ -294,14 +504,77 @@ class _OptimizeVisitor(nodes.Visitor):
       # a flattened view.
       next_inputs = tuple(v.flattened_view for v in input_values)
 
-    flattened_view = nodes.OperationNode(operation_def, next_inputs).outputs
+    next_hashed_path = None
+    if (self._cache_analyzer_outputs and self._cache_dict is not None and
+        self._full_dataset_key is not None and
+        isinstance(operation_def, _ANALYZER_OUTPUT_OPERATIONS)):
+      next_hashed_path = self._make_next_hashed_path(
+          [v.hashed_path for v in input_values], operation_def)
+
+    if next_hashed_path is None:
+      flattened_view = nodes.OperationNode(operation_def, next_inputs).outputs
+    else:
+      for view in input_values:
+        self._upstream_cache_output_keys[next_hashed_path].update(
+            self._upstream_cache_output_keys[view.hashed_path])
+      flattened_view = self._apply_operation_with_output_cache(
+          operation_def, next_inputs, next_hashed_path)
 
     return tuple(
         _OptimizationView(  # pylint: disable=g-complex-comprehension
             prefer_fine_grained_view=False,
             flattened_view=flat,
             fine_grained_view=None,
-            hashed_path=None) for flat in flattened_view)
+            hashed_path=next_hashed_path) for flat in flattened_view)
+
+  def _apply_operation_with_output_cache(self, operation_def, inputs,
+                                         next_hashed_path):
+    """Applies an analyzer operation, using or updating its output cache.
+
+    Args:
+      operation_def: An `OperationDef` in `_ANALYZER_OUTPUT_OPERATIONS`.
+      inputs: The input `ValueNode`s for `operation_def`.
+      next_hashed_path: The hashed path for `operation_def`.
+
+    Returns:
+      A tuple of the `ValueNode`s which are the outputs of `operation_def`.
+    """
+    coder = _get_output_cache_coder(operation_def)
+    if coder is None:
+      return nodes.OperationNode(operation_def, inputs).outputs
+
+    cache_entry_keys = [
+        self._make_cache_entry_key(operation_def, next_hashed_path,
+                                   '-{}'.format(idx))
+        for idx in range(operation_def.num_outputs)
+    ]
+    output_cache = self._cache_dict.get(self._full_dataset_key, {})
+    if all(output_cache.get(key) is not None for key in cache_entry_keys):
+      # Cache which would only be used to compute these outputs is no longer
+      # needed.
+      for key in self._upstream_cache_output_keys[next_hashed_path]:
+        self.cache_output_nodes.pop(key, None)
+      return tuple(
+          nodes.apply_operation(  # pylint: disable=g-complex-comprehension
+              analyzer_nodes.DecodeCache,
+              dataset_key=self._full_dataset_key,
+              cache_key=cache_entry_key,
+              cache_entry_identifier='{}[{}]'.format(operation_def.label, idx),
+              coder=coder) for idx, cache_entry_key in enumerate(
+                  cache_entry_keys))
+
+    outputs = nodes.OperationNode(operation_def, inputs).outputs
+    for idx, (output, cache_entry_key) in enumerate(
+        zip(outputs, cache_entry_keys)):
+      self.cache_output_nodes[(self._full_dataset_key,
+                               cache_entry_key)] = nodes.apply_operation(
+                                   analyzer_nodes.EncodeCache,
+                                   output,
+                                   coder=coder,
+                                   label='EncodeCache[{}[{}]][{}]'.format(
+                                       operation_def.label, idx,
+                                       self._full_dataset_key))
+    return outputs
 
   def _visit_partitionable_operation(self, operation_def, upstream_views):
     # TODO(b/37788560) Possibly support partitionable operations with multiple
@@ -355,10 +628,29 @@ class _OptimizeVisitor(nodes.Visitor):
     """
     result_fine_grained_view = collections.OrderedDict()
 
-    cache_entry_key = analyzer_cache.make_cache_entry_key(
-        tf.compat.as_bytes(operation_def.label) + b'-' + next_hashed_path)
-
-    for dataset_key in self._dataset_keys:
+    cache_entry_key = self._make_cache_entry_key(operation_def,
+                                                 next_hashed_path)
+
+    # Partitions which are covered by cache compacted over several dataset keys
+    # are replaced by a single partition keyed by the MergedDatasetKey.
+    merged_keys_by_first_key = {}
+    if operation_def.cache_coder:
+      merged_keys, _ = analyzer_cache.cover_dataset_keys(
+          fine_grained_view.keys(), [
+              key for key in self._cached_merged_dataset_keys
+              if self._cache_dict[key].get(cache_entry_key) is not None
+          ])
+      for merged_key in merged_keys:
+        merged_keys_by_first_key[merged_key.dataset_keys[0]] = merged_key
+    covered_dataset_keys = set()
+    for merged_key in merged_keys_by_first_key.values():
+      covered_dataset_keys.update(merged_key.dataset_keys)
+
+    for dataset_key, value_node in fine_grained_view.items():
+      if dataset_key in merged_keys_by_first_key:
+        dataset_key = merged_keys_by_first_key[dataset_key]
+      elif dataset_key in covered_dataset_keys:
+        continue
 
       if (operation_def.cache_coder and self._cache_dict.get(
           dataset_key, {}).get(cache_entry_key) is not None):
@@ -369,7 +661,6 @@ class _OptimizeVisitor(nodes.Visitor):
                 operation_def.label,
                 coder=operation_def.cache_coder), tuple()).outputs
       else:
-        value_node = fine_grained_view[dataset_key]
         (op_output,) = nodes.OperationNode(
             operation_def._replace(
                 label='{}[{}]'.format(operation_def.label, dataset_key)),
@@ -383,10 +674,69 @@ class _OptimizeVisitor(nodes.Visitor):
                                                  dataset_key))
           self.cache_output_nodes[(dataset_key,
                                    cache_entry_key)] = encoded_cache
+          self._upstream_cache_output_keys[next_hashed_path].add(
+              (dataset_key, cache_entry_key))
       result_fine_grained_view[dataset_key] = op_output
 
+    if operation_def.cache_coder:
+      self._compact_cache(operation_def, cache_entry_key,
+                          result_fine_grained_view, next_hashed_path)
+
     return result_fine_grained_view
 
+  def _compact_cache(self, operation_def, cache_entry_key, fine_grained_view,
+                     next_hashed_path):
+    """Adds cache output nodes for `MergedDatasetKey`s which should be written.
+
+    Args:
+      operation_def: A cacheable `OperationDef`.
+      cache_entry_key: The cache entry key of `operation_def`'s outputs.
+      fine_grained_view: The `_OptimizationView.fine_grained_view` of
+        `operation_def`'s outputs.
+      next_hashed_path: The hashed path of `operation_def`.
+    """
+    for merged_key in self._merged_dataset_keys_to_write:
+      if self._cache_dict.get(merged_key, {}).get(cache_entry_key) is not None:
+        continue
+      # A merged key can only be computed from partitions which it fully
+      # contains.
+      merged_dataset_keys = set(merged_key.dataset_keys)
+      partitions = []
+      covered_dataset_keys = set()
+      for partition_key, value_node in fine_grained_view.items():
+        if isinstance(partition_key, analyzer_cache.MergedDatasetKey):
+          partition_dataset_keys = set(partition_key.dataset_keys)
+        else:
+          partition_dataset_keys = {partition_key}
+        if partition_dataset_keys.issubset(merged_dataset_keys):
+          partitions.append(value_node)
+          covered_dataset_keys.update(partition_dataset_keys)
+      if covered_dataset_keys != merged_dataset_keys:
+        continue
+
+      merge_operation_def = _make_merge_accumulators_operation_def(
+          operation_def,
+          label='MergeAccumulators[{}][{}]'.format(operation_def.label,
+                                                   merged_key))
+      if merge_operation_def is None:
+        continue
+      (flattened,) = nodes.apply_multi_output_operation(
+          beam_nodes.Flatten,
+          *partitions,
+          label='FlattenAccumulators[{}][{}]'.format(operation_def.label,
+                                                     merged_key))
+      (merged,) = nodes.OperationNode(merge_operation_def,
+                                      (flattened,)).outputs
+      self.cache_output_nodes[(merged_key, cache_entry_key)] = (
+          nodes.apply_operation(
+              analyzer_nodes.EncodeCache,
+              merged,
+              coder=operation_def.cache_coder,
+              label='EncodeCache[{}][{}]'.format(operation_def.label,
+                                                 merged_key)))
+      self._upstream_cache_output_keys[next_hashed_path].add(
+          (merged_key, cache_entry_key))
+
   def _visit_apply_savedmodel_operation(self, operation_def, upstream_views):
     (upstream_view,) = upstream_views
     if upstream_view.fine_grained_view:
@@ -414,17 +764,112 @@ class _OptimizeVisitor(nodes.Visitor):
   def validate_value(self, value):
     assert isinstance(value, _OptimizationView), value
     if value.fine_grained_view:
-      assert set(value.fine_grained_view.keys()) == set(
-          self._dataset_keys), ('{} != {}'.format(
-              value.fine_grained_view.keys(), self._dataset_keys))
+      covered_dataset_keys = []
+      for key in value.fine_grained_view:
+        if isinstance(key, analyzer_cache.MergedDatasetKey):
+          covered_dataset_keys.extend(key.dataset_keys)
+        else:
+          covered_dataset_keys.append(key)
+      assert sorted(covered_dataset_keys) == self._dataset_keys, (
+          '{} != {}'.format(value.fine_grained_view.keys(), self._dataset_keys))
+
+
+# Operations which compute the final outputs of analyzers from cacheable
+# accumulators, these are hashed when caching analyzer outputs.
+_ANALYZER_OUTPUT_OPERATIONS = (
+    analyzer_nodes.CacheableCombineMerge,
+    analyzer_nodes.VocabularyMerge,
+    analyzer_nodes.VocabularyOrderAndFilter,
+)
+
+
+def _get_output_cache_coder(operation_def):
+  """Returns a CacheCoder for `operation_def`'s outputs, or None."""
+  if isinstance(operation_def, analyzer_nodes.CacheableCombineMerge):
+    return analyzer_nodes.BinaryNumpyCacheCoder()
+  # A key_fn cannot be hashed deterministically.
+  if (isinstance(operation_def, analyzer_nodes.VocabularyOrderAndFilter) and
+      operation_def.key_fn is None):
+    return analyzer_nodes.BinaryNumpyCacheCoder()
+  return None
+
+
+def _make_merge_accumulators_operation_def(operation_def, label):
+  """Returns an OperationDef merging `operation_def`'s outputs, or None."""
+  if isinstance(operation_def, analyzer_nodes.CacheableCombinePerKeyAccumulate):
+    return analyzer_nodes.CacheableCombinePerKeyMergeAccumulators(
+        operation_def.combiner, label=label)
+  if isinstance(operation_def, analyzer_nodes.CacheableCombineAccumulate):
+    return analyzer_nodes.CacheableCombineMergeAccumulators(
+        operation_def.combiner, label=label)
+  if isinstance(operation_def, analyzer_nodes.VocabularyAccumulate):
+    return analyzer_nodes.VocabularyMergeAccumulators(
+        operation_def.vocab_ordering_type,
+        operation_def.input_dtype,
+        label=label)
+  return None
+
+
+class _RawDataConsumersVisitor(nodes.Visitor):
+  """Visitor which finds the operations that read raw input data.
+
+  The value of each output is the set of dataset keys whose raw data it passes
+  on without analyzing it, where None stands for the flattened input data.
+  """
+
+  def __init__(self):
+    self.raw_data_consumers = collections.defaultdict(set)
+
+  def visit(self, operation_def, input_values):
+    if isinstance(operation_def, beam_nodes.ApplySavedModel):
+      raw_dataset_keys = frozenset([operation_def.dataset_key])
+    elif isinstance(operation_def,
+                    (beam_nodes.ExtractFromDict, beam_nodes.Flatten)):
+      raw_dataset_keys = frozenset().union(*input_values)
+    else:
+      for dataset_key in frozenset().union(*input_values):
+        self.raw_data_consumers[dataset_key].add(operation_def.label)
+      raw_dataset_keys = frozenset()
+    return (raw_dataset_keys,) * operation_def.num_outputs
+
+  def validate_value(self, value):
+    assert isinstance(value, frozenset), value
+
+
+def get_raw_data_consumers(value_nodes):
+  """Finds the operations which read raw input data in an analysis graph.
+
+  Args:
+    value_nodes: An iterable of `ValueNode`s as returned by `build`, this should
+      include the output cache `ValueNode`s.
+
+  Returns:
+    A dictionary from dataset keys (None for the flattened input data) to a
+    sorted list of the labels of operations which read their raw data.  Raw
+    data of dataset keys which are not in this dictionary is not read, e.g.
+    because all analyzers over it are cached.
+  """
+  visitor = _RawDataConsumersVisitor()
+  traverser = nodes.Traverser(visitor)
+  for value_node in value_nodes:
+    traverser.visit_value_node(value_node)
+  return {
+      dataset_key: sorted(labels)
+      for dataset_key, labels in six.iteritems(visitor.raw_data_consumers)
+  }
 
 
 def _perform_cache_optimization(saved_model_future, dataset_keys,
-                                tensor_keys_to_paths, cache_dict):
+                                tensor_keys_to_paths, cache_dict,
+                                merged_dataset_keys, cache_analyzer_outputs,
+                                canonical_cache_keys, path_provenance):
   """Performs cache optimization on the given graph."""
   cache_output_nodes = {}
   optimize_visitor = _OptimizeVisitor(dataset_keys or {}, cache_dict,
-                                      tensor_keys_to_paths, cache_output_nodes)
+                                      tensor_keys_to_paths, cache_output_nodes,
+                                      merged_dataset_keys,
+                                      cache_analyzer_outputs,
+                                      canonical_cache_keys, path_provenance)
   optimize_traverser = nodes.Traverser(optimize_visitor)
   optimized = optimize_traverser.visit_value_node(
       saved_model_future).flattened_view
@@ -440,7 +885,11 @@ def build(graph,
           input_signature,
           output_signature,
           dataset_keys=None,
-          cache_dict=None):
+          cache_dict=None,
+          merged_dataset_keys=None,
+          cache_analyzer_outputs=False,
+          canonical_cache_keys=False,
+          path_provenance=None):
   """Returns a list of `Phase`s describing how to execute the pipeline.
 
   The default graph is assumed to contain some `Analyzer`s which must be
@@ -481,6 +930,23 @@ def build(graph,
     dataset_keys: (Optional) A set of strings which are dataset keys, they
       uniquely identify these datasets across analysis runs.
     cache_dict: (Optional): A cache dictionary.
+    merged_dataset_keys: (Optional) An iterable of
+      `analyzer_cache.MergedDatasetKey`s, cache compacted over these is added to
+      the output cache.
+    cache_analyzer_outputs: (Optional) If True, the final outputs of analyzers
+      (e.g. quantile boundaries, or the ordered vocabulary) are also cached,
+      keyed by an `analyzer_cache.AnalyzerOutputsDatasetKey` of all
+      `dataset_keys`.  When this cache is present, the analyzers' accumulators
+      are not computed.
+    canonical_cache_keys: (Optional) If True, cache entry keys are computed from
+      a canonical form of the analyzers' input graph, and don't depend on the
+      names of analyzers.  Such keys remain the same when e.g. identity ops are
+      added, features that the analyzer doesn't use are reordered, or op attrs
+      are set to their default values.  These keys are different from the
+      default ones, so switching to them invalidates existing cache.
+    path_provenance: (Optional) A dictionary which is updated with a
+      `_PathProvenance` for every path in the graph, and every cache entry key.
+      This is used for debugging cache key changes.
 
   Returns:
     A pair of:
@@ -502,13 +968,24 @@ def build(graph,
 
   analyzers_input_signature = {}
   graph_analyzer = None
+  if canonical_cache_keys:
+    describe_path_fn = _describe_path_as_canonical_analyzer_cache_hash
+  else:
+    describe_path_fn = _describe_path_as_analyzer_cache_hash
+  if path_provenance is not None:
+    describe_path_fn = _PathProvenanceRecorder(describe_path_fn,
+                                               path_provenance)
   while not all(sink_tensors_ready.values()):
     # Determine which table init ops are ready to run in this phase
     # Determine which keys of pending_tensor_replacements are ready to run
     # in this phase, based in whether their dependencies are ready.
-    graph_analyzer = graph_tools.InitializableGraphAnalyzer(
-        graph, input_signature, sink_tensors_ready,
-        _describe_path_as_analyzer_cache_hash)
+    # The analysis of the previous phase is updated, so that only the parts of
+    # the graph which depend on tensors bound in that phase are analyzed again.
+    if graph_analyzer is None:
+      graph_analyzer = graph_tools.InitializableGraphAnalyzer(
+          graph, input_signature, sink_tensors_ready, describe_path_fn)
+    else:
+      graph_analyzer.update_replaced_tensors_ready(sink_tensors_ready)
     ready_traverser = nodes.Traverser(_ReadyVisitor(graph_analyzer))
 
     # Now create and apply a SavedModel with all tensors in tensor_bindings
@@ -577,7 +1054,171 @@ def build(graph,
   }
   (optimized_saved_model_future,
    output_cache_value_nodes) = _perform_cache_optimization(
-       saved_model_future, dataset_keys, tensor_keys_to_paths, cache_dict)
+       saved_model_future, dataset_keys, tensor_keys_to_paths, cache_dict,
+       merged_dataset_keys, cache_analyzer_outputs, canonical_cache_keys,
+       path_provenance)
   global _ANALYSIS_GRAPH
   _ANALYSIS_GRAPH = optimized_saved_model_future
   return optimized_saved_model_future, output_cache_value_nodes
+
+
+def _build_dry_run(preprocessing_fn, feature_spec, canonical_cache_keys,
+                   path_provenance=None):
+  """Builds the analysis graph of `preprocessing_fn` without running it.
+
+  Args:
+    preprocessing_fn: A function that accepts and returns a dictionary from
+      strings to `Tensor` or `SparseTensor`s.
+    feature_spec: A dictionary from feature names to `FixedLenFeature`,
+      `VarLenFeature` or `SparseFeature` objects, describing the inputs of
+      `preprocessing_fn`.
+    canonical_cache_keys: Whether to compute canonical cache entry keys, see
+      `build`.
+    path_provenance: (Optional) Passed to `build`.
+
+  Returns:
+    A set of cache entry keys, which are the same for any dataset key.
+  """
+  global _ANALYSIS_GRAPH
+  analysis_graph = _ANALYSIS_GRAPH
+  with tf.Graph().as_default() as graph:
+    # The inputs are created the same way as in AnalyzeDataset, since cache
+    # entry keys depend on the analyzers' paths in the graph.
+    with tf.compat.v1.name_scope('inputs'):
+      input_signature = impl_helper.feature_spec_as_batched_placeholders(
+          feature_spec)
+      copied_inputs = impl_helper.copy_tensors(input_signature)
+    output_signature = preprocessing_fn(copied_inputs)
+  _, cache_output_nodes = build(
+      graph,
+      input_signature,
+      output_signature,
+      dataset_keys=[_DRY_RUN_DATASET_KEY],
+      cache_dict={},
+      cache_analyzer_outputs=True,
+      canonical_cache_keys=canonical_cache_keys,
+      path_provenance=path_provenance)
+  # This is not an analysis that will run, so leave the debugging graph as is.
+  _ANALYSIS_GRAPH = analysis_graph
+  return {cache_key for _, cache_key in cache_output_nodes}
+
+
+def get_analysis_cache_entry_keys(preprocessing_fn,
+                                  feature_spec,
+                                  canonical_cache_keys=False):
+  """Computes the cache entry keys that analyzing `preprocessing_fn` can use.
+
+  This traces `preprocessing_fn` and builds its analysis graph without running
+  it, so that only the cache that is relevant to it needs to be read, e.g. by
+  passing the result as `cache_entry_keys` to
+  `analyzer_cache.ReadAnalysisCacheFromFS`.
+
+  Args:
+    preprocessing_fn: A function that accepts and returns a dictionary from
+      strings to `Tensor` or `SparseTensor`s.
+    feature_spec: A dictionary from feature names to `FixedLenFeature`,
+      `VarLenFeature` or `SparseFeature` objects, describing the inputs of
+      `preprocessing_fn`.
+    canonical_cache_keys: (Optional) Whether the analysis uses canonical cache
+      entry keys, see `build`.
+
+  Returns:
+    A set of cache entry keys, which are the same for any dataset key.
+  """
+  return _build_dry_run(preprocessing_fn, feature_spec, canonical_cache_keys)
+
+
+class CacheEntryKeyChange(
+    collections.namedtuple(
+        'CacheEntryKeyChange',
+        ['label', 'old_cache_entry_key', 'new_cache_entry_key', 'causes'])):
+  """Describes an analyzer cache entry key that is new in an analysis graph.
+
+  Fields:
+    label: The label of the analyzer operation which the cache entry is for.
+    old_cache_entry_key: The cache entry key of the operation with the same
+      label in the old graph, or None if there is no such operation.
+    new_cache_entry_key: The cache entry key in the new graph.
+    causes: A sorted list of descriptions of the earliest nodes along the path
+      of this cache entry that are not in the old graph.  These are TF ops,
+      inputs, analyzer operations, or the cache entry key itself when only the
+      label of the analyzer is different.
+  """
+
+
+def _find_changed_path_roots(path, new_path_provenance, old_path_provenance):
+  """Returns descriptions of the earliest nodes that changed along a path."""
+  roots = set()
+  visited = set()
+  stack = [path]
+  while stack:
+    path = stack.pop()
+    # Paths without provenance are constant, e.g. that of ApplySavedModel.
+    if (path in visited or path in old_path_provenance or
+        path not in new_path_provenance):
+      continue
+    visited.add(path)
+    provenance = new_path_provenance[path]
+    changed_parents = [
+        parent for parent in provenance.parents
+        if parent not in old_path_provenance and
+        parent in new_path_provenance
+    ]
+    if changed_parents:
+      stack.extend(changed_parents)
+    else:
+      roots.add(provenance.description)
+  return sorted(roots)
+
+
+def get_cache_entry_key_changes(old_preprocessing_fn,
+                                new_preprocessing_fn,
+                                feature_spec,
+                                new_feature_spec=None,
+                                canonical_cache_keys=False):
+  """Reports which analyzer cache entry keys differ between two analyses.
+
+  This is meant for debugging cache misses after a `preprocessing_fn` was
+  changed: cache that was produced for `old_preprocessing_fn` can only be used
+  by `new_preprocessing_fn` for entries that have the same key.
+
+  Args:
+    old_preprocessing_fn: The `preprocessing_fn` that cache was produced for.
+    new_preprocessing_fn: The `preprocessing_fn` that will be analyzed.
+    feature_spec: A dictionary from feature names to `FixedLenFeature`,
+      `VarLenFeature` or `SparseFeature` objects, describing the inputs of
+      `old_preprocessing_fn`.
+    new_feature_spec: (Optional) Like `feature_spec`, but for
+      `new_preprocessing_fn`.  Defaults to `feature_spec`.
+    canonical_cache_keys: (Optional) Whether the analysis uses canonical cache
+      entry keys, see `build`.
+
+  Returns:
+    A list of `CacheEntryKeyChange`s, one for every cache entry key of
+    `new_preprocessing_fn` which `old_preprocessing_fn` doesn't have, sorted by
+    label.
+  """
+  if new_feature_spec is None:
+    new_feature_spec = feature_spec
+  old_path_provenance = {}
+  old_keys = _build_dry_run(old_preprocessing_fn, feature_spec,
+                            canonical_cache_keys, old_path_provenance)
+  new_path_provenance = {}
+  new_keys = _build_dry_run(new_preprocessing_fn, new_feature_spec,
+                            canonical_cache_keys, new_path_provenance)
+
+  old_keys_by_label = {
+      old_path_provenance[key].label: key for key in old_keys
+  }
+  result = []
+  for key in new_keys - old_keys:
+    label = new_path_provenance[key].label
+    result.append(
+        CacheEntryKeyChange(
+            label=label,
+            old_cache_entry_key=old_keys_by_label.get(label),
+            new_cache_entry_key=key,
+            causes=_find_changed_path_roots(key, new_path_provenance,
+                                            old_path_provenance)))
+  return sorted(result, key=lambda change: (change.label,
+                                            change.new_cache_entry_key))
@@ -245,6 +245,66 @@ class AnalysisGraphBuilderTest(test_case.TransformTestCase):
         first=dot_string,
         second=expected_dot_graph_str)
 
+  def test_canonical_cache_entry_keys(self):
+    feature_spec = {
+        'x': tf.io.FixedLenFeature([], tf.float32),
+        'y': tf.io.FixedLenFeature([], tf.float32),
+    }
+
+    def preprocessing_fn(inputs):
+      return {
+          'x_min': tft.min(inputs['x'], name='x_min'),
+          'y_max': tft.max(inputs['y'], name='y_max'),
+      }
+
+    def preprocessing_fn_with_identity_and_renamed_analyzer(inputs):
+      x = tf.identity(inputs['x'])
+      return {
+          'y_max': tft.max(inputs['y'], name='y_max'),
+          'x_min': tft.min(x, name='renamed'),
+      }
+
+    self.assertEqual(
+        analysis_graph_builder.get_analysis_cache_entry_keys(
+            preprocessing_fn, feature_spec, canonical_cache_keys=True),
+        analysis_graph_builder.get_analysis_cache_entry_keys(
+            preprocessing_fn_with_identity_and_renamed_analyzer,
+            feature_spec,
+            canonical_cache_keys=True))
+    self.assertEqual(
+        analysis_graph_builder.get_cache_entry_key_changes(
+            preprocessing_fn,
+            preprocessing_fn_with_identity_and_renamed_analyzer,
+            feature_spec,
+            canonical_cache_keys=True), [])
+
+    changes = analysis_graph_builder.get_cache_entry_key_changes(
+        preprocessing_fn, preprocessing_fn_with_identity_and_renamed_analyzer,
+        feature_spec)
+    self.assertTrue(changes)
+    for change in changes:
+      self.assertTrue(change.label.startswith('renamed/'), change.label)
+      self.assertIsNone(change.old_cache_entry_key)
+      self.assertEqual(change.causes, ['Identity op Identity'])
+
+    # Changing an analyzer's inputs changes its canonical cache entry keys.
+    def preprocessing_fn_with_squared_input(inputs):
+      return {
+          'x_min': tft.min(tf.square(inputs['x']), name='x_min'),
+          'y_max': tft.max(inputs['y'], name='y_max'),
+      }
+
+    changes = analysis_graph_builder.get_cache_entry_key_changes(
+        preprocessing_fn,
+        preprocessing_fn_with_squared_input,
+        feature_spec,
+        canonical_cache_keys=True)
+    self.assertTrue(changes)
+    for change in changes:
+      self.assertTrue(change.label.startswith('x_min/'), change.label)
+      self.assertIsNotNone(change.old_cache_entry_key)
+      self.assertEqual(change.causes, ['Square op Square'])
+
 
 if __name__ == '__main__':
   test_case.main()
@@ -17,8 +17,12 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
+import hashlib
 import os
 import re
+import time
+import uuid
 
 # GOOGLE-INITIALIZATION
 
@@ -29,15 +33,144 @@ import tensorflow as tf
 
 # This should be advanced whenever a non-backwards compatible change is made
 # that affects analyzer cache. For example, changing accumulator format.
-_CACHE_VERSION = b'__v0__'
+# __v1__: Accumulators are encoded in a binary format (see
+# analyzer_nodes.BinaryNumpyCacheCoder) rather than JSON.
+_CACHE_VERSION = b'__v1__'
+# Cache entries written with these earlier versions are read in place of
+# missing entries of the current version, when their format can still be
+# decoded.  The JSON encoded accumulators of __v0__ are decoded by the binary
+# cache coders.
+_COMPATIBLE_CACHE_VERSIONS = (b'__v0__',)
 
 
 # TODO(b/37788560): Use artifacts instead.
+# Each write adds a manifest named with this prefix to a dataset key's cache
+# directory.
 _MANIFEST_FILE_NAME = 'MANIFEST'
+# Each write of MergedDatasetKeys adds a file named with this prefix listing
+# them to cache_base_dir.
+_MERGED_DATASET_KEYS_FILE_NAME = 'MERGED_DATASET_KEYS'
+
+
+class MergedDatasetKey(
+    collections.namedtuple('MergedDatasetKey', ['dataset_keys'])):
+  """A key for cache which was compacted over several dataset keys.
+
+  Cache stored under a `MergedDatasetKey` holds a single accumulator per cache
+  entry, which is the merge of the accumulators of all of its `dataset_keys`.
+  Reading it in place of the individual dataset keys' cache lets an analysis
+  over N dataset keys read O(log N) cache entries given that merged keys are
+  written hierarchically (e.g. days into weeks, weeks into quarters).
+
+  Attributes:
+    dataset_keys: A sorted tuple of the (at least 2) dataset keys which are
+      merged.
+  """
+
+  def __new__(cls, dataset_keys):
+    dataset_keys = tuple(sorted(set(dataset_keys)))
+    if len(dataset_keys) < 2:
+      raise ValueError(
+          'A MergedDatasetKey must merge at least 2 dataset keys, got: '
+          '{}'.format(dataset_keys))
+    validate_dataset_keys(dataset_keys)
+    return super(MergedDatasetKey, cls).__new__(cls, dataset_keys=dataset_keys)
+
+  def __str__(self):
+    return _describe_dataset_keys('MERGED', self.dataset_keys)
+
+
+class AnalyzerOutputsDatasetKey(
+    collections.namedtuple('AnalyzerOutputsDatasetKey', ['dataset_keys'])):
+  """A key for cache of analyzer outputs computed over a set of dataset keys.
+
+  Unlike accumulators, analyzer outputs can only be reused by an analysis over
+  exactly the same dataset keys.
+
+  Attributes:
+    dataset_keys: A sorted tuple of the dataset keys which were analyzed.
+  """
+
+  def __new__(cls, dataset_keys):
+    dataset_keys = tuple(sorted(set(dataset_keys)))
+    if not dataset_keys:
+      raise ValueError('An AnalyzerOutputsDatasetKey requires dataset keys')
+    validate_dataset_keys(dataset_keys)
+    return super(AnalyzerOutputsDatasetKey, cls).__new__(
+        cls, dataset_keys=dataset_keys)
+
+  def __str__(self):
+    return _describe_dataset_keys('OUTPUTS', self.dataset_keys)
+
+
+def make_merged_dataset_keys(dataset_keys, span_size):
+  """Groups contiguous dataset keys into `MergedDatasetKey`s.
+
+  Dataset keys are ordered lexicographically, so keys should be named such that
+  this order is meaningful (e.g. 'span-0001', 'span-0002', ...).  Trailing keys
+  that do not fill a complete span are not merged.
+
+  Args:
+    dataset_keys: An iterable of dataset keys (strings) or `MergedDatasetKey`s.
+      `MergedDatasetKey`s are expanded to the keys they merge, which allows
+      building a hierarchy of merged keys.
+    span_size: The number of entries of `dataset_keys` to merge together.
+
+  Returns:
+    A list of `MergedDatasetKey`s.
+  """
+  if span_size < 2:
+    raise ValueError('span_size must be at least 2, got: {}'.format(span_size))
+  sorted_keys = sorted(dataset_keys, key=_dataset_key_sort_key)
+  result = []
+  for start in range(0, len(sorted_keys) - span_size + 1, span_size):
+    merged = []
+    for key in sorted_keys[start:start + span_size]:
+      if isinstance(key, MergedDatasetKey):
+        merged.extend(key.dataset_keys)
+      else:
+        merged.append(key)
+    result.append(MergedDatasetKey(merged))
+  return result
+
+
+def cover_dataset_keys(dataset_keys, merged_dataset_keys):
+  """Covers dataset keys with as few `MergedDatasetKey`s as possible.
+
+  Largest merged keys are picked first, and only merged keys whose dataset keys
+  are all still uncovered are used.
+
+  Args:
+    dataset_keys: An iterable of dataset keys (strings).
+    merged_dataset_keys: An iterable of `MergedDatasetKey`s available for use.
+
+  Returns:
+    A 2-tuple of: the list of `MergedDatasetKey`s that were used, and the list
+    of dataset keys which are not covered by them (in the order of
+    `dataset_keys`).
+  """
+  dataset_keys = list(dataset_keys)
+  remaining = set(dataset_keys)
+  used = []
+  for merged_key in sorted(
+      set(merged_dataset_keys),
+      key=lambda k: (-len(k.dataset_keys), k.dataset_keys)):
+    if remaining.issuperset(merged_key.dataset_keys):
+      used.append(merged_key)
+      remaining.difference_update(merged_key.dataset_keys)
+  return used, [key for key in dataset_keys if key in remaining]
 
 
 class WriteAnalysisCacheToFS(beam.PTransform):
-  """Writes a cache object that can be read by ReadAnalysisCacheFromFS."""
+  """Writes a cache object that can be read by ReadAnalysisCacheFromFS.
+
+  Cache entries are written to paths derived from their cache entry keys and a
+  unique id of this write.  The manifest of each dataset key is written once
+  all of its cache entries are written, and is renamed into place, so partially
+  written cache is never read.  Each write adds its own manifest, and readers
+  merge all manifests, so concurrent writers to the same cache_base_dir do not
+  overwrite each other's cache.
+  """
 
   def __init__(self, cache_base_dir, sink=None):
     """Init method.
@@ -53,29 +186,57 @@ class WriteAnalysisCacheToFS(beam.PTransform):
     # possible.
     self._sink = sink if sink is not None else beam.io.WriteToTFRecord
 
-  # TODO(b/37788560): Allow merging of 2 manifests in case there is already
-  # partial cache.
   def expand(self, dataset_cache_dict):
+    write_id = _make_write_id()
 
     cache_is_written = []
+    merged_dataset_keys = []
+    merged_manifests_written = []
     for dataset_key, cache_dict in six.iteritems(dataset_cache_dict):
+      if not cache_dict:
+        continue
       manifest = {}
+      entries_written = []
       dataset_key_dir = os.path.join(self._cache_base_dir,
                                      _make_dataset_key(dataset_key))
-      for cache_key_idx, (cache_entry_key,
-                          cache_pcoll) in enumerate(six.iteritems(cache_dict)):
-        path = os.path.join(dataset_key_dir, str(cache_key_idx))
-        manifest[cache_entry_key] = cache_key_idx
-        cache_is_written.append(
+      for cache_entry_key, cache_pcoll in six.iteritems(cache_dict):
+        entry_name = _make_cache_entry_name(cache_entry_key, write_id)
+        manifest[cache_entry_key] = entry_name
+        entries_written.append(
             cache_pcoll
-            | 'WriteCache[{}][{}]'.format(dataset_key, cache_key_idx) >>
-            self._sink(path, file_name_suffix='.gz'))
+            | 'WriteCache[{}][{}]'.format(dataset_key, entry_name) >>
+            self._sink(
+                os.path.join(dataset_key_dir, entry_name),
+                file_name_suffix='.gz'))
 
-      if not tf.io.gfile.isdir(dataset_key_dir):
-        tf.io.gfile.makedirs(dataset_key_dir)
-      with tf.io.gfile.GFile(
-          os.path.join(dataset_key_dir, _MANIFEST_FILE_NAME), 'w') as f:
-        f.write(pickler.dumps(manifest))
+      manifest_written = (
+          tuple(entries_written)
+          | 'FlattenWrittenCache[{}]'.format(dataset_key) >> beam.Flatten()
+          | 'WaitForCache[{}]'.format(dataset_key) >>
+          beam.combiners.Count.Globally()
+          | 'WriteManifest[{}]'.format(dataset_key) >> beam.Map(
+              _write_file_atomically,
+              os.path.join(dataset_key_dir,
+                           '{}-{}'.format(_MANIFEST_FILE_NAME, write_id)),
+              pickler.dumps(manifest)))
+      cache_is_written.append(manifest_written)
+      if isinstance(dataset_key, MergedDatasetKey):
+        merged_dataset_keys.append(dataset_key)
+        merged_manifests_written.append(manifest_written)
+
+    # Merged dataset keys are only listed once their cache is readable.
+    if merged_dataset_keys:
+      cache_is_written.append(
+          tuple(merged_manifests_written)
+          | 'FlattenMergedManifests' >> beam.Flatten()
+          | 'WaitForMergedManifests' >> beam.combiners.Count.Globally()
+          | 'WriteMergedDatasetKeys' >> beam.Map(
+              _write_file_atomically,
+              os.path.join(
+                  self._cache_base_dir,
+                  '{}-{}'.format(_MERGED_DATASET_KEYS_FILE_NAME, write_id)),
+              pickler.dumps(
+                  sorted(key.dataset_keys for key in merged_dataset_keys))))
 
     return cache_is_written
 
@@ -83,34 +244,89 @@ class WriteAnalysisCacheToFS(beam.PTransform):
 class ReadAnalysisCacheFromFS(beam.PTransform):
   """Reads cache from the FS written by WriteAnalysisCacheToFS."""
 
-  def __init__(self, cache_base_dir, dataset_keys, source=None):
+  def __init__(self,
+               cache_base_dir,
+               dataset_keys,
+               source=None,
+               cache_entry_keys=None):
     """Init method.
 
     Args:
       cache_base_dir: A string, the path that the cache should be stored in.
-      dataset_keys: An iterable of strings.
+      dataset_keys: An iterable of strings. Cache entries written for
+        `MergedDatasetKey`s are read in place of the same cache entries of the
+        dataset keys they cover, in which case the output is keyed by the
+        `MergedDatasetKey`.  Other cache entries of the covered dataset keys
+        are still read.
+        Cache of analyzer outputs over exactly these dataset keys is keyed by
+        an `AnalyzerOutputsDatasetKey`.
       source: (Optional) A PTransform class that takes a path argument in its
         constructor, and is used to read the cache.
+      cache_entry_keys: (Optional) A collection of the cache entry keys to read,
+        for example the result of
+        `analysis_graph_builder.get_analysis_cache_entry_keys`.  If not
+        specified, all cache entries are read.
     """
     self._cache_base_dir = cache_base_dir
-    self._dataset_keys = dataset_keys
+    self._dataset_keys = list(dataset_keys)
+    self._cache_entry_keys = (
+        None if cache_entry_keys is None else frozenset(cache_entry_keys))
     # TODO(b/37788560): Possibly use Riegeli as a default file format once
     # possible.
     self._source = source if source is not None else beam.io.ReadFromTFRecord
 
   def expand(self, pvalue):
-    cache_dict = {}
+    manifests = {}
+
+    def get_manifest(dataset_key):
+      """Returns the manifest of a dataset key, without unused entries."""
+      if dataset_key not in manifests:
+        manifest = _read_manifest(
+            os.path.join(self._cache_base_dir, _make_dataset_key(dataset_key)))
+        if self._cache_entry_keys is not None:
+          manifest = {
+              key: value
+              for key, value in six.iteritems(manifest)
+              if key in self._cache_entry_keys
+          }
+        manifests[dataset_key] = manifest
+      return manifests[dataset_key]
+
+    # Only merged keys with cache entries that are used can cover dataset keys.
+    merged_dataset_keys = [
+        key for key in _read_merged_dataset_keys(self._cache_base_dir)
+        if get_manifest(key)
+    ]
+    used_merged_keys, _ = cover_dataset_keys(self._dataset_keys,
+                                             merged_dataset_keys)
+    covering_merged_keys = {}
+    for merged_key in used_merged_keys:
+      for dataset_key in merged_key.dataset_keys:
+        covering_merged_keys[dataset_key] = merged_key
 
-    for dataset_key in self._dataset_keys:
+    dataset_keys_to_read = used_merged_keys + self._dataset_keys
+    # Analyzer outputs cached for exactly these dataset keys are also read.
+    if self._dataset_keys:
+      dataset_keys_to_read.append(AnalyzerOutputsDatasetKey(self._dataset_keys))
 
+    cache_dict = {}
+    for dataset_key in dataset_keys_to_read:
+      manifest = get_manifest(dataset_key)
+      # Entries of a covered dataset key are only read if the merged key which
+      # covers it doesn't hold them.
+      merged_key = covering_merged_keys.get(dataset_key)
+      if merged_key is not None:
+        merged_manifest = get_manifest(merged_key)
+        manifest = {
+            key: value
+            for key, value in six.iteritems(manifest)
+            if key not in merged_manifest
+        }
+      if not manifest:
+        continue
       dataset_cache_path = os.path.join(self._cache_base_dir,
                                         _make_dataset_key(dataset_key))
-      if not tf.io.gfile.isdir(dataset_cache_path):
-        continue
       cache_dict[dataset_key] = {}
-      with tf.io.gfile.GFile(
-          os.path.join(dataset_cache_path, _MANIFEST_FILE_NAME), 'r') as f:
-        manifest = pickler.loads(f.read())
       for key, value in six.iteritems(manifest):
         cache_dict[dataset_key][key] = (
             pvalue.pipeline
@@ -120,6 +336,66 @@ class ReadAnalysisCacheFromFS(beam.PTransform):
     return cache_dict
 
 
+def _write_file_atomically(unused_element, path, contents):
+  """Writes a file via a temporary file so it is never read partially."""
+  dirname = os.path.dirname(path)
+  if not tf.io.gfile.isdir(dirname):
+    tf.io.gfile.makedirs(dirname)
+  temp_path = os.path.join(dirname, '.tmp-{}'.format(uuid.uuid4().hex))
+  with tf.io.gfile.GFile(temp_path, 'wb') as f:
+    f.write(contents)
+  tf.io.gfile.rename(temp_path, path, overwrite=True)
+
+
+def _read_pickled_files(pattern):
+  """Yields the unpickled contents of all files matching pattern, in order."""
+  for path in sorted(tf.io.gfile.glob(pattern)):
+    with tf.io.gfile.GFile(path, 'rb') as f:
+      yield pickler.loads(f.read())
+
+
+def _read_manifest(dataset_cache_path):
+  """Merges all manifests written for a dataset key.
+
+  Args:
+    dataset_cache_path: The cache directory of a dataset key.
+
+  Returns:
+    A dictionary from cache entry key to the name of its cache files, which is
+    empty if there is no complete cache for the dataset key.  Entries written
+    with a compatible earlier cache version are keyed by the cache entry key of
+    the current version, unless it was also written.
+  """
+  manifest = {}
+  compatible_manifest = {}
+  # Manifests of earlier writes (as ordered by their names, see
+  # _make_write_id) take precedence, so that the files read for a cache entry
+  # do not change once it is written.
+  for written_manifest in _read_pickled_files(
+      os.path.join(dataset_cache_path, _MANIFEST_FILE_NAME + '*')):
+    for key, value in six.iteritems(written_manifest):
+      for version in _COMPATIBLE_CACHE_VERSIONS:
+        if key.startswith(version):
+          compatible_manifest.setdefault(
+              _CACHE_VERSION + key[len(version):], value)
+          break
+      else:
+        manifest.setdefault(key, value)
+  for key, value in six.iteritems(compatible_manifest):
+    manifest.setdefault(key, value)
+  return manifest
+
+
+def _make_write_id():
+  """Returns a unique id for a write, ids of later writes sort after."""
+  return '{:013x}{}'.format(int(time.time() * 1000), uuid.uuid4().hex[:8])
+
+
+def _make_cache_entry_name(cache_entry_key, write_id):
+  return '{}-{}'.format(
+      hashlib.sha1(tf.compat.as_bytes(cache_entry_key)).hexdigest(), write_id)
+
+
 def validate_dataset_keys(keys):
   regex = re.compile(r'^[a-zA-Z0-9\.\-_]+$')
   for key in keys:
@@ -133,8 +409,30 @@ def make_cache_entry_key(cache_key):
   return _CACHE_VERSION + tf.compat.as_bytes(cache_key)
 
 
+def _read_merged_dataset_keys(cache_base_dir):
+  merged_dataset_keys = set()
+  for written_keys in _read_pickled_files(
+      os.path.join(cache_base_dir, _MERGED_DATASET_KEYS_FILE_NAME + '*')):
+    merged_dataset_keys.update(written_keys)
+  return [MergedDatasetKey(keys) for keys in sorted(merged_dataset_keys)]
+
+
+def _describe_dataset_keys(prefix, dataset_keys):
+  """Returns a short name for a sorted tuple of dataset keys."""
+  fingerprint = hashlib.sha1(
+      tf.compat.as_bytes('\n'.join(dataset_keys))).hexdigest()[:8]
+  return '{}-{}-{}-{}-{}'.format(prefix, dataset_keys[0], dataset_keys[-1],
+                                 len(dataset_keys), fingerprint)
+
+
+def _dataset_key_sort_key(dataset_key):
+  if isinstance(dataset_key, MergedDatasetKey):
+    return dataset_key.dataset_keys
+  return (dataset_key,)
+
+
 def _make_dataset_key(dataset_key):
-  return _make_valid_cache_component(dataset_key)
+  return _make_valid_cache_component(str(dataset_key))
 
 
 def _make_valid_cache_component(name):
@@ -43,11 +43,70 @@ class AnalyzerCacheTest(test_case.TransformTestCase):
           ValueError, 'Dataset key .* does not match allowed pattern:'):
         analyzer_cache.validate_dataset_keys({key})
 
+  def test_merged_dataset_key(self):
+    key = analyzer_cache.MergedDatasetKey(['span-2', 'span-0', 'span-1'])
+    self.assertEqual(key.dataset_keys, ('span-0', 'span-1', 'span-2'))
+    self.assertEqual(key, analyzer_cache.MergedDatasetKey(key.dataset_keys))
+    self.assertRegexpMatches(str(key), r'^MERGED-span-0-span-2-3-[0-9a-f]{8}$')
+    analyzer_cache.validate_dataset_keys({str(key)})
+
+    with self.assertRaisesRegexp(ValueError, 'at least 2 dataset keys'):
+      analyzer_cache.MergedDatasetKey(['span-0', 'span-0'])
+    with self.assertRaisesRegexp(ValueError, 'does not match allowed pattern'):
+      analyzer_cache.MergedDatasetKey(['span-0', 'span/1'])
+
+  def test_analyzer_outputs_dataset_key(self):
+    key = analyzer_cache.AnalyzerOutputsDatasetKey(['span-1', 'span-0'])
+    self.assertEqual(key.dataset_keys, ('span-0', 'span-1'))
+    self.assertRegexpMatches(str(key), r'^OUTPUTS-span-0-span-1-2-[0-9a-f]{8}$')
+    self.assertNotEqual(
+        str(key), str(analyzer_cache.MergedDatasetKey(key.dataset_keys)))
+    self.assertEqual(
+        str(analyzer_cache.AnalyzerOutputsDatasetKey(['span-0'])),
+        str(analyzer_cache.AnalyzerOutputsDatasetKey(['span-0'])))
+
+  def test_make_merged_dataset_keys(self):
+    days = ['day-{}'.format(i) for i in range(5)]
+    weeks = analyzer_cache.make_merged_dataset_keys(days, 2)
+    self.assertEqual(weeks, [
+        analyzer_cache.MergedDatasetKey(['day-0', 'day-1']),
+        analyzer_cache.MergedDatasetKey(['day-2', 'day-3']),
+    ])
+    self.assertEqual(
+        analyzer_cache.make_merged_dataset_keys(weeks, 2),
+        [analyzer_cache.MergedDatasetKey(days[:4])])
+    with self.assertRaisesRegexp(ValueError, 'span_size must be at least 2'):
+      analyzer_cache.make_merged_dataset_keys(days, 1)
+
+  def test_cover_dataset_keys(self):
+    days = ['day-{}'.format(i) for i in range(6)]
+    weeks = analyzer_cache.make_merged_dataset_keys(days, 2)
+    month = analyzer_cache.MergedDatasetKey(days[:4])
+    used, remaining = analyzer_cache.cover_dataset_keys(days, weeks + [month])
+    self.assertEqual(used, [month, weeks[2]])
+    self.assertEqual(remaining, [])
+
+    used, remaining = analyzer_cache.cover_dataset_keys(days[1:],
+                                                        weeks + [month])
+    self.assertEqual(used, [weeks[1], weeks[2]])
+    self.assertEqual(remaining, ['day-1'])
+
   @test_case.named_parameters(
       dict(
           testcase_name='JsonNumpyCacheCoder',
           coder_cls=analyzer_nodes.JsonNumpyCacheCoder,
           value=[1, 2.5, 3, '4']),
+      dict(
+          testcase_name='BinaryNumpyCacheCoder',
+          coder_cls=analyzer_nodes.BinaryNumpyCacheCoder,
+          value=[
+              np.array([1, 2], np.int32),
+              np.array(2.5, np.float32), 3, 4.5, b'5', u'6', None
+          ]),
+      dict(
+          testcase_name='BinaryNumpyCacheCoderNone',
+          coder_cls=analyzer_nodes.BinaryNumpyCacheCoder,
+          value=None),
       dict(
           testcase_name='_VocabularyAccumulatorCoderIntAccumulator',
           coder_cls=analyzer_nodes._VocabularyAccumulatorCoder,
@@ -70,6 +129,46 @@ class AnalyzerCacheTest(test_case.TransformTestCase):
     encoded = coder.encode_cache(value)
     np.testing.assert_equal(value, coder.decode_cache(encoded))
 
+  @test_case.named_parameters(
+      dict(
+          testcase_name='BinaryNumpyCacheCoder',
+          coder_cls=analyzer_nodes.BinaryNumpyCacheCoder,
+          value=[np.array([1, 2], np.int32),
+                 np.array([[.5], [1.5]], np.float32)]),
+      dict(
+          testcase_name='_VocabularyAccumulatorCoder',
+          coder_cls=analyzer_nodes._VocabularyAccumulatorCoder,
+          value=(b'A',
+                 analyzers._WeightedMeanAndVarAccumulator(
+                     count=np.array(5, np.int64),
+                     mean=np.array([.4, .9], np.float32),
+                     variance=np.array([.1, .4], np.float32),
+                     weight=np.array(0., np.float64)))),
+  )
+  def test_binary_coders_preserve_dtypes(self, coder_cls, value):
+    coder = coder_cls()
+    decoded = coder.decode_cache(coder.encode_cache(value))
+    np.testing.assert_equal(value, decoded)
+    for expected, actual in zip(tf.nest.flatten(value),
+                                tf.nest.flatten(decoded)):
+      self.assertEqual(np.asarray(expected).dtype, np.asarray(actual).dtype)
+
+  @test_case.named_parameters(
+      dict(
+          testcase_name='BinaryNumpyCacheCoder',
+          coder_cls=analyzer_nodes.BinaryNumpyCacheCoder,
+          encoded=b'[[1, 2], [3, 4]]',
+          expected=np.array([[1, 2], [3, 4]])),
+      dict(
+          testcase_name='_VocabularyAccumulatorCoder',
+          coder_cls=analyzer_nodes._VocabularyAccumulatorCoder,
+          encoded=b'["a", [2, [0.0, 1.0], [0.0, 0.0], 1.0]]',
+          expected=('a', (np.array(2), np.array([0., 1.]), np.array([0., 0.]),
+                          np.array(1.)))),
+  )
+  def test_binary_coders_decode_json_cache(self, coder_cls, encoded, expected):
+    np.testing.assert_equal(expected, coder_cls().decode_cache(encoded))
+
   def test_cache_helpers_round_trip(self):
     base_test_dir = os.path.join(
         os.environ.get('TEST_UNDECLARED_OUTPUTS_DIR', self.get_temp_dir()),
@@ -113,6 +212,157 @@ class AnalyzerCacheTest(test_case.TransformTestCase):
           assert_equal_matcher(b'[9, 5, 2, 1]'),
           label='AssertC')
 
+  def test_cache_writes_merge_manifests(self):
+    base_test_dir = os.path.join(
+        os.environ.get('TEST_UNDECLARED_OUTPUTS_DIR', self.get_temp_dir()),
+        self._testMethodName)
+
+    with beam.Pipeline() as p:
+      _ = {
+          'dataset_key_0': {
+              'a': p | 'CreateA' >> beam.Create([b'[1]']),
+          },
+      } | 'WriteFirst' >> analyzer_cache.WriteAnalysisCacheToFS(base_test_dir)
+
+    with beam.Pipeline() as p:
+      _ = {
+          'dataset_key_0': {
+              'a': p | 'CreateA' >> beam.Create([b'[2]']),
+              'b': p | 'CreateB' >> beam.Create([b'[3]']),
+          },
+      } | 'WriteSecond' >> analyzer_cache.WriteAnalysisCacheToFS(base_test_dir)
+
+    # A directory with cache but no manifest is partially written.
+    tf.io.gfile.makedirs(os.path.join(base_test_dir, 'dataset_key_1'))
+    with tf.io.gfile.GFile(
+        os.path.join(base_test_dir, 'dataset_key_1', 'partial-0-of-1.gz'),
+        'w') as f:
+      f.write('')
+
+    with beam.Pipeline() as p:
+      read_cache = p | analyzer_cache.ReadAnalysisCacheFromFS(
+          base_test_dir, ['dataset_key_0', 'dataset_key_1'])
+
+      self.assertItemsEqual(read_cache.keys(), ['dataset_key_0'])
+      self.assertItemsEqual(read_cache['dataset_key_0'].keys(), ['a', 'b'])
+      # The entry which was written first is read.
+      beam_test_util.assert_that(
+          read_cache['dataset_key_0']['a'],
+          beam_test_util.equal_to([b'[1]']),
+          label='AssertA')
+      beam_test_util.assert_that(
+          read_cache['dataset_key_0']['b'],
+          beam_test_util.equal_to([b'[3]']),
+          label='AssertB')
+
+  def test_cache_helpers_with_merged_dataset_keys(self):
+    base_test_dir = os.path.join(
+        os.environ.get('TEST_UNDECLARED_OUTPUTS_DIR', self.get_temp_dir()),
+        self._testMethodName)
+    dataset_keys = ['span-0', 'span-1', 'span-2']
+    merged_key = analyzer_cache.MergedDatasetKey(dataset_keys[:2])
+
+    with beam.Pipeline() as p:
+      cache_pcoll_dict = {
+          key: {
+              'a': p | 'Create[{}]'.format(key) >> beam.Create([b'[1]'])
+          } for key in dataset_keys
+      }
+      cache_pcoll_dict[merged_key] = {
+          'a': p | 'CreateMerged' >> beam.Create([b'[2]'])
+      }
+      _ = cache_pcoll_dict | analyzer_cache.WriteAnalysisCacheToFS(
+          base_test_dir)
+
+    with beam.Pipeline() as p:
+      read_cache = p | analyzer_cache.ReadAnalysisCacheFromFS(
+          base_test_dir, dataset_keys)
+
+      self.assertItemsEqual(read_cache.keys(), [merged_key, 'span-2'])
+      beam_test_util.assert_that(
+          read_cache[merged_key]['a'],
+          beam_test_util.equal_to([b'[2]']),
+          label='AssertMerged')
+      beam_test_util.assert_that(
+          read_cache['span-2']['a'],
+          beam_test_util.equal_to([b'[1]']),
+          label='AssertSpan2')
+
+    # The merged cache is not used when only some of its keys are requested.
+    with beam.Pipeline() as p:
+      read_cache = p | analyzer_cache.ReadAnalysisCacheFromFS(
+          base_test_dir, dataset_keys[1:])
+      self.assertItemsEqual(read_cache.keys(), dataset_keys[1:])
+
+  def test_read_cache_entries_not_held_by_merged_dataset_keys(self):
+    base_test_dir = os.path.join(
+        os.environ.get('TEST_UNDECLARED_OUTPUTS_DIR', self.get_temp_dir()),
+        self._testMethodName)
+    dataset_keys = ['span-0', 'span-1']
+    merged_key = analyzer_cache.MergedDatasetKey(dataset_keys)
+
+    with beam.Pipeline() as p:
+      cache_pcoll_dict = {
+          key: {
+              'a': p | 'CreateA[{}]'.format(key) >> beam.Create([b'[1]']),
+              'b': p | 'CreateB[{}]'.format(key) >> beam.Create([b'[3]']),
+          } for key in dataset_keys
+      }
+      cache_pcoll_dict[merged_key] = {
+          'a': p | 'CreateMerged' >> beam.Create([b'[2]'])
+      }
+      _ = cache_pcoll_dict | analyzer_cache.WriteAnalysisCacheToFS(
+          base_test_dir)
+
+    # Entries which the merged key doesn't hold are read from the keys it
+    # covers.
+    with beam.Pipeline() as p:
+      read_cache = p | analyzer_cache.ReadAnalysisCacheFromFS(
+          base_test_dir, dataset_keys)
+      self.assertItemsEqual(read_cache.keys(), [merged_key] + dataset_keys)
+      self.assertItemsEqual(read_cache[merged_key].keys(), ['a'])
+      for key in dataset_keys:
+        self.assertItemsEqual(read_cache[key].keys(), ['b'])
+        beam_test_util.assert_that(
+            read_cache[key]['b'],
+            beam_test_util.equal_to([b'[3]']),
+            label='Assert[{}]'.format(key))
+
+    # A merged key without used cache entries doesn't cover any keys.
+    with beam.Pipeline() as p:
+      read_cache = p | analyzer_cache.ReadAnalysisCacheFromFS(
+          base_test_dir, dataset_keys, cache_entry_keys=['b'])
+      self.assertItemsEqual(read_cache.keys(), dataset_keys)
+      for key in dataset_keys:
+        self.assertItemsEqual(read_cache[key].keys(), ['b'])
+
+  def test_cache_helpers_with_analyzer_outputs(self):
+    base_test_dir = os.path.join(
+        os.environ.get('TEST_UNDECLARED_OUTPUTS_DIR', self.get_temp_dir()),
+        self._testMethodName)
+    dataset_keys = ['span-0', 'span-1']
+    outputs_key = analyzer_cache.AnalyzerOutputsDatasetKey(dataset_keys)
+
+    with beam.Pipeline() as p:
+      _ = {
+          outputs_key: {
+              'a': p | 'CreateA' >> beam.Create([b'[1]'])
+          }
+      } | analyzer_cache.WriteAnalysisCacheToFS(base_test_dir)
+
+    with beam.Pipeline() as p:
+      read_cache = p | analyzer_cache.ReadAnalysisCacheFromFS(
+          base_test_dir, dataset_keys)
+      self.assertItemsEqual(read_cache.keys(), [outputs_key])
+      beam_test_util.assert_that(
+          read_cache[outputs_key]['a'], beam_test_util.equal_to([b'[1]']))
+
+    # Analyzer outputs are only read for the same dataset keys.
+    with beam.Pipeline() as p:
+      read_cache = p | analyzer_cache.ReadAnalysisCacheFromFS(
+          base_test_dir, dataset_keys + ['span-2'])
+      self.assertFalse(read_cache)
+
   def test_cache_helpers_with_alternative_io(self):
 
     class LocalSink(beam.PTransform):
@@ -183,6 +183,24 @@ class VocabularyAccumulateImpl(beam.PTransform):
     return raw_counts
 
 
+@common.register_ptransform(analyzer_nodes.VocabularyMergeAccumulators)
+class VocabularyMergeAccumulatorsImpl(beam.PTransform):
+  """Merges vocabulary accumulators into a single accumulator per token."""
+
+  def __init__(self, operation, extra_args):
+    self._vocab_ordering_type = operation.vocab_ordering_type
+
+  def expand(self, inputs):
+    if (self._vocab_ordering_type ==
+        tf_utils.VocabOrderingType.WEIGHTED_MUTUAL_INFORMATION):
+      combine_transform = _MutualInformationTransformAccumulate()  # pylint: disable=no-value-for-parameter
+    else:
+      combine_transform = beam.CombinePerKey(sum)
+
+    pcoll, = inputs
+    return pcoll | 'MergeCountPerToken' >> combine_transform
+
+
 @common.register_ptransform(analyzer_nodes.VocabularyMerge)
 @beam.typehints.with_input_types(KV[np.str, Union[int, float]])
 # TODO(b/123325923): Constrain the value type here to the right string type.
@@ -703,6 +721,16 @@ def _merge_outputs_by_key(keys_and_outputs, outputs_dtype):
                                                     dtype=dtype.as_numpy_dtype))
 
 
+def _combiner_has_defaults(combiner):
+  """Returns whether the combiner can handle an empty input PCollection."""
+  # NOTE: Currently, all other combiners require .with_defaults(False) to be
+  # set.
+  # TODO(b/34792459): Don't set with_defaults.
+  if isinstance(combiner, analyzers.QuantilesCombiner):
+    return True
+  return getattr(combiner, 'has_default_output', False)
+
+
 @common.register_ptransform(analyzer_nodes.CacheableCombineAccumulate)
 class _IntermediateAccumulateCombineImpl(beam.PTransform):
   """Implement an analyzer based on a Combine."""
@@ -715,10 +743,7 @@ class _IntermediateAccumulateCombineImpl(beam.PTransform):
 
   def expand(self, inputs):
     pcoll, = inputs
-    # NOTE: Currently, all combiners except QuantilesCombiner
-    # require .with_defaults(False) to be set.
-    # TODO(b/34792459): Don't set with_defaults.
-    has_defaults = isinstance(self._combiner, analyzers.QuantilesCombiner)
+    has_defaults = _combiner_has_defaults(self._combiner)
 
     return (
         pcoll
@@ -742,10 +767,7 @@ class _MergeAccumulatorsCombineImpl(beam.PTransform):
 
   def expand(self, inputs):
     pcoll, = inputs
-    # NOTE: Currently, all combiners except QuantilesCombiner
-    # require .with_defaults(False) to be set.
-    # TODO(b/34792459): Don't set with_defaults.
-    has_defaults = isinstance(self._combiner, analyzers.QuantilesCombiner)
+    has_defaults = _combiner_has_defaults(self._combiner)
 
     def extract_outputs(outputs, num_outputs):
       if len(outputs) != num_outputs:
@@ -769,6 +791,28 @@ class _MergeAccumulatorsCombineImpl(beam.PTransform):
     return tuple(outputs_tuple[key] for key in output_keys)
 
 
+@common.register_ptransform(analyzer_nodes.CacheableCombineMergeAccumulators)
+class _MergeAccumulatorsOnlyCombineImpl(beam.PTransform):
+  """Merges the accumulators of a Combine into a single accumulator."""
+
+  def __init__(self, operation, extra_args):
+    self._combiner = operation.combiner
+    self._serialized_tf_config = extra_args.serialized_tf_config
+
+  def expand(self, inputs):
+    pcoll, = inputs
+    # An empty input is kept empty so that it is encoded as an empty cache
+    # entry, which decodes back to an empty input.
+    return (
+        pcoll
+        | 'MergeAccumulatorsGlobally' >> beam.CombineGlobally(
+            _CombinerWrapper(
+                self._combiner,
+                self._serialized_tf_config,
+                is_combining_accumulators=True,
+                should_extract_output=False)).with_defaults(False))
+
+
 @common.register_ptransform(analyzer_nodes.CacheableCombinePerKeyAccumulate)
 class _IntermediateAccumulateCombinePerKeyImpl(beam.PTransform):
   """Implement an analyzer based on a CombinePerKey."""
@@ -788,6 +832,26 @@ class _IntermediateAccumulateCombinePerKeyImpl(beam.PTransform):
                     is_combining_accumulators=False)))
 
 
+@common.register_ptransform(
+    analyzer_nodes.CacheableCombinePerKeyMergeAccumulators)
+class _MergeAccumulatorsOnlyCombinePerKeyImpl(beam.PTransform):
+  """Merges the accumulators of a CombinePerKey into one accumulator per key."""
+
+  def __init__(self, operation, extra_args):
+    self._combiner = operation.combiner
+    self._serialized_tf_config = extra_args.serialized_tf_config
+
+  def expand(self, inputs):
+    pcoll, = inputs
+    return (pcoll
+            | 'MergeAccumulatorsPerKey' >> beam.CombinePerKey(
+                _CombinerWrapper(
+                    self._combiner,
+                    self._serialized_tf_config,
+                    is_combining_accumulators=True,
+                    should_extract_output=False)))
+
+
 @common.register_ptransform(analyzer_nodes.CacheableCombinePerKeyMerge)
 class _MergeAccumulatorsCombinePerKeyImpl(beam.PTransform):
   """Implement an analyzer based on a CombinePerKey."""
@@ -0,0 +1,117 @@
+# Copyright 2019 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks of applying a transform function to batches with Beam.
+
+Run with `--benchmarks=.`, see `benchmark_utils` for how to write and compare
+JSON reports.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import tempfile
+
+# GOOGLE-INITIALIZATION
+
+import six
+import tensorflow as tf
+from tensorflow_transform import benchmark_utils
+from tensorflow_transform import impl_helper
+from tensorflow_transform import test_case
+from tensorflow_transform.beam import impl as beam_impl
+from tensorflow_transform.beam import shared
+from tensorflow_transform.saved import saved_transform_io
+from tensorflow_transform.tf_metadata import dataset_schema
+
+_NUM_BATCHES = 10
+_BATCH_SIZE = 1000
+
+
+def _write_transform_fn(feature_spec):
+  """Writes a transform function which copies its inputs to its outputs."""
+  export_path = os.path.join(tempfile.mkdtemp(), 'transform_fn')
+  with tf.Graph().as_default():
+    with tf.compat.v1.Session().as_default() as session:
+      inputs = impl_helper.feature_spec_as_batched_placeholders(feature_spec)
+      outputs = {}
+      for name, tensor in six.iteritems(inputs):
+        if isinstance(tensor, tf.SparseTensor):
+          outputs[name] = tf.SparseTensor(
+              tf.identity(tensor.indices), tf.identity(tensor.values),
+              tf.identity(tensor.dense_shape))
+        else:
+          outputs[name] = tf.identity(tensor)
+      saved_transform_io.write_saved_transform_from_session(
+          session, inputs, outputs, export_path)
+  return export_path
+
+
+class RunMetaGraphDoFnBenchmark(benchmark_utils.Benchmark):
+  """Benchmarks the throughput of `_RunMetaGraphDoFn` on synthetic batches.
+
+  The graph state is loaded before the benchmark runs, so this measures
+  converting batches to and from the feed and fetches of the graph, and
+  running it.
+  """
+
+  def _benchmark_run_meta_graph(self, feature_spec_name, input_record_coder):
+    feature_spec = benchmark_utils.FEATURE_SPECS[feature_spec_name]
+    schema = dataset_schema.from_feature_spec(feature_spec)
+    saved_model_dir = _write_transform_fn(feature_spec)
+    instances = benchmark_utils.make_synthetic_instances(
+        feature_spec, _NUM_BATCHES * _BATCH_SIZE)
+    if input_record_coder is not None:
+      instances = [input_record_coder.encode(instance)
+                   for instance in instances]
+    batches = [
+        instances[start:start + _BATCH_SIZE]
+        for start in range(0, len(instances), _BATCH_SIZE)
+    ]
+    dofn = beam_impl._RunMetaGraphDoFn(  # pylint: disable=protected-access
+        schema,
+        serialized_tf_config=None,
+        shared_graph_state_handle=shared.Shared(),
+        passthrough_keys=set(),
+        input_record_coder=input_record_coder)
+    # Loads the graph state.
+    list(dofn.process(batches[0], saved_model_dir))
+
+    def run():
+      for batch in batches:
+        list(dofn.process(batch, saved_model_dir))
+
+    self.run_and_report_benchmark(
+        '_RunMetaGraphDoFn.{}{}'.format(
+            feature_spec_name, '.csv' if input_record_coder else ''), run,
+        len(instances))
+
+  def benchmarkDense(self):
+    self._benchmark_run_meta_graph('dense', None)
+
+  def benchmarkVarLen(self):
+    self._benchmark_run_meta_graph('varlen', None)
+
+  def benchmarkSparse(self):
+    self._benchmark_run_meta_graph('sparse', None)
+
+  def benchmarkDenseCsvRecords(self):
+    self._benchmark_run_meta_graph(
+        'dense',
+        benchmark_utils.make_csv_coder(benchmark_utils.DENSE_FEATURE_SPEC))
+
+
+if __name__ == '__main__':
+  test_case.main()
@@ -18,11 +18,14 @@ from __future__ import division
 from __future__ import print_function
 import collections
 import itertools
+import json
 import os
 # GOOGLE-INITIALIZATION
 import apache_beam as beam
+from apache_beam.internal import pickler
 from apache_beam.testing import util as beam_test_util
 
+import numpy as np
 import six
 import tensorflow as tf
 import tensorflow_transform as tft
@@ -47,6 +50,28 @@ def _get_counter_value(metrics, name):
   return committed
 
 
+def _to_json_compatible(value):
+  if isinstance(value, bytes):
+    return tf.compat.as_text(value)
+  if isinstance(value, (np.ndarray, np.generic)):
+    return value.tolist()
+  if isinstance(value, (list, tuple)):
+    return [_to_json_compatible(item) for item in value]
+  return value
+
+
+def _decode_vocabulary_cache_as_json(encoded_cache):
+  """Decodes a vocabulary cache entry and re-encodes it as JSON for asserts."""
+  accumulator = analyzer_nodes._VocabularyAccumulatorCoder().decode_cache(
+      encoded_cache)
+  return tf.compat.as_bytes(json.dumps(_to_json_compatible(accumulator)))
+
+
+def _encode_numpy_cache(accumulator):
+  return analyzer_nodes.BinaryNumpyCacheCoder().encode_cache(
+      np.array(accumulator))
+
+
 class _TestPipeline(beam.Pipeline):
 
   @property
@@ -66,6 +91,42 @@ class _TestPipeline(beam.Pipeline):
       self._run_result.wait_until_finish()
 
 
+def _preprocessing_fn_for_mixed_analyzers(inputs):
+
+  integerized_s = tft.compute_and_apply_vocabulary(inputs['s'])
+
+  _ = tft.bucketize(inputs['x'], 2, name='bucketize')
+
+  return {
+      'integerized_s':
+          integerized_s,
+      'x_min':
+          tft.min(inputs['x'], name='x') + tf.zeros_like(inputs['x']),
+      'x_mean':
+          tft.mean(inputs['x'], name='x') + tf.zeros_like(inputs['x']),
+      'y_min':
+          tft.min(inputs['y'], name='y') + tf.zeros_like(inputs['y']),
+      'y_mean':
+          tft.mean(inputs['y'], name='y') + tf.zeros_like(inputs['y']),
+  }
+
+
+# The combiner cache of _preprocessing_fn_for_mixed_analyzers for the inputs
+# [{'x': -2, 'y': 1}, {'x': 4, 'y': -4}] as written with the __v0__ cache
+# format: JSON encoded accumulators, keyed by the __v0__ cache entry keys.
+_V0_MIXED_ANALYZERS_JSON_CACHE = {
+    b'__v0__CacheableCombineAccumulate[x_1/mean_and_var]-.\xc4t>ZBv\xea\xa5SU\xf4\x065\xc6\x1c\x81W\xf9\x1b':
+        b'[2.0, 1.0, 9.0, 0.0]',
+    b'__v0__CacheableCombineAccumulate[x/x]-\x95\xc5w\x88\x85\x8b5V\xc9\x00\xe0\x0f\x03\x1a\xdaL\x9d\xd5\xb3\xe3':
+        b'[2.0, 4.0]',
+    b'__v0__CacheableCombineAccumulate[y_1/mean_and_var]-E^\xb7VZ\xeew4rm\xab\xa3\xa4k|J\x80ck\x16':
+        b'[2.0, -1.5, 6.25, 0.0]',
+    b'__v0__CacheableCombineAccumulate[y/y]-\xdf\x1ey\x03\x1c\x96\xd5'
+    b' e\x9bJ\xa1\xd2\xfc\x9c\x03\x0fM \xdb':
+        b'[4.0, 1.0]',
+}
+
+
 def _preprocessing_fn_for_common_optimize_traversal(inputs):
   _ = tft.vocabulary(inputs['s'])
   x = inputs['x']
@@ -86,7 +147,7 @@ _OPTIMIZE_TRAVERSAL_COMMON_CASE = dict(
     },
     preprocessing_fn=_preprocessing_fn_for_common_optimize_traversal,
     dataset_input_cache_dict={
-        b'__v0__CacheableCombineAccumulate[x/mean_and_var]-/Y\xe8\xd6\x1a\xb8OxZ_\xb4\xbes\x17AK&mXg':
+        b'__v1__CacheableCombineAccumulate[x/mean_and_var]-/Y\xe8\xd6\x1a\xb8OxZ_\xb4\xbes\x17AK&mXg':
             'cache hit',
     },
     expected_dot_graph_str=r"""digraph G {
@@ -116,7 +177,7 @@ node [shape=Mrecord];
 "VocabularyOrderAndFilter[vocabulary]" -> "VocabularyWrite[vocabulary]";
 "CreateTensorBinding[vocabulary/Placeholder]" [label="{CreateTensorBinding|tensor: vocabulary/Placeholder:0|is_asset_filepath: True|label: CreateTensorBinding[vocabulary/Placeholder]}"];
 "VocabularyWrite[vocabulary]" -> "CreateTensorBinding[vocabulary/Placeholder]";
-"DecodeCache[span-0][CacheableCombineAccumulate[x/mean_and_var]]" [label="{DecodeCache|dataset_key: span-0|cache_key: \<bytes\>|cache_entry_identifier: CacheableCombineAccumulate[x/mean_and_var]|coder: \<JsonNumpyCacheCoder\>|label: DecodeCache[span-0][CacheableCombineAccumulate[x/mean_and_var]]|partitionable: True}"];
+"DecodeCache[span-0][CacheableCombineAccumulate[x/mean_and_var]]" [label="{DecodeCache|dataset_key: span-0|cache_key: \<bytes\>|cache_entry_identifier: CacheableCombineAccumulate[x/mean_and_var]|coder: \<BinaryNumpyCacheCoder\>|label: DecodeCache[span-0][CacheableCombineAccumulate[x/mean_and_var]]|partitionable: True}"];
 "TensorSource[x/mean_and_var][span-1]" [label="{ExtractFromDict|keys: ('x/mean_and_var/Cast', 'x/mean_and_var/truediv', 'x/mean_and_var/truediv_1', 'x/mean_and_var/zeros')|label: TensorSource[x/mean_and_var][span-1]|partitionable: True}"];
 "ApplySavedModel[0][span-1]" -> "TensorSource[x/mean_and_var][span-1]";
 "CacheableCombineAccumulate[x/mean_and_var][span-1]" [label="{CacheableCombineAccumulate|combiner: \<WeightedMeanAndVarCombiner\>|label: CacheableCombineAccumulate[x/mean_and_var][span-1]|partitionable: True}"];
@@ -152,7 +213,7 @@ CreateSavedModel [label="{CreateSavedModel|table_initializers: 0|output_signatur
 "CreateTensorBinding[x/mean_and_var/Placeholder_1]" -> CreateSavedModel;
 "CreateTensorBinding[x_square_deviations/mean_and_var/Placeholder]" -> CreateSavedModel;
 "CreateTensorBinding[x_square_deviations/mean_and_var/Placeholder_1]" -> CreateSavedModel;
-"EncodeCache[CacheableCombineAccumulate[x/mean_and_var]][span-1]" [label="{EncodeCache|coder: \<JsonNumpyCacheCoder\>|label: EncodeCache[CacheableCombineAccumulate[x/mean_and_var]][span-1]|partitionable: True}"];
+"EncodeCache[CacheableCombineAccumulate[x/mean_and_var]][span-1]" [label="{EncodeCache|coder: \<BinaryNumpyCacheCoder\>|label: EncodeCache[CacheableCombineAccumulate[x/mean_and_var]][span-1]|partitionable: True}"];
 "CacheableCombineAccumulate[x/mean_and_var][span-1]" -> "EncodeCache[CacheableCombineAccumulate[x/mean_and_var]][span-1]";
 "EncodeCache[VocabularyAccumulate[vocabulary]][span-0]" [label="{EncodeCache|coder: \<_VocabularyAccumulatorCoder\>|label: EncodeCache[VocabularyAccumulate[vocabulary]][span-0]|partitionable: True}"];
 "VocabularyAccumulate[vocabulary][span-0]" -> "EncodeCache[VocabularyAccumulate[vocabulary]][span-0]";
@@ -343,25 +404,7 @@ class CachedImplTest(test_case.TransformTestCase):
   def test_single_phase_mixed_analyzer_run_once(self):
     span_0_key = 'span-0'
     span_1_key = 'span-1'
-
-    def preprocessing_fn(inputs):
-
-      integerized_s = tft.compute_and_apply_vocabulary(inputs['s'])
-
-      _ = tft.bucketize(inputs['x'], 2, name='bucketize')
-
-      return {
-          'integerized_s':
-              integerized_s,
-          'x_min':
-              tft.min(inputs['x'], name='x') + tf.zeros_like(inputs['x']),
-          'x_mean':
-              tft.mean(inputs['x'], name='x') + tf.zeros_like(inputs['x']),
-          'y_min':
-              tft.min(inputs['y'], name='y') + tf.zeros_like(inputs['y']),
-          'y_mean':
-              tft.mean(inputs['y'], name='y') + tf.zeros_like(inputs['y']),
-      }
+    preprocessing_fn = _preprocessing_fn_for_mixed_analyzers
 
     # Run AnalyzeAndTransform on some input data and compare with expected
     # output.
@@ -390,15 +433,19 @@ class CachedImplTest(test_case.TransformTestCase):
           list(itertools.chain(*input_data_dict.values())))
       cache_dict = {
           span_0_key: {
-              b'__v0__CacheableCombineAccumulate[x_1/mean_and_var]-.\xc4t>ZBv\xea\xa5SU\xf4\x065\xc6\x1c\x81W\xf9\x1b':
-                  p | 'CreateA' >> beam.Create([b'[2.0, 1.0, 9.0, 0.0]']),
-              b'__v0__CacheableCombineAccumulate[x/x]-\x95\xc5w\x88\x85\x8b5V\xc9\x00\xe0\x0f\x03\x1a\xdaL\x9d\xd5\xb3\xe3':
-                  p | 'CreateB' >> beam.Create([b'[2.0, 4.0]']),
-              b'__v0__CacheableCombineAccumulate[y_1/mean_and_var]-E^\xb7VZ\xeew4rm\xab\xa3\xa4k|J\x80ck\x16':
-                  p | 'CreateC' >> beam.Create([b'[2.0, -1.5, 6.25, 0.0]']),
-              b'__v0__CacheableCombineAccumulate[y/y]-\xdf\x1ey\x03\x1c\x96\xd5'
+              b'__v1__CacheableCombineAccumulate[x_1/mean_and_var]-.\xc4t>ZBv\xea\xa5SU\xf4\x065\xc6\x1c\x81W\xf9\x1b':
+                  p | 'CreateA' >> beam.Create(
+                      [_encode_numpy_cache([2.0, 1.0, 9.0, 0.0])]),
+              b'__v1__CacheableCombineAccumulate[x/x]-\x95\xc5w\x88\x85\x8b5V\xc9\x00\xe0\x0f\x03\x1a\xdaL\x9d\xd5\xb3\xe3':
+                  p | 'CreateB' >> beam.Create(
+                      [_encode_numpy_cache([2.0, 4.0])]),
+              b'__v1__CacheableCombineAccumulate[y_1/mean_and_var]-E^\xb7VZ\xeew4rm\xab\xa3\xa4k|J\x80ck\x16':
+                  p | 'CreateC' >> beam.Create(
+                      [_encode_numpy_cache([2.0, -1.5, 6.25, 0.0])]),
+              b'__v1__CacheableCombineAccumulate[y/y]-\xdf\x1ey\x03\x1c\x96\xd5'
               b' e\x9bJ\xa1\xd2\xfc\x9c\x03\x0fM \xdb':
-                  p | 'CreateD' >> beam.Create([b'[4.0, 1.0]']),
+                  p | 'CreateD' >> beam.Create(
+                      [_encode_numpy_cache([4.0, 1.0])]),
           },
           span_1_key: {},
       }
@@ -611,6 +658,473 @@ class CachedImplTest(test_case.TransformTestCase):
     # processed at all (only cache).
     self.assertEqual(_get_counter_value(p.metrics, 'saved_models_created'), 1)
 
+  def test_single_phase_run_twice_with_merged_cache(self):
+    dataset_keys = ['span-0', 'span-1', 'span-2']
+    merged_key = analyzer_cache.MergedDatasetKey(dataset_keys[:2])
+
+    def preprocessing_fn(inputs):
+      return {
+          'x_min':
+              tft.min(inputs['x'], name='x') + tf.zeros_like(inputs['x']),
+          'x_mean':
+              tft.mean(inputs['x'], name='x') + tf.zeros_like(inputs['x']),
+          's_integerized':
+              tft.compute_and_apply_vocabulary(inputs['s']),
+      }
+
+    input_metadata = dataset_metadata.DatasetMetadata(
+        dataset_schema.from_feature_spec({
+            'x': tf.io.FixedLenFeature([], tf.float32),
+            's': tf.io.FixedLenFeature([], tf.string),
+        }))
+    input_data_dict = {
+        'span-0': [{'x': -2, 's': 'a'}, {'x': 4, 's': 'b'}],
+        'span-1': [{'x': 12, 's': 'b'}, {'x': 10, 's': 'c'}],
+        'span-2': [{'x': 0, 's': 'b'}, {'x': 6, 's': 'a'}],
+    }
+    expected_transformed_data = [
+        {'x_min': -2.0, 'x_mean': 5.0, 's_integerized': 0},
+        {'x_min': -2.0, 'x_mean': 5.0, 's_integerized': 1},
+    ]
+
+    with _TestPipeline() as p:
+      flat_data = p | 'CreateInputData' >> beam.Create(
+          list(itertools.chain(*input_data_dict.values())))
+      input_data_pcoll_dict = {}
+      for a, b in six.iteritems(input_data_dict):
+        input_data_pcoll_dict[a] = p | a >> beam.Create(b)
+
+      transform_fn_1, cache_output = (
+          (flat_data, input_data_pcoll_dict, {}, input_metadata)
+          | 'Analyze' >> beam_impl.AnalyzeDatasetWithCache(
+              preprocessing_fn, merged_dataset_keys=[merged_key]))
+      _ = (
+          cache_output | 'WriteCache' >> analyzer_cache.WriteAnalysisCacheToFS(
+              self._cache_dir))
+
+      # Every cache entry of the merged dataset keys is also compacted.
+      num_cache_entries = len(cache_output['span-2'])
+      self.assertItemsEqual(cache_output.keys(), dataset_keys + [merged_key])
+      for key in cache_output:
+        self.assertEqual(num_cache_entries, len(cache_output[key]))
+
+      transformed_dataset = ((
+          (input_data_pcoll_dict['span-2'], input_metadata), transform_fn_1)
+                             | 'Transform' >> beam_impl.TransformDataset())
+      transformed_data, _ = transformed_dataset
+      beam_test_util.assert_that(
+          transformed_data,
+          beam_test_util.equal_to(expected_transformed_data),
+          label='first')
+
+    self.assertEqual(
+        _get_counter_value(p.metrics, 'cache_entries_encoded'),
+        4 * num_cache_entries)
+
+    with _TestPipeline() as p:
+      flat_data = p | 'CreateInputData' >> beam.Create(
+          list(itertools.chain(*input_data_dict.values())))
+      input_data_pcoll_dict = {}
+      for a, b in six.iteritems(input_data_dict):
+        input_data_pcoll_dict[a] = p | a >> beam.Create(b)
+
+      input_cache = p | analyzer_cache.ReadAnalysisCacheFromFS(
+          self._cache_dir, dataset_keys)
+      self.assertItemsEqual(input_cache.keys(), [merged_key, 'span-2'])
+
+      transform_fn_2, second_output_cache = (
+          (flat_data, input_data_pcoll_dict, input_cache, input_metadata)
+          | 'AnalyzeAgain' >>
+          (beam_impl.AnalyzeDatasetWithCache(preprocessing_fn)))
+
+      dot_string = nodes.get_dot_graph([analysis_graph_builder._ANALYSIS_GRAPH
+                                       ]).to_string()
+      self.WriteRenderedDotFile(dot_string)
+
+      transformed_dataset = ((
+          (input_data_pcoll_dict['span-2'], input_metadata), transform_fn_2)
+                             | 'TransformAgain' >> beam_impl.TransformDataset())
+      transformed_data, _ = transformed_dataset
+      beam_test_util.assert_that(
+          transformed_data,
+          beam_test_util.equal_to(expected_transformed_data),
+          label='second')
+
+    self.assertFalse(second_output_cache)
+
+    # Only 2 from transform, and only the merged and span-2 cache is decoded.
+    self.assertEqual(_get_counter_value(p.metrics, 'num_instances'), 2)
+    self.assertEqual(
+        _get_counter_value(p.metrics, 'cache_entries_decoded'),
+        2 * num_cache_entries)
+    self.assertEqual(_get_counter_value(p.metrics, 'cache_entries_encoded'), 0)
+
+  def test_read_only_cache_used_by_preprocessing_fn(self):
+    span_0_key = 'span-0'
+    span_1_key = 'span-1'
+
+    def preprocessing_fn_1(inputs):
+      return {
+          'x_min':
+              tft.min(inputs['x'], name='x') + tf.zeros_like(inputs['x']),
+          'x_mean':
+              tft.mean(inputs['x'], name='x') + tf.zeros_like(inputs['x']),
+      }
+
+    def preprocessing_fn_2(inputs):
+      return {
+          'x_min':
+              tft.min(inputs['x'], name='x') + tf.zeros_like(inputs['x']),
+      }
+
+    feature_spec = {'x': tf.io.FixedLenFeature([], tf.float32)}
+    input_metadata = dataset_metadata.DatasetMetadata(
+        dataset_schema.from_feature_spec(feature_spec))
+    input_data_dict = {
+        span_0_key: [{'x': -2}, {'x': 4}],
+        span_1_key: [{'x': 12}, {'x': 10}],
+    }
+
+    with _TestPipeline() as p:
+      flat_data = p | 'CreateInputData' >> beam.Create(
+          list(itertools.chain(*input_data_dict.values())))
+      input_data_pcoll_dict = {}
+      for a, b in six.iteritems(input_data_dict):
+        input_data_pcoll_dict[a] = p | a >> beam.Create(b)
+
+      _, cache_output = (
+          (flat_data, input_data_pcoll_dict, {}, input_metadata)
+          | 'Analyze' >> beam_impl.AnalyzeDatasetWithCache(preprocessing_fn_1))
+      _ = (
+          cache_output | 'WriteCache' >> analyzer_cache.WriteAnalysisCacheToFS(
+              self._cache_dir))
+
+    cache_entry_keys = analysis_graph_builder.get_analysis_cache_entry_keys(
+        preprocessing_fn_2, feature_spec)
+    self.assertEqual(len(cache_entry_keys), 1)
+    for key in input_data_dict:
+      self.assertEqual(len(cache_output[key]), 2)
+      self.assertTrue(cache_entry_keys.issubset(cache_output[key]))
+
+    with _TestPipeline() as p:
+      flat_data = p | 'CreateInputData' >> beam.Create(
+          list(itertools.chain(*input_data_dict.values())))
+      input_data_pcoll_dict = {}
+      for a, b in six.iteritems(input_data_dict):
+        input_data_pcoll_dict[a] = p | a >> beam.Create(b)
+
+      input_cache = p | analyzer_cache.ReadAnalysisCacheFromFS(
+          self._cache_dir,
+          list(input_data_dict.keys()),
+          cache_entry_keys=cache_entry_keys)
+      for key in input_data_dict:
+        self.assertItemsEqual(input_cache[key].keys(), cache_entry_keys)
+
+      transform_fn, second_output_cache = (
+          (flat_data, input_data_pcoll_dict, input_cache, input_metadata)
+          | 'AnalyzeAgain' >>
+          beam_impl.AnalyzeDatasetWithCache(preprocessing_fn_2))
+
+      transformed_dataset = ((
+          (input_data_pcoll_dict[span_1_key], input_metadata), transform_fn)
+                             | 'Transform' >> beam_impl.TransformDataset())
+      transformed_data, _ = transformed_dataset
+      beam_test_util.assert_that(
+          transformed_data,
+          beam_test_util.equal_to([{'x_min': -2.0}, {'x_min': -2.0}]))
+
+    self.assertFalse(second_output_cache)
+    self.assertEqual(_get_counter_value(p.metrics, 'cache_entries_decoded'), 2)
+    self.assertEqual(_get_counter_value(p.metrics, 'cache_entries_encoded'), 0)
+
+  def test_single_phase_run_twice_with_analyzer_outputs_cache(self):
+    dataset_keys = ['span-0', 'span-1']
+
+    def preprocessing_fn(inputs):
+      return {
+          'x_mean':
+              tft.mean(inputs['x'], name='x') + tf.zeros_like(inputs['x']),
+          'x_bucketized':
+              tft.bucketize(inputs['x'], 2, name='bucketize'),
+          's_integerized':
+              tft.compute_and_apply_vocabulary(inputs['s']),
+      }
+
+    input_metadata = dataset_metadata.DatasetMetadata(
+        dataset_schema.from_feature_spec({
+            'x': tf.io.FixedLenFeature([], tf.float32),
+            's': tf.io.FixedLenFeature([], tf.string),
+        }))
+    input_data_dict = {
+        'span-0': [{'x': -2, 's': 'a'}, {'x': 4, 's': 'b'}],
+        'span-1': [{'x': 12, 's': 'b'}, {'x': 10, 's': 'c'}],
+    }
+    transform_input_data = [{'x': -100, 's': 'c'}, {'x': 100, 's': 'z'}]
+    expected_transformed_data = [
+        {'x_mean': 6.0, 'x_bucketized': 0, 's_integerized': 1},
+        {'x_mean': 6.0, 'x_bucketized': 1, 's_integerized': -1},
+    ]
+
+    def analyze_and_transform(p, input_cache, label):
+      flat_data = p | 'CreateInputData' >> beam.Create(
+          list(itertools.chain(*input_data_dict.values())))
+      input_data_pcoll_dict = {}
+      for a, b in six.iteritems(input_data_dict):
+        input_data_pcoll_dict[a] = p | a >> beam.Create(b)
+
+      transform_fn, cache_output = (
+          (flat_data, input_data_pcoll_dict, input_cache, input_metadata)
+          | 'Analyze' >> beam_impl.AnalyzeDatasetWithCache(
+              preprocessing_fn, cache_analyzer_outputs=True))
+
+      transform_input = p | 'CreateTransformInput' >> beam.Create(
+          transform_input_data)
+      transformed_dataset = (((transform_input, input_metadata), transform_fn)
+                             | 'Transform' >> beam_impl.TransformDataset())
+      transformed_data, _ = transformed_dataset
+      beam_test_util.assert_that(
+          transformed_data,
+          beam_test_util.equal_to(expected_transformed_data),
+          label=label)
+      return cache_output
+
+    outputs_key = analyzer_cache.AnalyzerOutputsDatasetKey(dataset_keys)
+    with _TestPipeline() as p:
+      cache_output = analyze_and_transform(p, {}, 'first')
+      _ = (
+          cache_output | 'WriteCache' >> analyzer_cache.WriteAnalysisCacheToFS(
+              self._cache_dir))
+      self.assertItemsEqual(cache_output.keys(), dataset_keys + [outputs_key])
+      num_output_cache_entries = len(cache_output[outputs_key])
+
+    # 4 from analyzing 2 spans, and 2 from transform.
+    self.assertEqual(_get_counter_value(p.metrics, 'num_instances'), 6)
+
+    with _TestPipeline() as p:
+      input_cache = p | analyzer_cache.ReadAnalysisCacheFromFS(
+          self._cache_dir, dataset_keys)
+      self.assertIn(outputs_key, input_cache)
+      second_output_cache = analyze_and_transform(p, input_cache, 'second')
+
+    self.assertFalse(second_output_cache)
+
+    # Only 2 from transform, the analyzers are not computed.
+    self.assertEqual(_get_counter_value(p.metrics, 'num_instances'), 2)
+    self.assertEqual(
+        _get_counter_value(p.metrics, 'cache_entries_decoded'),
+        num_output_cache_entries)
+    self.assertEqual(_get_counter_value(p.metrics, 'cache_entries_encoded'), 0)
+
+  def test_analyze_without_input_data_when_fully_cached(self):
+    dataset_keys = ['span-0', 'span-1']
+
+    def preprocessing_fn(inputs):
+      return {
+          'x_min':
+              tft.min(inputs['x'], name='x') + tf.zeros_like(inputs['x']),
+      }
+
+    def preprocessing_fn_with_new_analyzer(inputs):
+      result = preprocessing_fn(inputs)
+      result['x_max'] = tft.max(inputs['x'], name='new') + tf.zeros_like(
+          inputs['x'])
+      return result
+
+    input_metadata = dataset_metadata.DatasetMetadata(
+        dataset_schema.from_feature_spec({
+            'x': tf.io.FixedLenFeature([], tf.float32),
+        }))
+    input_data_dict = {
+        'span-0': [{'x': -2}, {'x': 4}],
+        'span-1': [{'x': 12}, {'x': 10}],
+    }
+
+    with _TestPipeline() as p:
+      flat_data = p | 'CreateInputData' >> beam.Create(
+          list(itertools.chain(*input_data_dict.values())))
+      input_data_pcoll_dict = {}
+      for a, b in six.iteritems(input_data_dict):
+        input_data_pcoll_dict[a] = p | a >> beam.Create(b)
+
+      _, cache_output = (
+          (flat_data, input_data_pcoll_dict, {}, input_metadata)
+          | 'Analyze' >> beam_impl.AnalyzeDatasetWithCache(preprocessing_fn))
+      _ = (
+          cache_output | 'WriteCache' >> analyzer_cache.WriteAnalysisCacheToFS(
+              self._cache_dir))
+
+    with _TestPipeline() as p:
+      input_cache = p | analyzer_cache.ReadAnalysisCacheFromFS(
+          self._cache_dir, dataset_keys)
+      no_input_data = {key: None for key in dataset_keys}
+
+      transform_fn, second_output_cache = (
+          (None, no_input_data, input_cache, input_metadata)
+          | 'AnalyzeAgain' >> beam_impl.AnalyzeDatasetWithCache(
+              preprocessing_fn))
+
+      transform_input = p | 'CreateTransformInput' >> beam.Create([{'x': 0}])
+      transformed_dataset = (((transform_input, input_metadata), transform_fn)
+                             | 'Transform' >> beam_impl.TransformDataset())
+      transformed_data, _ = transformed_dataset
+      beam_test_util.assert_that(transformed_data,
+                                 beam_test_util.equal_to([{'x_min': -2.0}]))
+
+    self.assertFalse(second_output_cache)
+    # Only 1 from transform.
+    self.assertEqual(_get_counter_value(p.metrics, 'num_instances'), 1)
+
+    # The pipeline is not run, since it cannot be constructed.
+    p = beam.Pipeline()
+    input_cache = p | analyzer_cache.ReadAnalysisCacheFromFS(
+        self._cache_dir, dataset_keys)
+    with self.assertRaisesRegexp(ValueError,
+                                 r'dataset span-0 is read by: .*new/.*'):
+      _ = ((None, no_input_data, input_cache, input_metadata)
+           | 'AnalyzeWithNewAnalyzer' >> beam_impl.AnalyzeDatasetWithCache(
+               preprocessing_fn_with_new_analyzer))
+
+  def test_analyze_without_input_data_with_analyzer_outputs_cache(self):
+    dataset_keys = ['span-0', 'span-1']
+    merged_key = analyzer_cache.MergedDatasetKey(dataset_keys)
+    outputs_key = analyzer_cache.AnalyzerOutputsDatasetKey(dataset_keys)
+
+    def preprocessing_fn(inputs):
+      return {
+          'x_mean':
+              tft.mean(inputs['x'], name='x') + tf.zeros_like(inputs['x']),
+      }
+
+    input_metadata = dataset_metadata.DatasetMetadata(
+        dataset_schema.from_feature_spec({
+            'x': tf.io.FixedLenFeature([], tf.float32),
+        }))
+    input_data_dict = {
+        'span-0': [{'x': -2}, {'x': 4}],
+        'span-1': [{'x': 12}, {'x': 10}],
+    }
+
+    with _TestPipeline() as p:
+      flat_data = p | 'CreateInputData' >> beam.Create(
+          list(itertools.chain(*input_data_dict.values())))
+      input_data_pcoll_dict = {}
+      for a, b in six.iteritems(input_data_dict):
+        input_data_pcoll_dict[a] = p | a >> beam.Create(b)
+
+      _, cache_output = (
+          (flat_data, input_data_pcoll_dict, {}, input_metadata)
+          | 'Analyze' >> beam_impl.AnalyzeDatasetWithCache(
+              preprocessing_fn, cache_analyzer_outputs=True))
+      # Only the analyzer outputs are cached.
+      _ = ({
+          outputs_key: cache_output[outputs_key]
+      } | 'WriteCache' >> analyzer_cache.WriteAnalysisCacheToFS(self._cache_dir))
+
+    with _TestPipeline() as p:
+      input_cache = p | analyzer_cache.ReadAnalysisCacheFromFS(
+          self._cache_dir, dataset_keys)
+      self.assertItemsEqual(input_cache.keys(), [outputs_key])
+      no_input_data = {key: None for key in dataset_keys}
+
+      # The accumulators which would be compacted into the merged key are only
+      # needed for the cached analyzer outputs, so no input data is read.
+      transform_fn, second_output_cache = (
+          (None, no_input_data, input_cache, input_metadata)
+          | 'AnalyzeAgain' >> beam_impl.AnalyzeDatasetWithCache(
+              preprocessing_fn,
+              merged_dataset_keys=[merged_key],
+              cache_analyzer_outputs=True))
+
+      transform_input = p | 'CreateTransformInput' >> beam.Create([{'x': 0}])
+      transformed_dataset = (((transform_input, input_metadata), transform_fn)
+                             | 'Transform' >> beam_impl.TransformDataset())
+      transformed_data, _ = transformed_dataset
+      beam_test_util.assert_that(transformed_data,
+                                 beam_test_util.equal_to([{'x_mean': 6.0}]))
+
+    self.assertFalse(second_output_cache)
+    # Only 1 from transform.
+    self.assertEqual(_get_counter_value(p.metrics, 'num_instances'), 1)
+
+  def test_read_v0_json_cache(self):
+    span_0_key = 'span-0'
+    span_1_key = 'span-1'
+
+    # Write the cache of span-0 in the __v0__ layout: a MANIFEST of cache entry
+    # keys to indices, and a TFRecord file per cache entry named by its index.
+    span_0_cache_dir = os.path.join(self._cache_dir, span_0_key)
+    tf.io.gfile.makedirs(span_0_cache_dir)
+    manifest = {}
+    for idx, (key, encoded_cache) in enumerate(
+        sorted(six.iteritems(_V0_MIXED_ANALYZERS_JSON_CACHE))):
+      manifest[key] = idx
+      with tf.io.TFRecordWriter(
+          os.path.join(span_0_cache_dir, '{}-00000-of-00001.gz'.format(idx)),
+          tf.io.TFRecordOptions(tf.io.TFRecordCompressionType.GZIP)) as writer:
+        writer.write(encoded_cache)
+    with tf.io.gfile.GFile(os.path.join(span_0_cache_dir, 'MANIFEST'),
+                           'w') as f:
+      f.write(pickler.dumps(manifest))
+
+    input_metadata = dataset_metadata.DatasetMetadata(
+        dataset_schema.from_feature_spec({
+            'x': tf.io.FixedLenFeature([], tf.float32),
+            'y': tf.io.FixedLenFeature([], tf.float32),
+            's': tf.io.FixedLenFeature([], tf.string),
+        }))
+    input_data_dict = {
+        span_0_key: [{
+            'x': -2,
+            'y': 1,
+            's': 'b',
+        }, {
+            'x': 4,
+            'y': -4,
+            's': 'b',
+        }],
+        span_1_key: [{
+            'x': 12,
+            'y': 1,
+            's': 'd'
+        }, {
+            'x': 10,
+            'y': 1,
+            's': 'c'
+        }],
+    }
+
+    with _TestPipeline() as p:
+      flat_data = p | 'CreateInputData' >> beam.Create(
+          list(itertools.chain(*input_data_dict.values())))
+      input_cache = p | analyzer_cache.ReadAnalysisCacheFromFS(
+          self._cache_dir, [span_0_key, span_1_key])
+
+      transform_fn, cache_output = (
+          (flat_data, input_data_dict, input_cache, input_metadata)
+          | 'Analyze' >> beam_impl.AnalyzeDatasetWithCache(
+              _preprocessing_fn_for_mixed_analyzers))
+
+      # The combiner cache of span-0 was read, so it is not written again.
+      self.assertEqual(
+          len(cache_output[span_0_key]),
+          len(cache_output[span_1_key]) - 4)
+
+      transform_input = p | 'CreateTransformInput' >> beam.Create(
+          [{'x': 0, 'y': 0, 's': 'c'}])
+      transformed_data, _ = (((transform_input, input_metadata), transform_fn)
+                             | 'Transform' >> beam_impl.TransformDataset())
+      beam_test_util.assert_that(
+          transformed_data,
+          beam_test_util.equal_to([{
+              'x_mean': 6.0,
+              'x_min': -2.0,
+              'y_mean': -0.25,
+              'y_min': -4.0,
+              'integerized_s': 2,
+          }]))
+
+    self.assertEqual(_get_counter_value(p.metrics, 'cache_entries_decoded'), 4)
+
   def test_caching_vocab_for_integer_categorical(self):
 
     span_0_key = 'span-0'
@@ -662,7 +1176,7 @@ class CachedImplTest(test_case.TransformTestCase):
 
       cache_dict = {
           span_0_key: {
-              b'__v0__VocabularyAccumulate[compute_and_apply_vocabulary/vocabulary]-\x05e\xfe4\x03H.P\xb5\xcb\xd22\xe3\x16\x15\xf8\xf5\xe38\xd9':
+              b'__v1__VocabularyAccumulate[compute_and_apply_vocabulary/vocabulary]-\x05e\xfe4\x03H.P\xb5\xcb\xd22\xe3\x16\x15\xf8\xf5\xe38\xd9':
                   p | 'CreateB' >> beam.Create(
                       [b'[-2, 2]', b'[-4, 1]', b'[-1, 1]', b'[4, 1]']),
           },
@@ -770,17 +1284,17 @@ class CachedImplTest(test_case.TransformTestCase):
           transform_fn_with_cache_dir)
 
       expected_accumulators = {
-          b'__v0__VocabularyAccumulate[vocabulary]-\xd3\xe0p\x82\xb1\xa0z\xa3S\xd7N8@\x8f\xa2\xd7\xa1\x9e\xac;':
+          b'__v1__VocabularyAccumulate[vocabulary]-\xd3\xe0p\x82\xb1\xa0z\xa3S\xd7N8@\x8f\xa2\xd7\xa1\x9e\xac;':
               [
                   b'["a", [2, [0.0, 1.0], [0.0, 0.0], 1.0]]',
                   b'["b", [2, [0.5, 0.5], [0.0, 0.0], 1.0]]'
               ],
-          b'__v0__VocabularyAccumulate[vocabulary_1]-A\xc7_0\xee\xff\x88@E<\xde\xcb\x8d\xff5\xebyZZ\x8d':
+          b'__v1__VocabularyAccumulate[vocabulary_1]-A\xc7_0\xee\xff\x88@E<\xde\xcb\x8d\xff5\xebyZZ\x8d':
               [
                   b'["a", [2, [0.0, 1.0], [0.0, 0.0], 1.0]]',
                   b'["b", [2, [0.5, 0.5], [0.0, 0.0], 1.0]]'
               ],
-          b"__v0__VocabularyAccumulate[vocabulary_2]-\x97\x1c>\x851\x94'\xdc\xdf\xfd\xcc\x86\xb7\xb8\xe1\xe8*\x89B\t":
+          b"__v1__VocabularyAccumulate[vocabulary_2]-\x97\x1c>\x851\x94'\xdc\xdf\xfd\xcc\x86\xb7\xb8\xe1\xe8*\x89B\t":
               [b'["a", 1.5]', b'["b", 1.75]'],
       }
       spans = [span_0_key, span_1_key]
@@ -791,7 +1305,9 @@ class CachedImplTest(test_case.TransformTestCase):
         for idx, (key,
                   value) in enumerate(six.iteritems(expected_accumulators)):
           beam_test_util.assert_that(
-              output_cache[span][key],
+              output_cache[span][key]
+              | 'DecodeCache[{}][{}]'.format(span, idx) >> beam.Map(
+                  _decode_vocabulary_cache_as_json),
               beam_test_util.equal_to(value),
               label='AssertCache[{}][{}]'.format(span, idx))
 
@@ -148,6 +148,8 @@ class ConstructBeamPipelineVisitor(nodes.Visitor):
           'input_signature',
           'input_schema',
           'cache_pcoll_dict',
+          'input_record_coder',
+          'columnar_inputs',
       ])
 
   def __init__(self, extra_args):
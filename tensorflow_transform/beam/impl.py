@@ -63,6 +63,12 @@ entrypoints into our code where this happens and creating a
    _RunMetaGraphDoFn
 3) In _replace_tensors_with_constant_values, which is called in a beam.Map.
 4) In extract_scalar_constants, which is called in a beam.Map.
+
+Tensor bindings are not applied by re-exporting SavedModels for every phase.
+Instead they are written as a small side file next to a reference to the
+unbound SavedModel (see _write_tensor_bindings), which is applied when the
+SavedModel is loaded.  Only the final transform_fn is re-exported with its
+bindings, so that it is a self contained SavedModel.
 """
 # TODO(KesterTong): Document data format.
 # TODO(KesterTong): Refactor and rename now that "TransformFn" is the path to a
@@ -75,6 +81,7 @@ from __future__ import print_function
 import collections
 import copy
 import datetime
+import hashlib
 import os
 import threading
 
@@ -82,6 +89,7 @@ import threading
 
 import apache_beam as beam
 
+from apache_beam.internal import pickler
 from apache_beam.transforms import util
 from apache_beam.typehints import Any
 from apache_beam.typehints import Dict
@@ -101,6 +109,7 @@ from tensorflow_transform.beam import analyzer_cache
 from tensorflow_transform.beam import beam_nodes
 from tensorflow_transform.beam import common
 from tensorflow_transform.beam import deep_copy
+from tensorflow_transform.beam import profiling
 from tensorflow_transform.beam import shared
 from tensorflow_transform.beam.tft_beam_io import beam_metadata_io
 from tensorflow_transform.saved import saved_transform_io
@@ -155,6 +164,9 @@ class Context(object):
         information should be attached to instances in the pipeline which should
         not be part of the transformation graph, instance keys is one such
         example.
+    profiler: (Optional) A `profiling.PipelineConstructionProfiler` which
+        records the wall time of stages of pipeline construction within this
+        block.
 
   Note that the temp dir should be accessible to worker jobs, e.g. if running
   with the Cloud Dataflow runner, the temp dir should be on GCS and should have
@@ -167,6 +179,7 @@ class Context(object):
           'desired_batch_size',
           'passthrough_keys',
           'use_deep_copy_optimization',
+          'profiler',
       ])):
     pass
 
@@ -187,7 +200,8 @@ class Context(object):
                temp_dir=None,
                desired_batch_size=None,
                passthrough_keys=None,
-               use_deep_copy_optimization=None):
+               use_deep_copy_optimization=None,
+               profiler=None):
     state = getattr(self._thread_local, 'state', None)
     if not state:
       self._thread_local.state = self._StateStack()
@@ -198,6 +212,7 @@ class Context(object):
     self._desired_batch_size = desired_batch_size
     self._passthrough_keys = passthrough_keys
     self._use_deep_copy_optimization = use_deep_copy_optimization
+    self._profiler = profiler
 
   def __enter__(self):
     # Previous State's properties are inherited if not explicitly specified.
@@ -214,6 +229,8 @@ class Context(object):
             use_deep_copy_optimization=self._use_deep_copy_optimization
             if self._use_deep_copy_optimization is not None else
             last_frame.use_deep_copy_optimization,
+            profiler=self._profiler
+            if self._profiler is not None else last_frame.profiler,
         ))
 
   def __exit__(self, *exn_info):
@@ -266,17 +283,183 @@ class Context(object):
       return state.use_deep_copy_optimization
     return False
 
+  @classmethod
+  def get_profiler(cls):
+    """Retrieves a user set profiler, None if not set."""
+    state = cls._get_topmost_state_frame()
+    if state is not None:
+      return state.profiler
+    return None
+
+
+def _make_batch_elements():
+  """Returns a BatchElements either automatic or of the given batch_size."""
+  desired_batch_size = Context.get_desired_batch_size()
+  kwargs = dict(
+      min_batch_size=desired_batch_size, max_batch_size=desired_batch_size
+  ) if desired_batch_size is not None else {}
+  return util.BatchElements(**kwargs)
+
 
 @beam.ptransform_fn
 @with_input_types(_DATASET_ELEMENT_TYPE)
 @with_output_types(List[_DATASET_ELEMENT_TYPE])
 def _BatchElements(pcoll):  # pylint: disable=invalid-name
   """Batches elements either automatically or to the given batch_size."""
-  desired_batch_size = Context.get_desired_batch_size()
-  kwargs = dict(
-      min_batch_size=desired_batch_size, max_batch_size=desired_batch_size
-  ) if desired_batch_size is not None else {}
-  return pcoll | 'BatchElements' >> util.BatchElements(**kwargs)
+  return pcoll | 'BatchElements' >> _make_batch_elements()
+
+
+@beam.ptransform_fn
+@with_input_types(Any)
+@with_output_types(List[Any])
+def _BatchRecords(pcoll):  # pylint: disable=invalid-name
+  """Batches raw records, e.g. CSV lines, like _BatchElements."""
+  return pcoll | 'BatchElements' >> _make_batch_elements()
+
+
+# The number of graph states, e.g. of fused phases or of different
+# transform_fns, that are kept alive in a worker process, and the maximum total
+# size of their SavedModels, see `_estimate_graph_state_num_bytes`.
+_MAX_KEEPALIVE_GRAPH_STATES = 4
+_MAX_KEEPALIVE_GRAPH_STATES_BYTES = 1 << 30
+
+# The handle used for all graph states.  Graph states are tagged with the
+# fingerprint of their SavedModel's contents, so that e.g. applying the same
+# transform_fn to several datasets in a pipeline loads it once per process.
+_GRAPH_STATE_SHARED_HANDLE = shared.Shared(
+    keepalive_policy=shared.KeepalivePolicy(
+        max_objects=_MAX_KEEPALIVE_GRAPH_STATES,
+        max_bytes=_MAX_KEEPALIVE_GRAPH_STATES_BYTES))
+
+_FINGERPRINT_READ_CHUNK_SIZE = 1 << 20
+
+# The name of the side file which holds the fingerprint of a SavedModel written
+# by tf.Transform, see `_write_saved_model_fingerprint`.
+_FINGERPRINT_FILENAME = 'tft_saved_model_fingerprint'
+
+_SavedModelFingerprint = collections.namedtuple('_SavedModelFingerprint',
+                                                ['fingerprint', 'num_bytes'])
+
+# Fingerprints of the contents of SavedModel directories, by path.
+_saved_model_fingerprints = {}
+_saved_model_fingerprints_lock = threading.Lock()
+
+# Tags of the graph states that were loaded in this process, used to count
+# graph states which are loaded again after being released.
+_loaded_graph_state_tags = set()
+_loaded_graph_state_tags_lock = threading.Lock()
+
+
+def _compute_saved_model_fingerprint(saved_model_dir):
+  """Computes the fingerprint of the contents of a SavedModel directory.
+
+  This reads every file in saved_model_dir, except for the fingerprint side
+  file itself.
+
+  Args:
+    saved_model_dir: A SavedModel directory.
+
+  Returns:
+    A `_SavedModelFingerprint` of a hex string which only depends on the
+    relative paths and contents of the files in saved_model_dir, and their
+    total size in bytes.
+  """
+  fingerprint = hashlib.sha256()
+  num_bytes = 0
+  for dirname, _, filenames in sorted(tf.io.gfile.walk(saved_model_dir)):
+    for filename in sorted(filenames):
+      path = os.path.join(dirname, filename)
+      relative_path = os.path.relpath(path, saved_model_dir)
+      if relative_path == _FINGERPRINT_FILENAME:
+        continue
+      file_fingerprint = hashlib.sha256()
+      with tf.io.gfile.GFile(path, 'rb') as f:
+        while True:
+          chunk = f.read(_FINGERPRINT_READ_CHUNK_SIZE)
+          if not chunk:
+            break
+          file_fingerprint.update(chunk)
+          num_bytes += len(chunk)
+      fingerprint.update(tf.compat.as_bytes(relative_path) + b'\0')
+      fingerprint.update(file_fingerprint.digest())
+  return _SavedModelFingerprint(fingerprint.hexdigest(), num_bytes)
+
+
+def _write_saved_model_fingerprint(saved_model_dir):
+  """Writes the fingerprint of a SavedModel to a side file in its directory.
+
+  This is called once by the writer of a SavedModel, so that workers which
+  load it only read the side file in `_fingerprint_saved_model_dir`, rather
+  than the contents of the whole SavedModel, including its assets.  The side
+  file is ignored by SavedModel loaders, and is copied along with the
+  SavedModel by `WriteTransformFn`.
+
+  Args:
+    saved_model_dir: A SavedModel directory.
+  """
+  result = _compute_saved_model_fingerprint(saved_model_dir)
+  with tf.io.gfile.GFile(
+      os.path.join(saved_model_dir, _FINGERPRINT_FILENAME), 'w') as f:
+    f.write('{} {}'.format(result.fingerprint, result.num_bytes))
+  with _saved_model_fingerprints_lock:
+    _saved_model_fingerprints[saved_model_dir] = result
+
+
+def _fingerprint_saved_model_dir(saved_model_dir):
+  """Returns a fingerprint of the contents of a SavedModel directory.
+
+  The fingerprint is read from the side file written by
+  `_write_saved_model_fingerprint` if there is one, and is otherwise computed
+  from the contents of saved_model_dir, e.g. for a transform_fn written by an
+  older version of tf.Transform.  SavedModel directories are never modified
+  once they are written, so the fingerprints are memoized by path.
+
+  Args:
+    saved_model_dir: A SavedModel directory.
+
+  Returns:
+    A `_SavedModelFingerprint` of a hex string which only depends on the
+    relative paths and contents of the files in saved_model_dir, and their
+    total size in bytes.
+  """
+  with _saved_model_fingerprints_lock:
+    result = _saved_model_fingerprints.get(saved_model_dir)
+  if result is not None:
+    return result
+
+  fingerprint_path = os.path.join(saved_model_dir, _FINGERPRINT_FILENAME)
+  if tf.io.gfile.exists(fingerprint_path):
+    with tf.io.gfile.GFile(fingerprint_path, 'r') as f:
+      fingerprint, num_bytes = f.read().split()
+    result = _SavedModelFingerprint(fingerprint, int(num_bytes))
+  else:
+    result = _compute_saved_model_fingerprint(saved_model_dir)
+
+  with _saved_model_fingerprints_lock:
+    _saved_model_fingerprints[saved_model_dir] = result
+  return result
+
+
+def _estimate_graph_state_num_bytes(saved_model_dir):
+  """Estimates the memory usage of a graph state loaded from saved_model_dir.
+
+  For a directory written by `_write_tensor_bindings`, e.g. for an analysis
+  phase, this is the size of the unbound SavedModel, including its assets, and
+  of the bound values.  Otherwise this is the size of the SavedModel.
+
+  Args:
+    saved_model_dir: A SavedModel directory, or a directory written by
+      `_write_tensor_bindings`.
+
+  Returns:
+    The estimated size in bytes.
+  """
+  num_bytes = _fingerprint_saved_model_dir(saved_model_dir).num_bytes
+  unbound_saved_model_dir, _ = _read_tensor_bindings(saved_model_dir)
+  if unbound_saved_model_dir != saved_model_dir:
+    num_bytes += _fingerprint_saved_model_dir(
+        unbound_saved_model_dir).num_bytes
+  return num_bytes
 
 
 # TODO(b/36223892): Verify that these type hints work and make needed fixes.
@@ -295,10 +478,20 @@ class _RunMetaGraphDoFn(beam.DoFn):
       implies use Tensorflow defaults.
     shared_graph_state_handle: an instance of shared.Shared() that allows us to
       load the graph once and share it across multiple threads in the current
-      process.
+      process.  Graph states are tagged with the fingerprint of the contents of
+      their SavedModel, so DoFns using the same handle share the graph state of
+      identical SavedModels.
     passthrough_keys: A set of strings that are keys to instances that
       should pass through the pipeline and be hidden from the preprocessing_fn.
     exclude_outputs: (Optional) A list of names of outputs to exclude.
+    input_record_coder: (Optional) A coder with a `decode_tensors` method, e.g.
+      a `CsvCoder` or an `ExampleProtoCoder`.  If set, batches are lists of raw
+      records which are decoded into instances of `input_schema` in the TF
+      graph, before the SavedModel.
+    columnar_inputs: (Optional) If True, batches are columnar batches, as
+      accepted by `impl_helper.make_feed_list_from_columns`, instead of lists
+      of instance dicts.  Pass-through keys map to lists of the values of their
+      batch.
   """
 
   # Thread-safe.
@@ -306,21 +499,40 @@ class _RunMetaGraphDoFn(beam.DoFn):
     """A container for a shared graph state."""
 
     def __init__(self, saved_model_dir, input_schema, exclude_outputs,
-                 tf_config):
+                 tf_config, input_record_coder=None):
       self.saved_model_dir = saved_model_dir
+      unbound_saved_model_dir, tensor_bindings = _read_tensor_bindings(
+          saved_model_dir)
       graph = tf.Graph()
       self._session = tf.compat.v1.Session(graph=graph, config=tf_config)
       with graph.as_default():
         with self._session.as_default():
+          tensor_replacement_map = {
+              binding.tensor_name: tf.constant(binding.value)
+              for binding in tensor_bindings
+          }
+          input_schema_keys = input_schema.as_feature_spec().keys()
+          if input_record_coder is None:
+            logical_input_map = {}
+          else:
+            # Records are decoded by a prefix of the graph, whose outputs are
+            # mapped to the inputs of the SavedModel.
+            records = tf.compat.v1.placeholder(
+                tf.string, [None], name='records')
+            decoded_inputs = input_record_coder.decode_tensors(records)
+            logical_input_map = {
+                key: decoded_inputs[key] for key in input_schema_keys
+            }
           inputs, outputs = (
               saved_transform_io.partially_apply_saved_transform_internal(
-                  saved_model_dir, {}))
+                  unbound_saved_model_dir, logical_input_map,
+                  tensor_replacement_map))
         self._session.run(tf.compat.v1.global_variables_initializer())
         self._session.run(tf.compat.v1.tables_initializer())
         graph.finalize()
 
-        input_schema_keys = input_schema.as_feature_spec().keys()
-        if set(input_schema_keys).difference(inputs.keys()):
+        if set(input_schema_keys).difference(
+            set(inputs.keys()).union(logical_input_map.keys())):
           raise ValueError('Input schema contained keys not in graph: %s' %
                            input_schema_keys)
         if set(exclude_outputs).difference(outputs.keys()):
@@ -333,9 +545,16 @@ class _RunMetaGraphDoFn(beam.DoFn):
         self.inputs_tensor_keys = sorted(tensor_inputs.keys())
         self.outputs_tensor_keys = non_excluded_output_keys
 
-        tensor_inputs_list = [
-            tensor_inputs[key] for key in self.inputs_tensor_keys
-        ]
+        if input_record_coder is None:
+          tensor_inputs_list = [
+              tensor_inputs[key] for key in self.inputs_tensor_keys
+          ]
+        else:
+          if self.inputs_tensor_keys:
+            raise ValueError(
+                'Inputs of the graph are not decoded from records: %s' %
+                self.inputs_tensor_keys)
+          tensor_inputs_list = [records]
         self.callable_get_outputs = self._session.make_callable(
             fetches, feed_list=tensor_inputs_list)
 
@@ -344,7 +563,9 @@ class _RunMetaGraphDoFn(beam.DoFn):
                serialized_tf_config,
                shared_graph_state_handle,
                passthrough_keys,
-               exclude_outputs=None):
+               exclude_outputs=None,
+               input_record_coder=None,
+               columnar_inputs=False):
     super(_RunMetaGraphDoFn, self).__init__()
     self._input_schema = input_schema
     self._exclude_outputs = (
@@ -356,11 +577,26 @@ class _RunMetaGraphDoFn(beam.DoFn):
       raise ValueError(
           'passthrough_keys overlap with schema keys: {}, {}'.format(
               self._passthrough_keys, schema_keys))
+    self._input_record_coder = input_record_coder
+    self._columnar_inputs = columnar_inputs
+    if input_record_coder is not None:
+      if columnar_inputs:
+        raise ValueError(
+            'columnar_inputs are not supported with an input_record_coder')
+      if self._passthrough_keys:
+        raise ValueError(
+            'passthrough_keys are not supported with an input_record_coder: '
+            '{}'.format(self._passthrough_keys))
+      # Graph states with different record decoding prefixes are different.
+      self._input_record_coder_key = pickler.dumps(input_record_coder)
+    else:
+      self._input_record_coder_key = None
 
     # The shared graph state handle allows us to load the graph once and share
     # it across multiple threads in the current process.
     self._shared_graph_state_handle = shared_graph_state_handle
     self._graph_state = None
+    self._saved_model_dir = None
 
     # Metrics.
     self._graph_load_seconds_distribution = beam.metrics.Metrics.distribution(
@@ -369,24 +605,57 @@ class _RunMetaGraphDoFn(beam.DoFn):
         common.METRICS_NAMESPACE, 'batch_size')
     self._num_instances = beam.metrics.Metrics.counter(
         common.METRICS_NAMESPACE, 'num_instances')
+    self._graph_state_cache_hits = beam.metrics.Metrics.counter(
+        common.METRICS_NAMESPACE, 'graph_state_cache_hits')
+    self._graph_state_cache_misses = beam.metrics.Metrics.counter(
+        common.METRICS_NAMESPACE, 'graph_state_cache_misses')
+    # Graph states which were loaded again after they were released, e.g.
+    # because they were evicted from the keepalive.
+    self._graph_state_reloads = beam.metrics.Metrics.counter(
+        common.METRICS_NAMESPACE, 'graph_state_reloads')
 
   def _handle_batch(self, batch):
-    self._batch_size_distribution.update(len(batch))
-    self._num_instances.inc(len(batch))
-
-    # Making a copy of batch because mutating PCollection elements is not
-    # allowed.
-    if self._passthrough_keys:
-      batch = [copy.copy(x) for x in batch]
-    # Extract passthrough data.
-    passthrough_data = {
-        key: [instance.pop(key) for instance in batch
-             ] for key in self._passthrough_keys
-    }
+    if self._columnar_inputs:
+      batch_size = impl_helper.get_columns_batch_size(batch)
+    else:
+      batch_size = len(batch)
+    self._batch_size_distribution.update(batch_size)
+    self._num_instances.inc(batch_size)
+
+    if self._input_record_coder is not None:
+      return self._run_graph([batch])
+
+    if self._columnar_inputs:
+      # Making a copy of batch because mutating PCollection elements is not
+      # allowed.
+      if self._passthrough_keys:
+        batch = copy.copy(batch)
+      passthrough_data = {
+          key: batch.pop(key) for key in self._passthrough_keys
+      }
+      feed_list = impl_helper.make_feed_list_from_columns(
+          self._graph_state.inputs_tensor_keys, self._input_schema, batch)
+    else:
+      # Making a copy of batch because mutating PCollection elements is not
+      # allowed.
+      if self._passthrough_keys:
+        batch = [copy.copy(x) for x in batch]
+      # Extract passthrough data.
+      passthrough_data = {
+          key: [instance.pop(key) for instance in batch
+               ] for key in self._passthrough_keys
+      }
+      feed_list = impl_helper.make_feed_list(
+          self._graph_state.inputs_tensor_keys, self._input_schema, batch)
+    result = self._run_graph(feed_list)
+
+    for key, value in six.iteritems(passthrough_data):
+      result[key] = value
 
-    feed_list = impl_helper.make_feed_list(self._graph_state.inputs_tensor_keys,
-                                           self._input_schema, batch)
+    return result
 
+  def _run_graph(self, feed_list):
+    """Runs the graph on a feed list and returns a dict of its outputs."""
     try:
       outputs_list = self._graph_state.callable_get_outputs(*feed_list)
     except Exception as e:
@@ -396,22 +665,29 @@ class _RunMetaGraphDoFn(beam.DoFn):
       raise ValueError('bad inputs: {}'.format(feed_list))
 
     assert len(self._graph_state.outputs_tensor_keys) == len(outputs_list)
-    result = {
+    return {
         key: value for key, value in zip(self._graph_state.outputs_tensor_keys,
                                          outputs_list)
     }
 
-    for key, value in six.iteritems(passthrough_data):
-      result[key] = value
-
-    return result
-
-  def _make_graph_state(self, saved_model_dir):
+  def _make_graph_state_tag(self, saved_model_dir):
+    return (_fingerprint_saved_model_dir(saved_model_dir),
+            tuple(sorted(self._input_schema.as_feature_spec().keys())),
+            tuple(sorted(self._exclude_outputs)), self._serialized_tf_config,
+            self._input_record_coder_key)
+
+  def _make_graph_state(self, saved_model_dir, tag):
+    self._graph_state_cache_misses.inc()
+    with _loaded_graph_state_tags_lock:
+      if tag in _loaded_graph_state_tags:
+        self._graph_state_reloads.inc()
+      _loaded_graph_state_tags.add(tag)
     start = datetime.datetime.now()
     tf_config = common._maybe_deserialize_tf_config(  # pylint: disable=protected-access
         self._serialized_tf_config)
     result = self._GraphState(saved_model_dir, self._input_schema,
-                              self._exclude_outputs, tf_config)
+                              self._exclude_outputs, tf_config,
+                              self._input_record_coder)
     self._graph_load_seconds_distribution.update(
         int((datetime.datetime.now() - start).total_seconds()))
     return result
@@ -434,16 +710,69 @@ class _RunMetaGraphDoFn(beam.DoFn):
     if self._graph_state is None:
       # If available, acquire will return a cached _GraphState, since calling
       # _make_graph_state is expensive.
+      tag = self._make_graph_state_tag(saved_model_dir)
+      constructed = []
+
+      def make_graph_state():
+        constructed.append(True)
+        return self._make_graph_state(saved_model_dir, tag)
+
+      # The size of the SavedModel, including the unbound SavedModel of an
+      # analysis phase, is used as an estimate of the graph state's memory
+      # usage.
       self._graph_state = self._shared_graph_state_handle.acquire(
-          lambda: self._make_graph_state(saved_model_dir))
+          make_graph_state,
+          tag=tag,
+          size_fn=lambda _: _estimate_graph_state_num_bytes(saved_model_dir))
+      if not constructed:
+        self._graph_state_cache_hits.inc()
+      self._saved_model_dir = saved_model_dir
 
     # This should remain true throughout the lifetime of this DoFn, regardless
-    # of whether or not self._graph_state was cached.
-    assert self._graph_state.saved_model_dir == saved_model_dir
+    # of whether or not self._graph_state was cached.  The cached graph state
+    # may have been loaded from another directory with the same contents.
+    assert self._saved_model_dir == saved_model_dir
 
     yield self._handle_batch(batch)
 
 
+def _batch_and_run_meta_graph(input_values, dofn, saved_model_dir,
+                              input_record_coder, batch_label, run_label,
+                              columnar_inputs=False):
+  """Applies a _RunMetaGraphDoFn to batches of a PCollection.
+
+  Args:
+    input_values: A PCollection of instance dicts, of raw records if
+      input_record_coder is set, or of columnar batches if columnar_inputs is
+      True.
+    dofn: A `_RunMetaGraphDoFn` constructed with input_record_coder and
+      columnar_inputs.
+    saved_model_dir: A singleton PCollection of the SavedModel to apply.
+    input_record_coder: The input_record_coder of dofn, or None.
+    batch_label: The label of the batching PTransform.
+    run_label: The label of the ParDo of dofn.
+    columnar_inputs: (Optional) The columnar_inputs of dofn.  Columnar batches
+      are not batched again.
+
+  Returns:
+    A PCollection of dicts of the outputs of the SavedModel for each batch.
+  """
+  run_meta_graph = beam.ParDo(
+      dofn, saved_model_dir=beam.pvalue.AsSingleton(saved_model_dir))
+  if columnar_inputs:
+    # Columnar batches don't match the type hints of _RunMetaGraphDoFn.
+    return (input_values
+            | run_label >> run_meta_graph.with_input_types(Dict[str, Any], str))
+  if input_record_coder is not None:
+    # Batches of raw records don't match the type hints of _RunMetaGraphDoFn.
+    return (input_values
+            | batch_label >> _BatchRecords()
+            | run_label >> run_meta_graph.with_input_types(List[Any], str))
+  return (input_values
+          | batch_label >> _BatchElements()
+          | run_label >> run_meta_graph)
+
+
 def _assert_tensorflow_version():
   # Fail with a clear error in case we are not using a compatible TF version.
   major, minor, _ = tf.__version__.split('.')
@@ -454,6 +783,20 @@ def _assert_tensorflow_version():
         'https://github.com/tensorflow/tensorflow. ' % tf.__version__)
 
 
+def _convert_to_columns(batch_dict, schema, passthrough_keys):
+  """Convert batches of ndarrays to columnar batches."""
+
+  # Making a copy of batch_dict because mutating PCollection elements is not
+  # allowed.
+  if passthrough_keys:
+    batch_dict = copy.copy(batch_dict)
+  passthrough_data = {key: batch_dict.pop(key) for key in passthrough_keys}
+
+  result = impl_helper.to_columns(schema, batch_dict)
+  result.update(passthrough_data)
+  return result
+
+
 def _convert_and_unbatch_to_instance_dicts(batch_dict, schema,
                                            passthrough_keys):
   """Convert batches of ndarrays to unbatched instance dicts."""
@@ -535,28 +878,92 @@ def _replace_tensors_with_constant_values(saved_model_dir, tensor_bindings,
       session.run(tf.compat.v1.global_variables_initializer())
       saved_transform_io.write_saved_transform_from_session(
           session, input_tensors, output_tensors, temp_dir)
+    _write_saved_model_fingerprint(temp_dir)
     return temp_dir
 
 
+# The name of the side file which holds tensor bindings for a SavedModel.
+_TENSOR_BINDINGS_FILENAME = 'tft_tensor_bindings'
+
+
+def _write_tensor_bindings(saved_model_dir, tensor_bindings, base_temp_dir):
+  """Writes tensor bindings of a SavedModel to a new directory.
+
+  The resulting directory holds the path of the unbound SavedModel and the
+  bindings, so writing it only takes time proportional to the size of the bound
+  values, rather than to the size of the graph.  It can be read by
+  `_read_tensor_bindings`, and is converted to a SavedModel by
+  `_materialize_tensor_bindings`.
+
+  Args:
+    saved_model_dir: A SavedModel directory providing a transform graph.
+    tensor_bindings: An iterable of `_TensorBinding`s.
+    base_temp_dir: Base temp dir for storage of the tensor bindings.
+
+  Returns:
+    The directory name containing the tensor bindings.
+  """
+  temp_dir = common.get_unique_temp_path(base_temp_dir)
+  tf.io.gfile.makedirs(temp_dir)
+  with tf.io.gfile.GFile(
+      os.path.join(temp_dir, _TENSOR_BINDINGS_FILENAME), 'wb') as f:
+    f.write(pickler.dumps((saved_model_dir, list(tensor_bindings))))
+  return temp_dir
+
+
+def _read_tensor_bindings(saved_model_dir):
+  """Reads the tensor bindings written by `_write_tensor_bindings`.
+
+  Args:
+    saved_model_dir: A SavedModel directory, or a directory written by
+      `_write_tensor_bindings`.
+
+  Returns:
+    A pair of the unbound SavedModel directory, and a list of `_TensorBinding`s
+    which should be applied to it.  The list is empty if `saved_model_dir` is a
+    SavedModel.
+  """
+  path = os.path.join(saved_model_dir, _TENSOR_BINDINGS_FILENAME)
+  if not tf.io.gfile.exists(path):
+    return saved_model_dir, []
+  with tf.io.gfile.GFile(path, 'rb') as f:
+    return pickler.loads(f.read())
+
+
+def _materialize_tensor_bindings(saved_model_dir, base_temp_dir):
+  """Returns a SavedModel directory with the tensor bindings applied."""
+  unbound_saved_model_dir, tensor_bindings = _read_tensor_bindings(
+      saved_model_dir)
+  if not tensor_bindings:
+    return unbound_saved_model_dir
+  return _replace_tensors_with_constant_values(unbound_saved_model_dir,
+                                               tensor_bindings, base_temp_dir)
+
+
 @common.register_ptransform(beam_nodes.CreateSavedModel)
 def _create_saved_model_impl(inputs, operation, extra_args):
   """Create a SavedModel from a TF Graph."""
   unbound_saved_model_dir = common.get_unique_temp_path(
       extra_args.base_temp_dir)
-  with extra_args.graph.as_default():
-    with tf.compat.v1.Session(graph=extra_args.graph) as session:
-      table_initializers_ref = tf.compat.v1.get_collection_ref(
-          tf.compat.v1.GraphKeys.TABLE_INITIALIZERS)
-      original_table_initializers = list(table_initializers_ref)
-      del table_initializers_ref[:]
-      table_initializers_ref.extend(operation.table_initializers)
-      # Initialize all variables so they can be saved.
-      session.run(tf.compat.v1.global_variables_initializer())
-      saved_transform_io.write_saved_transform_from_session(
-          session, extra_args.input_signature, operation.output_signature,
-          unbound_saved_model_dir)
-      del table_initializers_ref[:]
-      table_initializers_ref.extend(original_table_initializers)
+  with profiling.profile_stage(Context.get_profiler(),
+                               profiling.CREATE_SAVED_MODEL) as stage:
+    if stage is not None:
+      stage.num_nodes = len(extra_args.graph.get_operations())
+    with extra_args.graph.as_default():
+      with tf.compat.v1.Session(graph=extra_args.graph) as session:
+        table_initializers_ref = tf.compat.v1.get_collection_ref(
+            tf.compat.v1.GraphKeys.TABLE_INITIALIZERS)
+        original_table_initializers = list(table_initializers_ref)
+        del table_initializers_ref[:]
+        table_initializers_ref.extend(operation.table_initializers)
+        # Initialize all variables so they can be saved.
+        session.run(tf.compat.v1.global_variables_initializer())
+        saved_transform_io.write_saved_transform_from_session(
+            session, extra_args.input_signature, operation.output_signature,
+            unbound_saved_model_dir)
+        del table_initializers_ref[:]
+        table_initializers_ref.extend(original_table_initializers)
+    _write_saved_model_fingerprint(unbound_saved_model_dir)
   return (inputs | operation.label >> _BindTensors(
       extra_args.base_temp_dir, unbound_saved_model_dir, extra_args.pipeline)
           | 'Count[%s]' % operation.label >>
@@ -564,7 +971,11 @@ def _create_saved_model_impl(inputs, operation, extra_args):
 
 
 class _BindTensors(beam.PTransform):
-  """PTransform to bind tensor in a SavedModel."""
+  """PTransform to bind tensor in a SavedModel.
+
+  The output is a directory that holds the tensor bindings alongside a
+  reference to the unbound SavedModel, see `_write_tensor_bindings`.
+  """
 
   def __init__(self, base_temp_dir, unbound_saved_model_dir, pipeline):
     self._base_temp_dir = base_temp_dir
@@ -581,7 +992,7 @@ class _BindTensors(beam.PTransform):
     flattened_tensor_bindings = (
         inputs | 'Flatten' >> beam.Flatten(pipeline=self.pipeline))
     return saved_model_dir_pcoll | 'BindTensors' >> beam.Map(
-        _replace_tensors_with_constant_values,
+        _write_tensor_bindings,
         tensor_bindings=beam.pvalue.AsIter(flattened_tensor_bindings),
         base_temp_dir=self._base_temp_dir)
 
@@ -592,6 +1003,8 @@ class _ApplySavedModelImpl(beam.PTransform):
 
   def __init__(self, operation, extra_args):
     self._input_schema = extra_args.input_schema
+    self._input_record_coder = extra_args.input_record_coder
+    self._columnar_inputs = extra_args.columnar_inputs
     self._serialized_tf_config = extra_args.serialized_tf_config
     self._phase = operation.phase
     if operation.dataset_key is None:
@@ -609,20 +1022,25 @@ class _ApplySavedModelImpl(beam.PTransform):
       # safe to read more than once.
       tf.compat.v1.logging.info('Deep copying inputs for phase: %d',
                                 self._phase)
-      input_values = deep_copy.deep_copy(self._input_values_pcoll)
+      with profiling.profile_stage(Context.get_profiler(), profiling.DEEP_COPY):
+        input_values = deep_copy.deep_copy(self._input_values_pcoll)
     else:
       input_values = self._input_values_pcoll
 
-    return (
-        input_values
-        | 'BatchInputs' >> _BatchElements()
-        | 'ApplySavedModel' >> beam.ParDo(
-            _RunMetaGraphDoFn(
-                self._input_schema,
-                self._serialized_tf_config,
-                shared_graph_state_handle=shared.Shared(),
-                passthrough_keys=Context.get_passthrough_keys()),
-            saved_model_dir=beam.pvalue.AsSingleton(inputs[0])))
+    return _batch_and_run_meta_graph(
+        input_values,
+        _RunMetaGraphDoFn(
+            self._input_schema,
+            self._serialized_tf_config,
+            shared_graph_state_handle=_GRAPH_STATE_SHARED_HANDLE,
+            passthrough_keys=Context.get_passthrough_keys(),
+            input_record_coder=self._input_record_coder,
+            columnar_inputs=self._columnar_inputs),
+        inputs[0],
+        self._input_record_coder,
+        batch_label='BatchInputs',
+        run_label='ApplySavedModel',
+        columnar_inputs=self._columnar_inputs)
 
 
 @common.register_ptransform(beam_nodes.ExtractFromDict)
@@ -661,17 +1079,75 @@ def _infer_metadata_from_saved_model(saved_model_dir):
           schema=schema_inference.infer_feature_schema(outputs, graph, session))
 
 
+def _get_pipeline(flattened_pcoll, input_values_pcoll_dict,
+                  dataset_cache_dict):
+  """Returns the pipeline of the first available input PCollection."""
+  pcolls = [flattened_pcoll] + list(input_values_pcoll_dict.values())
+  for cache_dict in (dataset_cache_dict or {}).values():
+    pcolls.extend(cache_dict.values())
+  for pcoll in pcolls:
+    if pcoll is not None:
+      return pcoll.pipeline
+  raise ValueError('At least one input or cache PCollection must be provided')
+
+
+def _check_raw_data_is_available(raw_data_consumers, flattened_pcoll,
+                                 input_values_pcoll_dict):
+  """Checks that the input data read by the analysis was provided.
+
+  Args:
+    raw_data_consumers: The result of
+      `analysis_graph_builder.get_raw_data_consumers`.
+    flattened_pcoll: The flattened input data PCollection, or None.
+    input_values_pcoll_dict: A dictionary from dataset keys to input data
+      PCollections, or None.
+
+  Raises:
+    ValueError: If input data that is not provided needs to be read.
+  """
+  missing_data_consumers = []
+  for dataset_key, labels in sorted(
+      six.iteritems(raw_data_consumers), key=lambda kv: str(kv[0])):
+    if dataset_key is None:
+      pcoll = flattened_pcoll
+      description = 'the flattened input data'
+    else:
+      pcoll = input_values_pcoll_dict[dataset_key]
+      description = 'dataset {}'.format(dataset_key)
+    tf.compat.v1.logging.info('Analysis reads %s for: %s', description,
+                              ', '.join(labels))
+    if pcoll is None:
+      missing_data_consumers.append('{} is read by: {}'.format(
+          description, ', '.join(labels)))
+  if missing_data_consumers:
+    raise ValueError(
+        'Input data was not provided but is required since it is not fully '
+        'cached: {}'.format('; '.join(missing_data_consumers)))
+
+
 class _AnalyzeDatasetCommon(beam.PTransform):
   """Common implementation for AnalyzeDataset, with or without cache."""
 
-  def __init__(self, preprocessing_fn):
+  def __init__(self,
+               preprocessing_fn,
+               input_record_coder=None,
+               columnar_inputs=False):
     self._preprocessing_fn = preprocessing_fn
+    self._input_record_coder = input_record_coder
+    self._columnar_inputs = columnar_inputs
+    self._merged_dataset_keys = None
+    self._cache_analyzer_outputs = False
+    self._canonical_cache_keys = False
     _assert_tensorflow_version()
 
   def _extract_input_pvalues(self, dataset):
     # This method returns all nested pvalues to inform beam of nested pvalues.
     flat_data, data_dict, dataset_cache_dict, metadata = dataset
-    pvalues = [flat_data] + [data_dict[k] for k in data_dict]
+    # Input data can be None when it is fully cached.
+    pvalues = [
+        pcoll for pcoll in [flat_data] + [data_dict[k] for k in data_dict]
+        if pcoll is not None
+    ]
     if dataset_cache_dict is not None:
       for cache_dict in dataset_cache_dict.values():
         for cache_pcoll in cache_dict.values():
@@ -700,8 +1176,11 @@ class _AnalyzeDatasetCommon(beam.PTransform):
 
     analyzer_cache.validate_dataset_keys(input_values_pcoll_dict.keys())
 
+    profiler = Context.get_profiler()
     with tf.Graph().as_default() as graph:
 
+      # Analyzer cache entry keys depend on how inputs are created, this must be
+      # kept in sync with analysis_graph_builder.get_analysis_cache_entry_keys.
       with tf.compat.v1.name_scope('inputs'):
         feature_spec = input_schema.as_feature_spec()
         input_signature = impl_helper.feature_spec_as_batched_placeholders(
@@ -716,7 +1195,11 @@ class _AnalyzeDatasetCommon(beam.PTransform):
         # self._preprocessing_fn mutates its input.
         copied_inputs = impl_helper.copy_tensors(input_signature)
 
-      output_signature = self._preprocessing_fn(copied_inputs)
+      with profiling.profile_stage(profiler,
+                                   profiling.TRACE_PREPROCESSING_FN) as stage:
+        output_signature = self._preprocessing_fn(copied_inputs)
+        if stage is not None:
+          stage.num_nodes = len(graph.get_operations())
 
     # At this point we check that the preprocessing_fn has at least one
     # output. This is because if we allowed the output of preprocessing_fn to
@@ -732,7 +1215,8 @@ class _AnalyzeDatasetCommon(beam.PTransform):
               graph.get_collection_ref(
                   tf.compat.v1.GraphKeys.TRAINABLE_VARIABLES)))
 
-    pipeline = flattened_pcoll.pipeline
+    pipeline = _get_pipeline(flattened_pcoll, input_values_pcoll_dict,
+                             dataset_cache_dict)
     serialized_tf_config = common._DEFAULT_TENSORFLOW_CONFIG_BY_RUNNER.get(  # pylint: disable=protected-access
         pipeline.runner)
     extra_args = common.ConstructBeamPipelineVisitor.ExtraArgs(
@@ -744,28 +1228,56 @@ class _AnalyzeDatasetCommon(beam.PTransform):
         graph=graph,
         input_signature=input_signature,
         input_schema=input_schema,
-        cache_pcoll_dict=dataset_cache_dict)
-
-    transform_fn_future, cache_value_nodes = analysis_graph_builder.build(
-        graph,
-        input_signature,
-        output_signature,
-        input_values_pcoll_dict.keys(),
-        cache_dict=dataset_cache_dict)
-
-    traverser = nodes.Traverser(common.ConstructBeamPipelineVisitor(extra_args))
-    transform_fn_pcoll = traverser.visit_value_node(transform_fn_future)
+        cache_pcoll_dict=dataset_cache_dict,
+        input_record_coder=self._input_record_coder,
+        columnar_inputs=self._columnar_inputs)
+
+    with profiling.profile_stage(profiler,
+                                 profiling.BUILD_ANALYSIS_GRAPH) as stage:
+      transform_fn_future, cache_value_nodes = analysis_graph_builder.build(
+          graph,
+          input_signature,
+          output_signature,
+          input_values_pcoll_dict.keys(),
+          cache_dict=dataset_cache_dict,
+          merged_dataset_keys=self._merged_dataset_keys,
+          cache_analyzer_outputs=self._cache_analyzer_outputs,
+          canonical_cache_keys=self._canonical_cache_keys)
+      output_value_nodes = [transform_fn_future] + list(
+          (cache_value_nodes or {}).values())
+      if stage is not None:
+        num_analysis_nodes = profiling.count_operation_nodes(
+            output_value_nodes)
+        stage.num_nodes = num_analysis_nodes
 
     if cache_value_nodes is not None:
-      output_cache_pcoll_dict = {}
-      for (dataset_key,
-           cache_key), value_node in six.iteritems(cache_value_nodes):
-        if dataset_key not in output_cache_pcoll_dict:
-          output_cache_pcoll_dict[dataset_key] = {}
-        output_cache_pcoll_dict[dataset_key][cache_key] = (
-            traverser.visit_value_node(value_node))
-    else:
-      output_cache_pcoll_dict = None
+      _check_raw_data_is_available(
+          analysis_graph_builder.get_raw_data_consumers(output_value_nodes),
+          flattened_pcoll, input_values_pcoll_dict)
+
+    with profiling.profile_stage(profiler,
+                                 profiling.CONSTRUCT_BEAM_PIPELINE) as stage:
+      traverser = nodes.Traverser(
+          common.ConstructBeamPipelineVisitor(extra_args))
+      # The transform_fn is written as a self contained SavedModel.
+      transform_fn_pcoll = (
+          traverser.visit_value_node(transform_fn_future)
+          | 'MaterializeTensorBindings' >> beam.Map(
+              _materialize_tensor_bindings,
+              base_temp_dir=extra_args.base_temp_dir))
+
+      if cache_value_nodes is not None:
+        output_cache_pcoll_dict = {}
+        for (dataset_key,
+             cache_key), value_node in six.iteritems(cache_value_nodes):
+          if dataset_key not in output_cache_pcoll_dict:
+            output_cache_pcoll_dict[dataset_key] = {}
+          output_cache_pcoll_dict[dataset_key][cache_key] = (
+              traverser.visit_value_node(value_node))
+      else:
+        output_cache_pcoll_dict = None
+      if stage is not None:
+        stage.num_nodes = num_analysis_nodes
 
     # Infer metadata.  We take the inferred metadata and apply overrides that
     # refer to values of tensors in the graph.  The override tensors must
@@ -799,12 +1311,50 @@ class AnalyzeDatasetWithCache(_AnalyzeDatasetCommon):
   except this will not re-compute statistics when they are already cached, and
   will write out cache for statistics that it does compute whenever possible.
 
+  Cache can also be compacted over several dataset keys: for each
+  `analyzer_cache.MergedDatasetKey` in `merged_dataset_keys`, the accumulators
+  of all of its dataset keys are merged and added to the output cache under
+  that key.  Subsequent runs which read this cache then decode a single cache
+  entry in place of one per dataset key.
+
+  Input data PCollections (both the flattened one and those in the dictionary
+  of dataset keys) can be None when they are not needed, since all analyzers
+  over them are cached.  If such input data turns out to be needed, a
+  ValueError naming the analyzers which read it is raised.
+
+  When `cache_analyzer_outputs` is True, the final outputs of analyzers (such
+  as the ordered vocabulary, or quantile boundaries) are cached too, keyed by
+  an `analyzer_cache.AnalyzerOutputsDatasetKey` of all dataset keys.  Analyzing
+  the same dataset keys again then skips these analyzers entirely.
+
+  When `canonical_cache_keys` is True, cache entry keys don't depend on the
+  names of analyzers, and are computed from a canonical form of their input
+  graph, so that e.g. adding identity ops doesn't invalidate cache.  Use
+  `analysis_graph_builder.get_cache_entry_key_changes` to find out why cache
+  entry keys changed between two versions of a `preprocessing_fn`.
+
   Args:
     preprocessing_fn: A function that accepts and returns a dictionary from
       strings to `Tensor` or `SparseTensor`s.
+    merged_dataset_keys: (Optional) An iterable of
+      `analyzer_cache.MergedDatasetKey`s to compact the output cache into, see
+      `analyzer_cache.make_merged_dataset_keys`.
+    cache_analyzer_outputs: (Optional) Whether to use and produce cache for the
+      final outputs of analyzers.
+    canonical_cache_keys: (Optional) Whether to use canonical cache entry keys.
+      These are different from the default keys, so existing cache can't be
+      used after switching.
   """
 
-  pass
+  def __init__(self,
+               preprocessing_fn,
+               merged_dataset_keys=None,
+               cache_analyzer_outputs=False,
+               canonical_cache_keys=False):
+    super(AnalyzeDatasetWithCache, self).__init__(preprocessing_fn)
+    self._merged_dataset_keys = merged_dataset_keys
+    self._cache_analyzer_outputs = cache_analyzer_outputs
+    self._canonical_cache_keys = canonical_cache_keys
 
 
 class AnalyzeDataset(_AnalyzeDatasetCommon):
@@ -819,6 +1369,23 @@ class AnalyzeDataset(_AnalyzeDatasetCommon):
   Args:
     preprocessing_fn: A function that accepts and returns a dictionary from
       strings to `Tensor` or `SparseTensor`s.
+    input_record_coder: (Optional) A coder of raw records with a
+      `decode_tensors` method, i.e. a `CsvCoder` or an `ExampleProtoCoder` of
+      serialized tf.Examples.  If set, the input dataset is a PCollection of
+      raw records, e.g. CSV lines, which are decoded in the TF graph, instead
+      of a PCollection of instance dicts.  The input metadata must be the
+      schema of the decoded instances.  The transform function still takes
+      the decoded instances as inputs.
+    columnar_inputs: (Optional) If True, the input dataset is a PCollection of
+      columnar batches instead of instance dicts.  A columnar batch is a dict
+      from column name to an ndarray of shape [batch_size] + shape for
+      `FixedLenFeature`s, and to an `impl_helper.VarLenBatch` of the
+      concatenated values and the row lengths of a batch for `VarLenFeature`s
+      and for the index and value columns of `SparseFeature`s, e.g. as
+      returned by the `decode_batch` method of coders.  Columnar batches are
+      fed to the TF graph without being converted to instance dicts, and
+      without copying the values of `FixedLenFeature`s.  They are not batched
+      again, so their size should be suitable for running the TF graph.
   """
 
   def _extract_input_pvalues(self, dataset):
@@ -857,10 +1424,19 @@ class AnalyzeAndTransformDataset(beam.PTransform):
   Args:
     preprocessing_fn: A function that accepts and returns a dictionary from
         strings to `Tensor` or `SparseTensor`s.
+    input_record_coder: (Optional) A coder of raw records with a
+        `decode_tensors` method, see `AnalyzeDataset`.
+    columnar_inputs: (Optional) If True, the input dataset is a PCollection of
+        columnar batches, see `AnalyzeDataset`.
   """
 
-  def __init__(self, preprocessing_fn):
+  def __init__(self,
+               preprocessing_fn,
+               input_record_coder=None,
+               columnar_inputs=False):
     self._preprocessing_fn = preprocessing_fn
+    self._input_record_coder = input_record_coder
+    self._columnar_inputs = columnar_inputs
     _assert_tensorflow_version()
 
   def _extract_input_pvalues(self, dataset):
@@ -885,7 +1461,10 @@ class AnalyzeAndTransformDataset(beam.PTransform):
     # TransformDataset.  Future versions however could do somthing more optimal,
     # e.g. caching the values of expensive computations done in AnalyzeDataset.
     transform_fn = (
-        dataset | 'AnalyzeDataset' >> AnalyzeDataset(self._preprocessing_fn))
+        dataset | 'AnalyzeDataset' >> AnalyzeDataset(
+            self._preprocessing_fn,
+            input_record_coder=self._input_record_coder,
+            columnar_inputs=self._columnar_inputs))
 
     if Context.get_use_deep_copy_optimization():
       data, metadata = dataset
@@ -894,10 +1473,14 @@ class AnalyzeAndTransformDataset(beam.PTransform):
       # safe to read more than once.
       tf.compat.v1.logging.info(
           'Deep copying the dataset before applying transformation')
-      dataset = (deep_copy.deep_copy(data), metadata)
-
-    transformed_dataset = ((dataset, transform_fn)
-                           | 'TransformDataset' >> TransformDataset())
+      with profiling.profile_stage(Context.get_profiler(), profiling.DEEP_COPY):
+        dataset = (deep_copy.deep_copy(data), metadata)
+
+    transformed_dataset = (
+        (dataset, transform_fn)
+        | 'TransformDataset' >> TransformDataset(
+            input_record_coder=self._input_record_coder,
+            columnar_inputs=self._columnar_inputs))
     return transformed_dataset, transform_fn
 
 
@@ -922,10 +1505,39 @@ class TransformDataset(beam.PTransform):
 
   args:
     exclude_outputs: (Optional) Output features that should not be produced.
+    input_record_coder: (Optional) A coder of raw records with a
+      `decode_tensors` method, i.e. a `CsvCoder` or an `ExampleProtoCoder` of
+      serialized tf.Examples.  If set, the input dataset is a PCollection of
+      raw records, e.g. CSV lines, which are decoded in the TF graph, instead
+      of a PCollection of instance dicts.  The input metadata must be the
+      schema of the decoded instances.
+    output_batches: (Optional) If True, the transformed dataset is a
+      PCollection of batches, i.e. dicts from feature name to an ndarray of
+      shape [batch_size] + shape for `FixedLenFeature`s and a
+      `SparseTensorValue` for `VarLenFeature`s and `SparseFeature`s, instead
+      of instance dicts.  Batches can be encoded without being unbatched with
+      e.g. `beam.FlatMap(example_proto_coder.encode_batch)`.  Pass-through
+      keys, if any, map to lists of the values of their batch.
+    columnar_inputs: (Optional) If True, the input dataset is a PCollection of
+      columnar batches, see `AnalyzeDataset`.
+    columnar_outputs: (Optional) If True, the transformed dataset is a
+      PCollection of columnar batches, as accepted with `columnar_inputs`,
+      instead of instance dicts.  The values of `SparseTensorValue`s are not
+      copied.  Pass-through keys, if any, map to lists of the values of their
+      batch.  This takes precedence over `output_batches`.
   """
 
-  def __init__(self, exclude_outputs=None):
+  def __init__(self,
+               exclude_outputs=None,
+               input_record_coder=None,
+               output_batches=False,
+               columnar_inputs=False,
+               columnar_outputs=False):
     self._exclude_outputs = exclude_outputs
+    self._input_record_coder = input_record_coder
+    self._output_batches = output_batches
+    self._columnar_inputs = columnar_inputs
+    self._columnar_outputs = columnar_outputs
     _assert_tensorflow_version()
 
   def _extract_input_pvalues(self, dataset_and_transform_fn):
@@ -971,21 +1583,37 @@ class TransformDataset(beam.PTransform):
         common._DEFAULT_TENSORFLOW_CONFIG_BY_RUNNER.get(  # pylint: disable=protected-access
             self.pipeline.runner))
 
-    output_instances = (
-        input_values
-        | 'Batch' >> _BatchElements()
-        | 'Transform' >> beam.ParDo(
-            _RunMetaGraphDoFn(
-                input_metadata.schema,
-                serialized_tf_config,
-                shared_graph_state_handle=shared.Shared(),
-                passthrough_keys=Context.get_passthrough_keys(),
-                exclude_outputs=self._exclude_outputs),
-            saved_model_dir=beam.pvalue.AsSingleton(transform_fn))
-        | 'ConvertAndUnbatch' >> beam.FlatMap(
-            _convert_and_unbatch_to_instance_dicts,
-            schema=output_metadata.schema,
-            passthrough_keys=Context.get_passthrough_keys()))
+    output_batches = _batch_and_run_meta_graph(
+        input_values,
+        _RunMetaGraphDoFn(
+            input_metadata.schema,
+            serialized_tf_config,
+            shared_graph_state_handle=_GRAPH_STATE_SHARED_HANDLE,
+            passthrough_keys=Context.get_passthrough_keys(),
+            exclude_outputs=self._exclude_outputs,
+            input_record_coder=self._input_record_coder,
+            columnar_inputs=self._columnar_inputs),
+        transform_fn,
+        self._input_record_coder,
+        batch_label='Batch',
+        run_label='Transform',
+        columnar_inputs=self._columnar_inputs)
+    if self._columnar_outputs:
+      output_instances = (
+          output_batches
+          | 'ConvertToColumns' >> beam.Map(
+              _convert_to_columns,
+              schema=output_metadata.schema,
+              passthrough_keys=Context.get_passthrough_keys()))
+    elif self._output_batches:
+      output_instances = output_batches
+    else:
+      output_instances = (
+          output_batches
+          | 'ConvertAndUnbatch' >> beam.FlatMap(
+              _convert_and_unbatch_to_instance_dicts,
+              schema=output_metadata.schema,
+              passthrough_keys=Context.get_passthrough_keys()))
 
     _clear_shared_state_after_barrier(self.pipeline, output_instances)
 
@@ -34,10 +34,14 @@ from six.moves import range
 import tensorflow as tf
 import tensorflow_transform as tft
 from tensorflow_transform import analyzers
+from tensorflow_transform import impl_helper
 from tensorflow_transform import schema_inference
 from tensorflow_transform.beam import impl as beam_impl
 from tensorflow_transform.beam import tft_unit
 from tensorflow_transform.beam.tft_beam_io import transform_fn_io
+from tensorflow_transform.coders import csv_coder
+from tensorflow_transform.coders import example_proto_coder
+from tensorflow_transform.saved import saved_transform_io
 from google.protobuf import text_format
 from tensorflow.contrib.proto.python.ops import encode_proto_op
 from tensorflow.core.example import example_pb2
@@ -499,6 +503,170 @@ class BeamImplTest(tft_unit.TransformTestCase):
     self.assertEqual(transformed_eval_metadata.dataset_metadata,
                      expected_transformed_eval_metadata)
 
+  def testTransformWithOutputBatches(self):
+    def preprocessing_fn(inputs):
+      return {
+          'x_scaled': tft.scale_to_0_1(inputs['x']),
+          'y': inputs['y'],
+      }
+
+    input_metadata = tft_unit.metadata_from_feature_spec({
+        'x': tf.io.FixedLenFeature([], tf.float32),
+        'y': tf.io.VarLenFeature(tf.int64)
+    })
+    output_schema = tft_unit.metadata_from_feature_spec({
+        'x_scaled': tf.io.FixedLenFeature([], tf.float32),
+        'y': tf.io.VarLenFeature(tf.int64)
+    }).schema
+    coder = example_proto_coder.ExampleProtoCoder(output_schema)
+    with self._makeTestPipeline() as pipeline:
+      input_data = pipeline | 'CreateTrainingData' >> beam.Create(
+          [{'x': 5, 'y': [1, 2]}, {'x': 1, 'y': []}, {'x': 3, 'y': [3]}])
+      with beam_impl.Context(temp_dir=self.get_temp_dir()):
+        transform_fn = (
+            (input_data, input_metadata)
+            | 'AnalyzeDataset' >> beam_impl.AnalyzeDataset(preprocessing_fn))
+        transformed_batches, _ = (
+            ((input_data, input_metadata), transform_fn)
+            | 'TransformDataset' >> beam_impl.TransformDataset(
+                output_batches=True))
+      transformed_data = (
+          transformed_batches
+          | 'EncodeBatch' >> beam.FlatMap(
+              coder.encode_batch, fast_serialization=True)
+          | 'Decode' >> beam.Map(coder.decode)
+          | 'ToTuples' >> beam.Map(
+              lambda instance: (instance['x_scaled'], list(instance['y']))))
+      beam_test_util.assert_that(
+          transformed_data,
+          beam_test_util.equal_to([(1.0, [1, 2]), (0.0, []), (0.5, [3])]))
+
+  def testAnalyzeAndTransformCsvRecords(self):
+    def preprocessing_fn(inputs):
+      y_sum = tf.sparse.reduce_sum(inputs['y'], axis=1)
+      y_sum.set_shape([None])
+      return {
+          'x_scaled': tft.scale_to_0_1(inputs['x']),
+          'y_sum': y_sum,
+      }
+
+    input_metadata = tft_unit.metadata_from_feature_spec({
+        'x': tf.io.FixedLenFeature([], tf.float32),
+        'y': tf.io.VarLenFeature(tf.int64)
+    })
+    coder = csv_coder.CsvCoder(['x', 'y'],
+                               input_metadata.schema,
+                               secondary_delimiter='|',
+                               multivalent_columns=['y'])
+    with self._makeTestPipeline() as pipeline:
+      input_data = pipeline | 'CreateTrainingData' >> beam.Create(
+          ['5,1|2', '1,', '3,3'])
+      with beam_impl.Context(temp_dir=self.get_temp_dir()):
+        transformed_data, _ = (
+            (input_data, input_metadata)
+            | 'AnalyzeAndTransformDataset' >>
+            beam_impl.AnalyzeAndTransformDataset(
+                preprocessing_fn, input_record_coder=coder))
+      beam_test_util.assert_that(
+          transformed_data
+          | 'ToTuples' >> beam.Map(
+              lambda instance: (instance['x_scaled'], instance['y_sum'])),
+          beam_test_util.equal_to([(1.0, 3), (0.0, 0), (0.5, 3)]))
+
+  def testAnalyzeAndTransformSerializedExamples(self):
+    def preprocessing_fn(inputs):
+      return {'x_scaled': tft.scale_to_0_1(inputs['x']), 'y': inputs['y']}
+
+    input_metadata = tft_unit.metadata_from_feature_spec({
+        'x': tf.io.FixedLenFeature([], tf.float32),
+        'y': tf.io.VarLenFeature(tf.string)
+    })
+    input_coder = example_proto_coder.ExampleProtoCoder(input_metadata.schema)
+    output_coder = example_proto_coder.ExampleProtoCoder(
+        tft_unit.metadata_from_feature_spec({
+            'x_scaled': tf.io.FixedLenFeature([], tf.float32),
+            'y': tf.io.VarLenFeature(tf.string)
+        }).schema)
+    with self._makeTestPipeline() as pipeline:
+      input_data = pipeline | 'CreateTrainingData' >> beam.Create([
+          input_coder.encode({'x': 5, 'y': [b'a', b'b']}),
+          input_coder.encode({'x': 1, 'y': []}),
+          input_coder.encode({'x': 3, 'y': [b'c']}),
+      ])
+      with beam_impl.Context(temp_dir=self.get_temp_dir()):
+        transform_fn = (
+            (input_data, input_metadata)
+            | 'AnalyzeDataset' >> beam_impl.AnalyzeDataset(
+                preprocessing_fn, input_record_coder=input_coder))
+        transformed_batches, _ = (
+            ((input_data, input_metadata), transform_fn)
+            | 'TransformDataset' >> beam_impl.TransformDataset(
+                input_record_coder=input_coder, output_batches=True))
+      transformed_data = (
+          transformed_batches
+          | 'EncodeBatch' >> beam.FlatMap(
+              output_coder.encode_batch, fast_serialization=True)
+          | 'Decode' >> beam.Map(output_coder.decode)
+          | 'ToTuples' >> beam.Map(
+              lambda instance: (instance['x_scaled'], list(instance['y']))))
+      beam_test_util.assert_that(
+          transformed_data,
+          beam_test_util.equal_to([(1.0, [b'a', b'b']), (0.0, []),
+                                   (0.5, [b'c'])]))
+
+  def testAnalyzeAndTransformColumnarBatches(self):
+    def preprocessing_fn(inputs):
+      sparse_sum = tf.sparse.reduce_sum(inputs['sparse'], axis=1)
+      sparse_sum.set_shape([None])
+      return {
+          'x_scaled': tft.scale_to_0_1(inputs['x']),
+          'y': inputs['y'],
+          'sparse_sum': sparse_sum,
+      }
+
+    def var_len_batch(values, row_lengths, dtype):
+      return impl_helper.VarLenBatch(
+          np.array(values, dtype), np.array(row_lengths, np.int64))
+
+    def to_tuples(columns):
+      ys = np.split(columns['y'].values,
+                    np.cumsum(columns['y'].row_lengths)[:-1])
+      return [(x, list(y), s) for x, y, s in zip(
+          columns['x_scaled'], ys, columns['sparse_sum'])]
+
+    input_metadata = tft_unit.metadata_from_feature_spec({
+        'x': tf.io.FixedLenFeature([], tf.float32),
+        'y': tf.io.VarLenFeature(tf.int64),
+        'sparse': tf.io.SparseFeature('idx', 'val', tf.float32, 10),
+    })
+    input_batches = [{
+        'x': np.array([5, 1], np.float32),
+        'y': var_len_batch([1, 2], [2, 0], np.int64),
+        'idx': var_len_batch([0, 9, 3], [2, 1], np.int64),
+        'val': var_len_batch([1, 2, 4], [2, 1], np.float32),
+    }, {
+        'x': np.array([3], np.float32),
+        'y': var_len_batch([3], [1], np.int64),
+        'idx': var_len_batch([], [0], np.int64),
+        'val': var_len_batch([], [0], np.float32),
+    }]
+    with self._makeTestPipeline() as pipeline:
+      input_data = pipeline | 'CreateTrainingData' >> beam.Create(
+          input_batches)
+      with beam_impl.Context(temp_dir=self.get_temp_dir()):
+        transform_fn = (
+            (input_data, input_metadata)
+            | 'AnalyzeDataset' >> beam_impl.AnalyzeDataset(
+                preprocessing_fn, columnar_inputs=True))
+        transformed_batches, _ = (
+            ((input_data, input_metadata), transform_fn)
+            | 'TransformDataset' >> beam_impl.TransformDataset(
+                columnar_inputs=True, columnar_outputs=True))
+      beam_test_util.assert_that(
+          transformed_batches | 'ToTuples' >> beam.FlatMap(to_tuples),
+          beam_test_util.equal_to([(1.0, [1, 2], 3.0), (0.0, [], 4.0),
+                                   (0.5, [3], 0.0)]))
+
   def testMapSparseColumns(self):
     # Define a transform that takes a sparse column and a varlen column, and
     # returns a combination of dense, sparse, and varlen columns.
@@ -4282,6 +4450,102 @@ class BeamImplTest(tft_unit.TransformTestCase):
       annotation.Unpack(message)
       self.assertAllClose(list(message.boundaries), [1])
 
+  def testTensorBindingsSideFile(self):
+    unbound_saved_model_dir = os.path.join(self.get_temp_dir(), 'unbound')
+    with tf.Graph().as_default():
+      with tf.compat.v1.Session() as session:
+        x = tf.compat.v1.placeholder(tf.int64, [None], name='x')
+        y = tf.compat.v1.placeholder(tf.int64, [], name='y')
+        saved_transform_io.write_saved_transform_from_session(
+            session, {'x': x}, {'z': x + y}, unbound_saved_model_dir)
+
+    tensor_bindings = [beam_impl._TensorBinding(np.int64(5), 'y:0', False)]
+    bound_dir = beam_impl._write_tensor_bindings(
+        unbound_saved_model_dir, tensor_bindings, self.get_temp_dir())
+    self.assertEqual(
+        beam_impl._read_tensor_bindings(bound_dir),
+        (unbound_saved_model_dir, tensor_bindings))
+    self.assertEqual(
+        beam_impl._read_tensor_bindings(unbound_saved_model_dir),
+        (unbound_saved_model_dir, []))
+
+    saved_model_dir = beam_impl._materialize_tensor_bindings(
+        bound_dir, self.get_temp_dir())
+    self.assertEqual(
+        beam_impl._read_tensor_bindings(saved_model_dir),
+        (saved_model_dir, []))
+    with tf.Graph().as_default():
+      with tf.compat.v1.Session() as session:
+        _, outputs = (
+            saved_transform_io.partially_apply_saved_transform_internal(
+                saved_model_dir, {'x': tf.constant([1, 2], tf.int64)}))
+        self.assertAllEqual(session.run(outputs['z']), [6, 7])
+
+  def testFingerprintSavedModelDir(self):
+
+    def write_dir(name, files):
+      path = os.path.join(self.get_temp_dir(), name)
+      for filename, contents in files.items():
+        tf.io.gfile.makedirs(os.path.dirname(os.path.join(path, filename)))
+        with tf.io.gfile.GFile(os.path.join(path, filename), 'w') as f:
+          f.write(contents)
+      return path
+
+    files = {'saved_model.pb': 'graph', 'assets/vocab': 'a\nb'}
+    fingerprint = beam_impl._fingerprint_saved_model_dir(
+        write_dir('first', files))
+    self.assertEqual(fingerprint.num_bytes, 8)
+    self.assertEqual(
+        beam_impl._fingerprint_saved_model_dir(write_dir('copy', files)),
+        fingerprint)
+    self.assertNotEqual(
+        beam_impl._fingerprint_saved_model_dir(
+            write_dir('other_vocab', {
+                'saved_model.pb': 'graph',
+                'assets/vocab': 'a\nc'
+            })), fingerprint)
+    self.assertNotEqual(
+        beam_impl._fingerprint_saved_model_dir(
+            write_dir('other_filename', {
+                'saved_model.pb': 'graph',
+                'assets/vocab2': 'a\nb'
+            })), fingerprint)
+
+    # The fingerprint side file is not part of the fingerprint.
+    with_fingerprint_file = write_dir('with_fingerprint_file', files)
+    beam_impl._write_saved_model_fingerprint(with_fingerprint_file)
+    self.assertEqual(
+        beam_impl._compute_saved_model_fingerprint(with_fingerprint_file),
+        fingerprint)
+
+    # The fingerprint is read from the side file rather than computed.
+    files_with_fingerprint_file = dict(files)
+    files_with_fingerprint_file[beam_impl._FINGERPRINT_FILENAME] = 'abc 123'
+    self.assertEqual(
+        beam_impl._fingerprint_saved_model_dir(
+            write_dir('from_fingerprint_file', files_with_fingerprint_file)),
+        beam_impl._SavedModelFingerprint('abc', 123))
+
+  def testEstimateGraphStateNumBytes(self):
+    saved_model_dir = os.path.join(self.get_temp_dir(), 'saved_model')
+    tf.io.gfile.makedirs(os.path.join(saved_model_dir, 'assets'))
+    for filename, contents in [('saved_model.pb', 'graph'),
+                               ('assets/vocab', 'a\nb')]:
+      with tf.io.gfile.GFile(os.path.join(saved_model_dir, filename), 'w') as f:
+        f.write(contents)
+    self.assertEqual(
+        beam_impl._estimate_graph_state_num_bytes(saved_model_dir), 8)
+
+    bound_dir = beam_impl._write_tensor_bindings(
+        saved_model_dir,
+        [beam_impl._TensorBinding(np.int64(5), 'Const:0', False)],
+        self.get_temp_dir())
+    bindings_num_bytes = tf.io.gfile.stat(
+        os.path.join(bound_dir, beam_impl._TENSOR_BINDINGS_FILENAME)).length
+    self.assertEqual(
+        beam_impl._estimate_graph_state_num_bytes(bound_dir),
+        8 + bindings_num_bytes)
+
 
 if __name__ == '__main__':
   tft_unit.main()
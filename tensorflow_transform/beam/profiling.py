@@ -0,0 +1,161 @@
+# Copyright 2019 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Profiling of the construction of tf.Transform Beam pipelines.
+
+Constructing a pipeline happens on the client before the job is submitted, and
+includes tracing the `preprocessing_fn`, building the analysis graph, writing
+SavedModels and expanding the Beam PTransforms.  A
+`PipelineConstructionProfiler` set in `tft_beam.Context` records how long each
+of these stages takes.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import contextlib
+import time
+
+# GOOGLE-INITIALIZATION
+
+import six
+import tensorflow as tf
+from tensorflow_transform import nodes
+
+# Stages of pipeline construction that are profiled.
+TRACE_PREPROCESSING_FN = 'trace_preprocessing_fn'
+BUILD_ANALYSIS_GRAPH = 'build_analysis_graph'
+CREATE_SAVED_MODEL = 'create_saved_model'
+CONSTRUCT_BEAM_PIPELINE = 'construct_beam_pipeline'
+DEEP_COPY = 'deep_copy'
+
+
+class StageProfile(
+    collections.namedtuple(
+        'StageProfile', ['name', 'count', 'wall_time_secs', 'num_nodes'])):
+  """The profile of a stage of pipeline construction.
+
+  Fields:
+    name: The name of the stage.
+    count: The number of times the stage ran.
+    wall_time_secs: The total wall time of the stage in seconds.
+    num_nodes: The total number of nodes that the stage processed, or None if
+      it is not known.  These are TF ops when tracing the `preprocessing_fn`
+      and creating SavedModels, and analysis graph operations when building
+      the analysis graph and constructing the Beam pipeline.
+  """
+
+
+class _StageRecorder(object):
+  """Holds the node count of a stage while it runs."""
+
+  def __init__(self):
+    self.num_nodes = None
+
+
+class PipelineConstructionProfiler(object):
+  """Records the wall time and node counts of pipeline construction stages.
+
+  Stages may be nested, e.g. SavedModels are created while the Beam pipeline is
+  constructed, and so the time of the former is included in the latter.
+
+  Example usage:
+
+    profiler = tft_beam.profiling.PipelineConstructionProfiler()
+    with tft_beam.Context(temp_dir=temp_dir, profiler=profiler):
+      transform_fn = (
+          (data, metadata) | tft_beam.AnalyzeDataset(preprocessing_fn))
+    for stage in profiler.get_report():
+      print(stage.name, stage.wall_time_secs, stage.num_nodes)
+  """
+
+  def __init__(self):
+    self._stages = collections.OrderedDict()
+
+  @contextlib.contextmanager
+  def profile_stage(self, name):
+    """Records the wall time of a stage that runs within this context.
+
+    Args:
+      name: The name of the stage.
+
+    Yields:
+      An object whose `num_nodes` attribute can be set to the number of nodes
+      that the stage processed.
+    """
+    recorder = _StageRecorder()
+    start = time.time()
+    yield recorder
+    wall_time_secs = time.time() - start
+    tf.compat.v1.logging.info(
+        'Pipeline construction stage %s took %.3f seconds (nodes: %s)', name,
+        wall_time_secs, recorder.num_nodes)
+    previous = self._stages.get(name)
+    if previous is None:
+      self._stages[name] = StageProfile(name, 1, wall_time_secs,
+                                        recorder.num_nodes)
+    else:
+      if previous.num_nodes is None or recorder.num_nodes is None:
+        num_nodes = previous.num_nodes or recorder.num_nodes
+      else:
+        num_nodes = previous.num_nodes + recorder.num_nodes
+      self._stages[name] = StageProfile(
+          name, previous.count + 1, previous.wall_time_secs + wall_time_secs,
+          num_nodes)
+
+  def get_report(self):
+    """Returns a list of `StageProfile`s in the order stages first ran."""
+    return list(self._stages.values())
+
+  def log_report(self):
+    """Logs the profiles of all stages."""
+    for stage in six.itervalues(self._stages):
+      tf.compat.v1.logging.info(
+          'Pipeline construction stage %s: ran %d times, took %.3f seconds '
+          '(nodes: %s)', stage.name, stage.count, stage.wall_time_secs,
+          stage.num_nodes)
+
+
+@contextlib.contextmanager
+def profile_stage(profiler, name):
+  """Like `profiler.profile_stage`, but yields None if `profiler` is None."""
+  if profiler is None:
+    yield None
+  else:
+    with profiler.profile_stage(name) as recorder:
+      yield recorder
+
+
+class _CountOperationsVisitor(nodes.Visitor):
+  """Visitor which counts the operations it visits."""
+
+  def __init__(self):
+    self.num_operations = 0
+
+  def visit(self, operation_def, input_values):
+    self.num_operations += 1
+    return (None,) * operation_def.num_outputs
+
+  def validate_value(self, value):
+    assert value is None
+
+
+def count_operation_nodes(value_nodes):
+  """Returns the number of operations that `value_nodes` depend on."""
+  visitor = _CountOperationsVisitor()
+  traverser = nodes.Traverser(visitor)
+  for value_node in value_nodes:
+    traverser.visit_value_node(value_node)
+  return visitor.num_operations
@@ -0,0 +1,103 @@
+# Copyright 2019 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for tensorflow_transform.beam.profiling."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+
+# GOOGLE-INITIALIZATION
+
+import tensorflow as tf
+import tensorflow_transform as tft
+from tensorflow_transform import nodes
+from tensorflow_transform import test_case
+from tensorflow_transform.beam import impl as beam_impl
+from tensorflow_transform.beam import profiling
+from tensorflow_transform.beam import tft_unit
+
+
+class _Constant(collections.namedtuple('_Constant', ['value', 'label']),
+                nodes.OperationDef):
+  pass
+
+
+class _Concat(collections.namedtuple('_Concat', ['label']), nodes.OperationDef):
+  pass
+
+
+class ProfilingTest(test_case.TransformTestCase):
+
+  def testProfileStage(self):
+    profiler = profiling.PipelineConstructionProfiler()
+    with profiler.profile_stage('a') as stage:
+      stage.num_nodes = 2
+    with profiler.profile_stage('b'):
+      pass
+    with profiler.profile_stage('a') as stage:
+      stage.num_nodes = 3
+
+    report = profiler.get_report()
+    self.assertEqual([(stage.name, stage.count, stage.num_nodes)
+                      for stage in report], [('a', 2, 5), ('b', 1, None)])
+    for stage in report:
+      self.assertGreaterEqual(stage.wall_time_secs, 0)
+    profiler.log_report()
+
+  def testProfileStageWithoutProfiler(self):
+    with profiling.profile_stage(None, 'a') as stage:
+      self.assertIsNone(stage)
+
+  def testCountOperationNodes(self):
+    a = nodes.apply_operation(_Constant, value='a', label='Constant[a]')
+    b = nodes.apply_operation(_Constant, value='b', label='Constant[b]')
+    a_b = nodes.apply_operation(_Concat, a, b, label='Concat[0]')
+    a_b_a = nodes.apply_operation(_Concat, a_b, a, label='Concat[1]')
+    self.assertEqual(profiling.count_operation_nodes([a_b]), 3)
+    self.assertEqual(profiling.count_operation_nodes([a_b_a, a]), 4)
+
+
+class ProfilingAnalyzeDatasetTest(tft_unit.TransformTestCase):
+
+  def testAnalyzeDatasetIsProfiled(self):
+
+    def preprocessing_fn(inputs):
+      return {'x_scaled': tft.scale_to_0_1(inputs['x'])}
+
+    input_data = [{'x': 1.0}, {'x': 2.0}]
+    input_metadata = tft_unit.metadata_from_feature_spec({
+        'x': tf.io.FixedLenFeature([], tf.float32),
+    })
+    profiler = profiling.PipelineConstructionProfiler()
+    with beam_impl.Context(temp_dir=self.get_temp_dir(), profiler=profiler):
+      self.assertIs(beam_impl.Context.get_profiler(), profiler)
+      _ = ((input_data, input_metadata)
+           | beam_impl.AnalyzeDataset(preprocessing_fn))
+    self.assertIsNone(beam_impl.Context.get_profiler())
+
+    stages = {stage.name: stage for stage in profiler.get_report()}
+    self.assertCountEqual([
+        profiling.TRACE_PREPROCESSING_FN, profiling.BUILD_ANALYSIS_GRAPH,
+        profiling.CREATE_SAVED_MODEL, profiling.CONSTRUCT_BEAM_PIPELINE
+    ], stages.keys())
+    # A SavedModel is created for the analyzers' inputs and for transform_fn.
+    self.assertEqual(stages[profiling.CREATE_SAVED_MODEL].count, 2)
+    for stage in stages.values():
+      self.assertGreater(stage.num_nodes, 0)
+
+
+if __name__ == '__main__':
+  test_case.main()
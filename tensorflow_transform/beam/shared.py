@@ -48,11 +48,62 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
 import threading
+import time
 import uuid
 import weakref
 
 
+class KeepalivePolicy(
+    collections.namedtuple('KeepalivePolicy', ['max_objects', 'max_bytes'])):
+  """Policy for the objects of a Shared handle which are kept alive.
+
+  The most recently acquired object is always kept alive.  Less recently
+  acquired objects are released once there are more than `max_objects`
+  objects, or once their total estimated size exceeds `max_bytes`.
+
+  Fields:
+    max_objects: The maximum number of objects with distinct tags to keep
+      alive.
+    max_bytes: (Optional) The maximum total size in bytes of objects to keep
+      alive, as estimated by the `size_fn` passed to `Shared.acquire`.  Objects
+      without a size estimate count as 0 bytes.
+  """
+
+  def __new__(cls, max_objects=1, max_bytes=None):
+    return super(KeepalivePolicy, cls).__new__(cls, max_objects, max_bytes)
+
+
+class SharedObjectStats(
+    collections.namedtuple(
+        'SharedObjectStats',
+        ['hits', 'misses', 'construct_seconds', 'evictions'])):
+  """Counters of the acquisitions of a shared object.
+
+  Fields:
+    hits: The number of acquisitions which returned an existing object.
+    misses: The number of acquisitions which constructed the object.
+    construct_seconds: The total wall time spent constructing the object.
+    evictions: The number of times the object was released from the keepalive
+      due to the keepalive policy.
+  """
+
+
+class _SharedObjectCounters(object):
+  """Mutable counters of a shared object, see SharedObjectStats."""
+
+  def __init__(self):
+    self.hits = 0
+    self.misses = 0
+    self.construct_seconds = 0.
+    self.evictions = 0
+
+  def get_stats(self):
+    return SharedObjectStats(self.hits, self.misses, self.construct_seconds,
+                             self.evictions)
+
+
 class _SharedControlBlock(object):
   """Wrapper class for holding objects in the SharedMap.
 
@@ -63,9 +114,10 @@ class _SharedControlBlock(object):
   def __init__(self):
     self._lock = threading.Lock()
     self._ref = None
+    self.size = None
 
-  def acquire(self, constructor_fn):
-    # type: (Callable[[], Any])
+  def acquire(self, constructor_fn, size_fn=None):
+    # type: (Callable[[], Any], Callable[[Any], int])
     """Acquire a reference to the object this shared control block manages.
 
     Args:
@@ -73,22 +125,29 @@ class _SharedControlBlock(object):
         present in the cache. This function should take no arguments. It should
         return an initialised object, or None if the object could not be
         initialised / constructed.
+      size_fn: (Optional) function that returns the estimated size in bytes of
+        a newly-constructed object.
 
     Returns:
-      An initialised object, either from a previous initialisation, or
-      newly-constructed.
+      A pair of an initialised object, either from a previous initialisation,
+      or newly-constructed, and the seconds it took to construct it or None if
+      it was not constructed.
     """
+    construct_seconds = None
     with self._lock:
       # self._ref is None if this is a new control block.
       # self._ref() is None if the weak reference was GCed.
       if self._ref is None or self._ref() is None:
+        start = time.time()
         result = constructor_fn()
+        construct_seconds = time.time() - start
         if result is None:
-          return None
+          return None, construct_seconds
         self._ref = weakref.ref(result)
+        self.size = size_fn(result) if size_fn is not None else None
       else:
         result = self._ref()
-    return result
+    return result, construct_seconds
 
 
 class _SharedMap(object):
@@ -140,6 +199,13 @@ class _SharedMap(object):
      and after S2 executes a new thread is created starting with S1 again, which
      displaces S2.
 
+  A single Shared token can however manage several objects, distinguished by a
+  tag passed to acquire.  The keepalive holds the most recently acquired
+  objects of the most recently used Shared token, as many as its
+  KeepalivePolicy allows, so stages which use the same Shared token with
+  different tags (e.g. fused stages applying different graphs) don't displace
+  each other.
+
   Related bugs:
     b/69922446
     BEAM-562 - DoFn reuse
@@ -149,18 +215,28 @@ class _SharedMap(object):
     # Lock that protects cache_map
     self._lock = threading.Lock()
 
-    # Dictionary of references to shared control blocks
+    # Dictionary from (key, tag) to shared control blocks
     self._cache_map = dict()
 
-    # Tuple of (key, obj), where obj is an object we explicitly hold a reference
-    # to keep it alive
-    self._keepalive = (None, None)
+    # Dictionary from (key, tag) to _SharedObjectCounters
+    self._counters = collections.defaultdict(_SharedObjectCounters)
+
+    # The key whose objects are kept alive, and an OrderedDict from tag to
+    # pairs of an object we explicitly hold a reference to keep it alive and
+    # its estimated size, least recently acquired first.
+    self._keepalive_key = None
+    self._keepalive = collections.OrderedDict()
 
   def make_key(self):
     return str(uuid.uuid1())
 
-  def acquire(self, key, constructor_fn):
-    # type: (bytes, Callable[[], Any])
+  def acquire(self,
+              key,
+              constructor_fn,
+              tag=None,
+              size_fn=None,
+              keepalive_policy=KeepalivePolicy()):
+    # type: (bytes, Callable[[], Any], Any, Callable, KeepalivePolicy)
     """Acquire a reference to a Shared object.
 
     Args:
@@ -169,26 +245,60 @@ class _SharedMap(object):
         present in the cache. This function should take no arguments. It should
         return an initialised object, or None if the object could not be
         initialised / constructed.
+      tag: (Optional) a hashable tag which distinguishes objects managed with
+        the same key.
+      size_fn: (Optional) function that returns the estimated size in bytes of
+        a newly-constructed object.
+      keepalive_policy: the KeepalivePolicy for the objects of this key.
 
     Returns:
       A reference to the initialised object, either from the cache, or
       newly-constructed.
     """
     with self._lock:
-      control_block = self._cache_map.get(key)
+      control_block = self._cache_map.get((key, tag))
       if control_block is None:
         control_block = _SharedControlBlock()
-        self._cache_map[key] = control_block
+        self._cache_map[(key, tag)] = control_block
 
-    result = control_block.acquire(constructor_fn)
+    result, construct_seconds = control_block.acquire(constructor_fn, size_fn)
 
     # Because we release the lock in between, if we acquire multiple Shareds
     # in a short time, there's no guarantee as to which one will be kept alive.
     with self._lock:
-      self._keepalive = (key, result)
+      counters = self._counters[(key, tag)]
+      if construct_seconds is None:
+        counters.hits += 1
+      else:
+        counters.misses += 1
+        counters.construct_seconds += construct_seconds
+
+      if self._keepalive_key != key:
+        self._keepalive_key = key
+        self._keepalive = collections.OrderedDict()
+      self._keepalive.pop(tag, None)
+      self._keepalive[tag] = (result, control_block.size)
+      self._evict(key, keepalive_policy)
 
     return result
 
+  def _evict(self, key, keepalive_policy):
+    """Releases the least recently acquired objects the policy doesn't allow."""
+    total_bytes = sum(size or 0 for _, size in self._keepalive.values())
+    # The most recently acquired object is never released.
+    while len(self._keepalive) > 1 and (
+        len(self._keepalive) > keepalive_policy.max_objects or
+        (keepalive_policy.max_bytes is not None and
+         total_bytes > keepalive_policy.max_bytes)):
+      tag, (_, size) = self._keepalive.popitem(last=False)
+      total_bytes -= size or 0
+      self._counters[(key, tag)].evictions += 1
+
+  def get_stats(self, key, tag=None):
+    """Returns the SharedObjectStats of the object with a key and tag."""
+    with self._lock:
+      return self._counters[(key, tag)].get_stats()
+
 
 # Instance of the shared map to be used with Shared objects.
 _shared_map = _SharedMap()
@@ -199,13 +309,21 @@ class Shared(object):
 
   Each instance of a Shared object represents a distinct handle to a distinct
   object. Example usage is described in the file comment of shared.py.
+
+  Args:
+    keepalive_policy: (Optional) a KeepalivePolicy for the objects with distinct
+      tags acquired through this handle that are kept alive.  By default only
+      the most recently acquired object is kept alive.
   """
 
-  def __init__(self):
+  def __init__(self, keepalive_policy=None):
     self._key = _shared_map.make_key()
+    self._keepalive_policy = (
+        keepalive_policy if keepalive_policy is not None else
+        KeepalivePolicy())
 
-  def acquire(self, constructor_fn):
-    # type: (Callable[[], Any])
+  def acquire(self, constructor_fn, tag=None, size_fn=None):
+    # type: (Callable[[], Any], Any, Callable[[Any], int])
     """Acquire a reference to the object associated with this Shared handle.
 
     Args:
@@ -213,9 +331,18 @@ class Shared(object):
         present in the cache. This function should take no arguments. It should
         return an initialised object, or None if the object could not be
         initialised / constructed.
+      tag: (Optional) a hashable tag, objects acquired with different tags are
+        distinct objects.
+      size_fn: (Optional) function that returns the estimated size in bytes of
+        a newly-constructed object, used by the KeepalivePolicy.
 
     Returns:
       A reference to an initialised object, either from the cache, or
       newly-constructed.
     """
-    return _shared_map.acquire(self._key, constructor_fn)
+    return _shared_map.acquire(self._key, constructor_fn, tag, size_fn,
+                               self._keepalive_policy)
+
+  def get_stats(self, tag=None):
+    """Returns the SharedObjectStats of the object with the given tag."""
+    return _shared_map.get_stats(self._key, tag)
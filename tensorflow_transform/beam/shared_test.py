@@ -237,6 +237,86 @@ class SharedTest(unittest.TestCase):
     self.assertEquals('sequence3', f3.get_name())
     self.assertEquals('sequence4', s3.get_name())
 
+  def testTags(self):
+    sequence = Sequence()
+    shared_handle = shared.Shared()
+
+    a1 = shared_handle.acquire(sequence.make_acquire_fn(), tag='a')
+    b1 = shared_handle.acquire(sequence.make_acquire_fn(), tag='b')
+    a2 = shared_handle.acquire(sequence.make_acquire_fn(), tag='a')
+    self.assertEquals('sequence1', a1.get_name())
+    self.assertEquals('sequence2', b1.get_name())
+    self.assertIs(a1, a2)
+
+  def testKeepaliveTags(self):
+    count = Count()
+    shared_handle = shared.Shared(
+        keepalive_policy=shared.KeepalivePolicy(max_objects=2))
+    other_shared_handle = shared.Shared()
+
+    def dummy_acquire_fn():
+      return None
+
+    def acquire_fn():
+      return Marker(count)
+
+    for tag in ['a', 'b', 'a', 'c']:
+      shared_handle.acquire(acquire_fn, tag=tag)
+    gc.collect()
+    # 'b' was released, since 'a' and 'c' were acquired more recently.
+    self.assertEquals(3, count.get_total())
+    self.assertEquals(2, count.get_active())
+    shared_handle.acquire(acquire_fn, tag='a')
+    shared_handle.acquire(acquire_fn, tag='c')
+    self.assertEquals(3, count.get_total())
+
+    # Acquiring another handle releases all tags.
+    other_shared_handle.acquire(dummy_acquire_fn)
+    gc.collect()
+    self.assertEquals(0, count.get_active())
+
+  def testKeepaliveBytes(self):
+    count = Count()
+    shared_handle = shared.Shared(
+        keepalive_policy=shared.KeepalivePolicy(max_objects=10, max_bytes=10))
+
+    def acquire_fn():
+      return Marker(count)
+
+    sizes = {'a': 4, 'b': 4, 'c': 4, 'd': 20}
+    for tag in ['a', 'b', 'c']:
+      shared_handle.acquire(
+          acquire_fn, tag=tag, size_fn=lambda _, tag=tag: sizes[tag])
+    gc.collect()
+    # 'a' was released to keep the total size within 10 bytes.
+    self.assertEquals(2, count.get_active())
+    self.assertEquals(1, shared_handle.get_stats('a').evictions)
+    self.assertEquals(0, shared_handle.get_stats('b').evictions)
+
+    # The most recently acquired object is kept alive even if it is larger.
+    shared_handle.acquire(acquire_fn, tag='d', size_fn=lambda _: sizes['d'])
+    gc.collect()
+    self.assertEquals(1, count.get_active())
+
+  def testStats(self):
+    shared_handle = shared.Shared()
+    sequence = Sequence()
+
+    def slow_acquire_fn():
+      time.sleep(0.1)
+      return sequence.make_acquire_fn()()
+
+    p1 = shared_handle.acquire(slow_acquire_fn, tag='a')
+    p2 = shared_handle.acquire(slow_acquire_fn, tag='a')
+    self.assertIs(p1, p2)
+    stats = shared_handle.get_stats('a')
+    self.assertEquals(1, stats.hits)
+    self.assertEquals(1, stats.misses)
+    self.assertGreaterEqual(stats.construct_seconds, 0.1)
+    self.assertEquals(0, stats.evictions)
+    self.assertEquals(shared.SharedObjectStats(0, 0, 0., 0),
+                      shared_handle.get_stats('b'))
+
 
 if __name__ == '__main__':
   unittest.main()
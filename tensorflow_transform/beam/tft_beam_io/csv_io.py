@@ -0,0 +1,380 @@
+# Copyright 2019 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""A source of CSV records which may contain quoted newlines.
+
+`beam.io.ReadFromText` splits files into lines, so a CSV record with a newline
+in a quoted field is read as several elements that `CsvCoder` cannot decode.
+`ReadCsvRecords` reads files in blocks and splits them into records, so that
+each element is a whole record which can be decoded by `CsvCoder.decode`,
+`CsvCoder.decode_batch`, or in the TF graph by passing the `CsvCoder` as the
+`input_record_coder` of `tft_beam.AnalyzeDataset` or `TransformDataset`.
+
+Files can still be split for parallel reads.  A reader that starts in the middle
+of a file does not know whether it is inside a quoted field, so it scans ahead
+until only one of the two possibilities is consistent with the CSV format, and
+starts at the first record that follows.  This assumes that the files follow RFC
+4180, i.e. quotes only enclose fields and are doubled inside them, and that no
+record is longer than `max_record_size` bytes.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import re
+
+import apache_beam as beam
+from apache_beam import coders
+from apache_beam.io import filebasedsource
+from apache_beam.io.filesystem import CompressionTypes
+import tensorflow as tf
+
+_QUOTE = b'"'
+_NEWLINE = b'\n'
+_CARRIAGE_RETURN = b'\r'
+_DEFAULT_BUFFER_SIZE = 1 << 16
+_DEFAULT_MAX_RECORD_SIZE = 1 << 20
+
+# States of the lexer that finds out whether a position is inside a quoted
+# field.
+_START_RECORD = 0
+_START_FIELD = 1
+_IN_FIELD = 2
+_IN_QUOTED_FIELD = 3
+_QUOTE_IN_QUOTED_FIELD = 4
+_INVALID = 5
+
+
+def _next_state(state, token, delimiter):
+  """Returns the state of the lexer after a token.
+
+  Args:
+    state: The current state.
+    token: A quote, delimiter, newline or carriage return, or None for a run of
+      any other characters.
+    delimiter: The delimiter of fields.
+
+  Returns:
+    The next state, which is _INVALID if the token is not allowed by RFC 4180.
+  """
+  if state in (_START_RECORD, _START_FIELD):
+    if token == _QUOTE:
+      return _IN_QUOTED_FIELD
+    elif token == delimiter:
+      return _START_FIELD
+    elif token == _NEWLINE:
+      return _START_RECORD
+    else:
+      return _IN_FIELD
+  elif state == _IN_FIELD:
+    if token == _QUOTE:
+      return _INVALID
+    elif token == delimiter:
+      return _START_FIELD
+    elif token == _NEWLINE:
+      return _START_RECORD
+    else:
+      return _IN_FIELD
+  elif state == _IN_QUOTED_FIELD:
+    return _QUOTE_IN_QUOTED_FIELD if token == _QUOTE else _IN_QUOTED_FIELD
+  elif state == _QUOTE_IN_QUOTED_FIELD:
+    if token == _QUOTE:
+      return _IN_QUOTED_FIELD
+    elif token == delimiter:
+      return _START_FIELD
+    elif token == _NEWLINE:
+      return _START_RECORD
+    elif token == _CARRIAGE_RETURN:
+      return _QUOTE_IN_QUOTED_FIELD
+    else:
+      return _INVALID
+  else:
+    return _INVALID
+
+
+def _starts_in_quoted_field(data, delimiter, max_record_size, at_eof):
+  """Guesses whether data that follows a newline starts inside a quoted field.
+
+  The data is lexed under both hypotheses.  A hypothesis is rejected if it
+  leads to a quote that is not allowed by RFC 4180, if it implies a record
+  longer than `max_record_size`, or if it ends inside a quoted field at the end
+  of the file.  The in-quote states of the two hypotheses always differ, so
+  the data is scanned until one of them is rejected.
+
+  Args:
+    data: Bytes that follow a newline, at least twice `max_record_size` of them
+      unless `at_eof`.
+    delimiter: The delimiter of fields, as bytes.
+    max_record_size: The maximum size of a record in bytes.
+    at_eof: Whether `data` extends to the end of the file.
+
+  Returns:
+    True if only the hypothesis that `data` starts inside a quoted field is
+    consistent, False otherwise, including when neither or both are.
+  """
+  token_pattern = re.compile(b'|'.join(
+      re.escape(token)
+      for token in (_QUOTE, delimiter, _NEWLINE, _CARRIAGE_RETURN)))
+  # Indexed by whether the hypothesis is that data starts in a quoted field.
+  # The record that data starts in under the second hypothesis is assumed to
+  # start at 0, which underestimates its size.
+  states = [_START_RECORD, _IN_QUOTED_FIELD]
+  record_starts = [0, 0]
+  position = 0
+  for match in token_pattern.finditer(data):
+    tokens = [match.group()]
+    if match.start() > position:
+      tokens.insert(0, None)
+    position = match.end()
+    for hypothesis in (0, 1):
+      for token in tokens:
+        states[hypothesis] = _next_state(states[hypothesis], token, delimiter)
+      if states[hypothesis] == _START_RECORD:
+        if position - record_starts[hypothesis] > max_record_size:
+          states[hypothesis] = _INVALID
+        record_starts[hypothesis] = position
+    if _INVALID in states:
+      return states[0] == _INVALID and states[1] != _INVALID
+
+  for hypothesis in (0, 1):
+    if (len(data) - record_starts[hypothesis] > max_record_size or
+        (at_eof and states[hypothesis] == _IN_QUOTED_FIELD)):
+      states[hypothesis] = _INVALID
+  return states[0] == _INVALID and states[1] != _INVALID
+
+
+def _iter_lines(file_to_read, offset, buffer_size):
+  """Yields the (offset, line) of each line of a file starting at an offset.
+
+  Args:
+    file_to_read: A file object opened for reading bytes.
+    offset: The offset to start reading at, which must be the start of a line.
+    buffer_size: The number of bytes to read at a time.
+
+  Yields:
+    Pairs of the offset of a line and its bytes, including the newline which
+    terminates it, if any.
+  """
+  if offset:
+    file_to_read.seek(offset)
+  pieces = []
+  position = offset
+  while True:
+    block = file_to_read.read(buffer_size)
+    if not block:
+      break
+    start = 0
+    end = block.find(_NEWLINE)
+    while end != -1:
+      pieces.append(block[start:end + 1])
+      line = b''.join(pieces)
+      yield position, line
+      position += len(line)
+      pieces = []
+      start = end + 1
+      end = block.find(_NEWLINE, start)
+    if start < len(block):
+      pieces.append(block[start:])
+  if pieces:
+    yield position, b''.join(pieces)
+
+
+def _iter_records(lines, in_quoted_field=False):
+  """Yields the (offset, record) of each CSV record made of lines.
+
+  Args:
+    lines: An iterable of (offset, line) pairs, as yielded by `_iter_lines`.
+    in_quoted_field: Whether the first line starts inside a quoted field, in
+      which case the first record yielded is the end of a record.
+
+  Yields:
+    Pairs of the offset of a record and its bytes, without the line terminator.
+  """
+  record_start = None
+  pieces = []
+  for position, line in lines:
+    if not pieces:
+      record_start = position
+    pieces.append(line)
+    if line.count(_QUOTE) % 2:
+      in_quoted_field = not in_quoted_field
+    if not in_quoted_field:
+      record = b''.join(pieces)
+      if record.endswith(_NEWLINE):
+        record = record[:-1]
+        if record.endswith(_CARRIAGE_RETURN):
+          record = record[:-1]
+      yield record_start, record
+      pieces = []
+  if pieces:
+    # The file ends inside a quoted field.  The record is still output, so that
+    # decoding it raises an error.
+    yield record_start, b''.join(pieces)
+
+
+def _find_line_start(file_to_read, offset, buffer_size):
+  """Returns the offset of the first line that starts at or after an offset."""
+  if offset == 0:
+    return 0
+  file_to_read.seek(offset - 1)
+  position = offset - 1
+  while True:
+    block = file_to_read.read(buffer_size)
+    if not block:
+      return max(position, offset)
+    index = block.find(_NEWLINE)
+    if index != -1:
+      return position + index + 1
+    position += len(block)
+
+
+class _CsvRecordSource(filebasedsource.FileBasedSource):
+  """A `FileBasedSource` of CSV records which may contain quoted newlines.
+
+  A range [start, stop) of a file is read as the records that start between the
+  record boundaries of `start` and `stop`.  The record boundary of an offset is
+  the first record that starts at least `max_record_size` bytes after the first
+  line that starts at the offset.  Reading a range therefore continues after
+  `stop` until that boundary, and the next range starts at it.
+  """
+
+  def __init__(self, file_pattern, delimiter, skip_header_lines,
+               max_record_size, min_bundle_size, compression_type, coder,
+               validate, buffer_size=_DEFAULT_BUFFER_SIZE):
+    super(_CsvRecordSource, self).__init__(
+        file_pattern,
+        min_bundle_size=min_bundle_size,
+        compression_type=compression_type,
+        validate=validate)
+    self._delimiter = tf.compat.as_bytes(delimiter)
+    self._skip_header_lines = skip_header_lines
+    self._max_record_size = max_record_size
+    self._coder = coder
+    self._buffer_size = buffer_size
+
+  def _record_boundary(self, file_name, offset):
+    """Returns the record boundary of an offset, or None at the end of file."""
+    with self.open_file(file_name) as file_to_read:
+      line_start = _find_line_start(file_to_read, offset, self._buffer_size)
+      min_record_start = line_start + self._max_record_size
+      file_to_read.seek(line_start)
+      data = file_to_read.read(2 * self._max_record_size)
+      in_quoted_field = _starts_in_quoted_field(
+          data, self._delimiter, self._max_record_size,
+          at_eof=len(data) < 2 * self._max_record_size)
+      records = _iter_records(
+          _iter_lines(file_to_read, line_start, self._buffer_size),
+          in_quoted_field)
+      for record_start, _ in records:
+        if record_start >= min_record_start:
+          return record_start
+    return None
+
+  def _records_limit(self, file_name, offset):
+    """Returns the offset before which records belong to a range ending there.
+
+    Since the record boundary of `offset` is the first record which starts at
+    or after this limit, a range which ends at `offset` consists of the records
+    that start before it.
+
+    Args:
+      file_name: The name of the file.
+      offset: The end of the range.
+
+    Returns:
+      The limit of the starts of the records of a range which ends at `offset`.
+    """
+    with self.open_file(file_name) as file_to_read:
+      return (_find_line_start(file_to_read, offset, self._buffer_size) +
+              self._max_record_size)
+
+  def read_records(self, file_name, offset_range_tracker):
+    start_offset = offset_range_tracker.start_position()
+    if start_offset == 0:
+      record_start = 0
+    else:
+      record_start = self._record_boundary(file_name, start_offset)
+      if record_start is None:
+        return
+
+    with self.open_file(file_name) as file_to_read:
+      records = _iter_records(
+          _iter_lines(file_to_read, record_start, self._buffer_size))
+      if start_offset == 0:
+        for _ in range(self._skip_header_lines):
+          next(records, None)
+
+      # The first record is claimed at the start of the range, since it may
+      # start after its end.  Records that start after the end of the range
+      # are read until the record boundary of the end.
+      claimed = False
+      limit = None
+      for record_start, record in records:
+        if limit is None:
+          if offset_range_tracker.try_claim(
+              record_start if claimed else start_offset):
+            claimed = True
+            if record_start < offset_range_tracker.stop_position():
+              yield self._coder.decode(record)
+              continue
+          elif not claimed:
+            return
+          limit = self._records_limit(file_name,
+                                      offset_range_tracker.stop_position())
+        if record_start >= limit:
+          return
+        offset_range_tracker.set_current_position(record_start)
+        yield self._coder.decode(record)
+
+
+class ReadCsvRecords(beam.PTransform):
+  """Reads CSV records, which may contain quoted newlines, from text files.
+
+  Each element of the output PCollection is a whole CSV record, without its
+  line terminator, to be decoded e.g. with a `CsvCoder`.
+  """
+
+  def __init__(self,
+               file_pattern,
+               delimiter=',',
+               skip_header_lines=0,
+               max_record_size=_DEFAULT_MAX_RECORD_SIZE,
+               min_bundle_size=0,
+               compression_type=CompressionTypes.AUTO,
+               coder=coders.StrUtf8Coder(),
+               validate=True):
+    """Initializes ReadCsvRecords.
+
+    Args:
+      file_pattern: The file path or pattern of the files to read.
+      delimiter: A one-character string used to separate fields.
+      skip_header_lines: The number of records to skip at the start of each
+        file, e.g. 1 if the files have a header.
+      max_record_size: The maximum size of a record in bytes.  Larger records
+        may be read incorrectly when files are split.
+      min_bundle_size: The minimum size in bytes of the ranges files are split
+        into.
+      compression_type: A `CompressionTypes` of the files.  Compressed files are
+        not split.
+      coder: The coder used to decode the bytes of each record.
+      validate: Whether to verify that the files exist when the pipeline is
+        constructed.
+    """
+    super(ReadCsvRecords, self).__init__()
+    self._source = _CsvRecordSource(file_pattern, delimiter, skip_header_lines,
+                                    max_record_size, min_bundle_size,
+                                    compression_type, coder, validate)
+
+  def expand(self, pbegin):
+    return pbegin.pipeline | beam.io.Read(self._source)
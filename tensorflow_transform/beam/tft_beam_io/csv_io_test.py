@@ -0,0 +1,157 @@
+# Copyright 2019 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for csv_io."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+# GOOGLE-INITIALIZATION
+
+import apache_beam as beam
+from apache_beam import coders
+from apache_beam.io import source_test_utils
+from apache_beam.io.filesystem import CompressionTypes
+from apache_beam.testing import util as beam_test_util
+
+import tensorflow as tf
+from tensorflow_transform import test_case
+from tensorflow_transform.beam.tft_beam_io import csv_io
+from tensorflow_transform.coders import csv_coder
+from tensorflow_transform.tf_metadata import dataset_schema
+
+_RECORDS = [
+    u'1,"multi\nline",a',
+    u'2,"with ""quotes""\nand, commas",b',
+    u'3,single line,c',
+    u'',
+    u'4,"\n\n",d',
+    u'5,"ends with a newline\n",e',
+    u'6,"crlf\r\ninside",f',
+    u'7,unquoted,g',
+]
+
+
+def _write_file(path, contents):
+  with tf.io.gfile.GFile(path, 'wb') as f:
+    f.write(tf.compat.as_bytes(contents))
+
+
+def _make_source(path, max_record_size=64):
+  return csv_io._CsvRecordSource(  # pylint: disable=protected-access
+      path,
+      delimiter=',',
+      skip_header_lines=0,
+      max_record_size=max_record_size,
+      min_bundle_size=0,
+      compression_type=CompressionTypes.AUTO,
+      coder=coders.StrUtf8Coder(),
+      validate=True,
+      buffer_size=16)
+
+
+class CsvIoTest(test_case.TransformTestCase):
+
+  def testReadCsvRecords(self):
+    path = os.path.join(self.get_temp_dir(), 'data.csv')
+    _write_file(path, u'x,y,z\r\n' + u'\r\n'.join(_RECORDS) + u'\r\n')
+    with beam.Pipeline() as pipeline:
+      records = pipeline | csv_io.ReadCsvRecords(path, skip_header_lines=1)
+      beam_test_util.assert_that(records, beam_test_util.equal_to(_RECORDS))
+
+  def testReadCsvRecordsAndDecode(self):
+    path = os.path.join(self.get_temp_dir(), 'data.tsv')
+    _write_file(path, u'1\t"a\nb"\n2\t"c\td"')
+    coder = csv_coder.CsvCoder(
+        ['x', 'y'],
+        dataset_schema.from_feature_spec({
+            'x': tf.io.FixedLenFeature([], tf.int64),
+            'y': tf.io.FixedLenFeature([], tf.string),
+        }),
+        delimiter='\t')
+    with beam.Pipeline() as pipeline:
+      instances = (
+          pipeline
+          | csv_io.ReadCsvRecords(path, delimiter='\t')
+          | beam.Map(coder.decode))
+      beam_test_util.assert_that(
+          instances,
+          beam_test_util.equal_to([{
+              'x': 1,
+              'y': b'a\nb'
+          }, {
+              'x': 2,
+              'y': b'c\td'
+          }]))
+
+  def testSplitSource(self):
+    path = os.path.join(self.get_temp_dir(), 'split.csv')
+    _write_file(path, u'\n'.join(_RECORDS * 10))
+    source = _make_source(path)
+    reference = source_test_utils.read_from_source(source, None, None)
+    self.assertEqual(reference, _RECORDS * 10)
+    for desired_bundle_size in [1, 7, 50, 200]:
+      splits = [(split.source, split.start_position, split.stop_position)
+                for split in source.split(desired_bundle_size)]
+      self.assertGreater(len(splits), 1)
+      source_test_utils.assert_sources_equal_reference_source(
+          (source, None, None), splits)
+
+  def testSplitAtFractionExhaustive(self):
+    path = os.path.join(self.get_temp_dir(), 'dynamic_split.csv')
+    _write_file(path, u'\n'.join(_RECORDS * 3))
+    source_test_utils.assert_split_at_fraction_exhaustive(_make_source(path))
+
+  @test_case.named_parameters(
+      dict(
+          testcase_name='unquoted',
+          data=b'a,b\nc,d\ne,f\n',
+          at_eof=True,
+          expected=False),
+      dict(
+          testcase_name='quote_after_unquoted_value',
+          data=b'a",b\nc,d\n',
+          at_eof=False,
+          expected=True),
+      dict(
+          testcase_name='quote_in_unquoted_field',
+          data=b'a\n"b"c\n',
+          at_eof=False,
+          expected=False),
+      dict(
+          testcase_name='unterminated_quote_at_eof',
+          data=b'a\n",b\n',
+          at_eof=True,
+          expected=True),
+      dict(
+          testcase_name='unterminated_quote_before_eof',
+          data=b'a\n",b\n',
+          at_eof=False,
+          expected=False),
+      dict(
+          testcase_name='record_too_long',
+          data=b'a\n",' + b'x' * 100 + b'\n',
+          at_eof=False,
+          expected=False),
+  )
+  def testStartsInQuotedField(self, data, at_eof, expected):
+    self.assertEqual(
+        csv_io._starts_in_quoted_field(  # pylint: disable=protected-access
+            data, b',', max_record_size=64, at_eof=at_eof), expected)
+
+
+if __name__ == '__main__':
+  test_case.main()
@@ -21,6 +21,7 @@ import os
 
 import apache_beam as beam
 import tensorflow_transform as tft
+from tensorflow_transform import output_wrapper
 from tensorflow_transform.beam.tft_beam_io import beam_metadata_io
 from tensorflow_transform.tf_metadata import metadata_io
 
@@ -29,20 +30,121 @@ from tensorflow_transform.tf_metadata import metadata_io
 TRANSFORMED_METADATA_DIR = tft.TFTransformOutput.TRANSFORMED_METADATA_DIR
 TRANSFORM_FN_DIR = tft.TFTransformOutput.TRANSFORM_FN_DIR
 
+_MARKER_FILE_NAMES = (output_wrapper.TRANSFORM_FN_WRITE_STARTED_FILE,
+                      output_wrapper.TRANSFORM_FN_WRITE_COMMITTED_FILE)
 
-def _copy_tree(source, destination):
-  """Recursively copies source to destination."""
-  # TODO(b/35363519): Perhaps use Beam IO eventually (which also already
-  # supports recursive copy)?
+
+def _list_files_to_copy(source, destination):
+  """Starts the write of destination and lists the files to copy into it.
+
+  Marks destination as being written, see
+  `output_wrapper.check_transform_fn_committed`, removes the files of an
+  earlier write to destination, and creates the directories of source under
+  destination.
+
+  Args:
+    source: The directory to copy.
+    destination: The directory to copy to.
+
+  Returns:
+    A list of pairs of the source and destination path of each file to copy.
+  """
   import tensorflow as tf  # pylint: disable=g-import-not-at-top
 
-  if tf.io.gfile.isdir(source):
-    tf.io.gfile.makedirs(destination)
-    for filename in tf.io.gfile.listdir(source):
-      _copy_tree(
-          os.path.join(source, filename), os.path.join(destination, filename))
-  else:
-    tf.io.gfile.copy(source, destination)
+  tf.io.gfile.makedirs(destination)
+  committed_marker = os.path.join(
+      destination, output_wrapper.TRANSFORM_FN_WRITE_COMMITTED_FILE)
+  # The commit marker of an earlier write is removed before any file is
+  # overwritten.
+  if tf.io.gfile.exists(committed_marker):
+    tf.io.gfile.remove(committed_marker)
+  with tf.io.gfile.GFile(
+      os.path.join(destination,
+                   output_wrapper.TRANSFORM_FN_WRITE_STARTED_FILE), 'w') as f:
+    f.write('')
+  # Files of an earlier transform_fn, e.g. vocabularies which the new one
+  # doesn't have, must not be left beside the new files.
+  for filename in tf.io.gfile.listdir(destination):
+    filename = filename.rstrip('/')
+    if filename == output_wrapper.TRANSFORM_FN_WRITE_STARTED_FILE:
+      continue
+    path = os.path.join(destination, filename)
+    if tf.io.gfile.isdir(path):
+      tf.io.gfile.rmtree(path)
+    else:
+      tf.io.gfile.remove(path)
+
+  result = []
+  pending = [(source, destination)]
+  while pending:
+    source_dir, destination_dir = pending.pop()
+    tf.io.gfile.makedirs(destination_dir)
+    for filename in tf.io.gfile.listdir(source_dir):
+      # Directories returned by listdir may have a trailing slash on some
+      # filesystems, e.g. GCS.
+      filename = filename.rstrip('/')
+      # The markers of a transform_fn which is copied again are not copied,
+      # they are written for destination.
+      if source_dir == source and filename in _MARKER_FILE_NAMES:
+        continue
+      source_path = os.path.join(source_dir, filename)
+      destination_path = os.path.join(destination_dir, filename)
+      if tf.io.gfile.isdir(source_path):
+        pending.append((source_path, destination_path))
+      else:
+        result.append((source_path, destination_path))
+  return result
+
+
+def _copy_file(source_and_destination):
+  """Copies a file, which is done server side when the filesystem allows."""
+  import tensorflow as tf  # pylint: disable=g-import-not-at-top
+
+  source, destination = source_and_destination
+  # Overwrite to allow retries of partially completed copies.
+  tf.io.gfile.copy(source, destination, overwrite=True)
+
+
+def _commit_tree(destination, unused_num_files_copied):
+  """Writes the commit marker of destination once all files are copied."""
+  import tensorflow as tf  # pylint: disable=g-import-not-at-top
+
+  with tf.io.gfile.GFile(
+      os.path.join(destination,
+                   output_wrapper.TRANSFORM_FN_WRITE_COMMITTED_FILE), 'w') as f:
+    f.write('')
+
+
+class _CopyTree(beam.PTransform):
+  """Copies the directory in a PCollection to destination.
+
+  Files are copied in parallel, one element per file, directly to their paths
+  under destination.  A marker file is written into destination before the
+  copies start, and a commit marker once all files are copied.  Readers check
+  these with `output_wrapper.check_transform_fn_committed`, so that they don't
+  use a partial copy.  Directories are not renamed, since this is not atomic
+  on filesystems such as GCS, where it copies every file again.
+  """
+
+  def __init__(self, destination):
+    super(_CopyTree, self).__init__()
+    self._destination = destination
+
+  def expand(self, source):
+    num_files_copied = (
+        source
+        | 'ListFiles' >> beam.FlatMap(_list_files_to_copy, self._destination)
+        # Distributes the copies across workers.
+        | 'Reshuffle' >> beam.Reshuffle()
+        | 'CopyFiles' >> beam.Map(_copy_file)
+        | 'CountFilesCopied' >> beam.combiners.Count.Globally())
+    return (
+        source.pipeline
+        | 'CreateDestination' >> beam.Create([self._destination])
+        | 'Commit' >> beam.Map(
+            _commit_tree,
+            unused_num_files_copied=beam.pvalue.AsSingleton(
+                num_files_copied)))
 
 
 class WriteTransformFn(beam.PTransform):
@@ -80,7 +182,7 @@ class WriteTransformFn(beam.PTransform):
                                      tft.TFTransformOutput.TRANSFORM_FN_DIR)
     write_transform_fn_done = (
         saved_model_dir
-        | 'WriteTransformFn' >> beam.Map(_copy_tree, transform_fn_path))
+        | 'WriteTransformFn' >> _CopyTree(transform_fn_path))
 
     # TODO(KesterTong): Move this "must follows" logic into a TFT wide helper
     # function or into Beam.
@@ -101,6 +203,7 @@ class ReadTransformFn(beam.PTransform):
   def expand(self, pvalue):
     transform_fn_path = os.path.join(self._path,
                                      tft.TFTransformOutput.TRANSFORM_FN_DIR)
+    output_wrapper.check_transform_fn_committed(transform_fn_path)
     saved_model_dir_pcoll = (
         pvalue.pipeline
         | 'CreateTransformFnPath' >> beam.Create([transform_fn_path]))
@@ -25,6 +25,7 @@ import apache_beam as beam
 from apache_beam.testing import util as beam_test_util
 
 import tensorflow_transform as tft
+from tensorflow_transform import output_wrapper
 from tensorflow_transform.beam.tft_beam_io import beam_metadata_io
 from tensorflow_transform.beam.tft_beam_io import transform_fn_io
 from tensorflow_transform.beam.tft_beam_io import test_metadata
@@ -84,5 +85,86 @@ class BeamMetadataIoTest(test_util.TensorFlowTestCase):
     self.assertTrue(file_io.file_exists(transform_fn_dir))
     self.assertTrue(file_io.is_directory(transform_fn_dir))
 
+  def testWriteTransformFnCopiesAllFiles(self):
+    transform_output_dir = os.path.join(self.get_temp_dir(), 'output')
+    saved_model_dir = os.path.join(self.get_temp_dir(), 'source')
+    source_files = {
+        'saved_model.pb': 'graph',
+        os.path.join('assets', 'vocab_a'): 'a\nb',
+        os.path.join('assets', 'vocab_b'): 'c',
+        os.path.join('variables', 'nested', 'file'): 'nested',
+    }
+    for filename, contents in source_files.items():
+      path = os.path.join(saved_model_dir, filename)
+      file_io.recursive_create_dir(os.path.dirname(path))
+      file_io.write_string_to_file(path, contents)
+    file_io.recursive_create_dir(os.path.join(saved_model_dir, 'empty'))
+    # The markers of a source transform_fn are not copied.
+    file_io.write_string_to_file(
+        os.path.join(saved_model_dir,
+                     output_wrapper.TRANSFORM_FN_WRITE_COMMITTED_FILE), '')
+
+    # The files of a transform_fn which is overwritten are removed.
+    transform_fn_dir = os.path.join(transform_output_dir,
+                                    tft.TFTransformOutput.TRANSFORM_FN_DIR)
+    for filename in ['saved_model.pb', os.path.join('assets', 'old_vocab')]:
+      path = os.path.join(transform_fn_dir, filename)
+      file_io.recursive_create_dir(os.path.dirname(path))
+      file_io.write_string_to_file(path, 'old')
+
+    with beam.Pipeline() as pipeline:
+      saved_model_dir_pcoll = (
+          pipeline | 'CreateSavedModelDir' >> beam.Create([saved_model_dir]))
+      _ = ((saved_model_dir_pcoll, test_metadata.COMPLETE_METADATA)
+           | transform_fn_io.WriteTransformFn(transform_output_dir))
+
+    for filename, contents in source_files.items():
+      self.assertEqual(
+          file_io.read_file_to_string(os.path.join(transform_fn_dir, filename)),
+          contents)
+    self.assertTrue(
+        file_io.is_directory(os.path.join(transform_fn_dir, 'empty')))
+    self.assertCountEqual(
+        file_io.list_directory(transform_output_dir), [
+            tft.TFTransformOutput.TRANSFORM_FN_DIR,
+            tft.TFTransformOutput.TRANSFORMED_METADATA_DIR
+        ])
+    self.assertCountEqual(
+        [
+            filename.rstrip('/')
+            for filename in file_io.list_directory(transform_fn_dir)
+        ], [
+            'saved_model.pb', 'assets', 'variables', 'empty',
+            output_wrapper.TRANSFORM_FN_WRITE_STARTED_FILE,
+            output_wrapper.TRANSFORM_FN_WRITE_COMMITTED_FILE
+        ])
+    self.assertCountEqual(
+        file_io.list_directory(os.path.join(transform_fn_dir, 'assets')),
+        ['vocab_a', 'vocab_b'])
+    output_wrapper.check_transform_fn_committed(transform_fn_dir)
+
+  def testReadIncompleteTransformFn(self):
+    path = self.get_temp_dir()
+    transform_fn_dir = os.path.join(
+        path, tft.TFTransformOutput.TRANSFORM_FN_DIR)
+    file_io.recursive_create_dir(transform_fn_dir)
+    file_io.write_string_to_file(
+        os.path.join(transform_fn_dir,
+                     output_wrapper.TRANSFORM_FN_WRITE_STARTED_FILE), '')
+    metadata_io.write_metadata(
+        test_metadata.COMPLETE_METADATA,
+        os.path.join(path, tft.TFTransformOutput.TRANSFORMED_METADATA_DIR))
+
+    with self.assertRaisesRegexp(ValueError, 'is incomplete'):
+      _ = beam.Pipeline() | transform_fn_io.ReadTransformFn(path)
+    with self.assertRaisesRegexp(ValueError, 'is incomplete'):
+      _ = tft.TFTransformOutput(path).transform_savedmodel_dir
+
+    file_io.write_string_to_file(
+        os.path.join(transform_fn_dir,
+                     output_wrapper.TRANSFORM_FN_WRITE_COMMITTED_FILE), '')
+    self.assertEqual(tft.TFTransformOutput(path).transform_savedmodel_dir,
+                     transform_fn_dir)
+
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,110 @@
+# Copyright 2019 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks of the combiners of tensorflow_transform.analyzers.
+
+Run with `--benchmarks=.`, see `benchmark_utils` for how to write and compare
+JSON reports.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+# GOOGLE-INITIALIZATION
+
+import numpy as np
+from tensorflow_transform import analyzers
+from tensorflow_transform import benchmark_utils
+from tensorflow_transform import test_case
+
+_NUM_BATCHES = 100
+_BATCH_SIZE = 1000
+_NUM_FEATURES = 10
+# The number of batches that are added to each accumulator before the
+# accumulators are merged, as if they were combined by several workers.
+_BATCHES_PER_ACCUMULATOR = 10
+
+
+def _make_batches():
+  random_state = np.random.RandomState(0)
+  return [
+      random_state.normal(size=(_BATCH_SIZE, _NUM_FEATURES)).astype(np.float32)
+      for _ in range(_NUM_BATCHES)
+  ]
+
+
+def _combine(combiner, batches_values):
+  """Combines the values of batches like a Beam CombineFn would."""
+  accumulators = []
+  for start in range(0, len(batches_values), _BATCHES_PER_ACCUMULATOR):
+    accumulator = combiner.create_accumulator()
+    for batch_values in batches_values[start:start +
+                                       _BATCHES_PER_ACCUMULATOR]:
+      accumulator = combiner.add_input(accumulator, batch_values)
+    accumulators.append(accumulator)
+  return combiner.extract_output(combiner.merge_accumulators(accumulators))
+
+
+class CombinersBenchmark(benchmark_utils.Benchmark):
+  """Benchmarks the combiners of the main analyzers.
+
+  The inputs of each combiner are what the analysis graph outputs for batches
+  of dense synthetic data, e.g. the per batch sums for `tft.sum`.
+  """
+
+  def _benchmark_combiner(self, name, combiner, batches_values):
+    self.run_and_report_benchmark(
+        'combiner.{}'.format(name),
+        lambda: _combine(combiner, batches_values),
+        _NUM_BATCHES * _BATCH_SIZE)
+
+  def benchmarkNumPyCombiner(self):
+    combiner = analyzers.NumPyCombiner(np.sum, [np.float32], [_NUM_FEATURES])
+    batches_values = [[np.sum(batch, axis=0)] for batch in _make_batches()]
+    self._benchmark_combiner('NumPyCombiner', combiner, batches_values)
+
+  def benchmarkInPlaceNumPyCombiner(self):
+    combiner = analyzers._InPlaceNumPyCombiner(  # pylint: disable=protected-access
+        np.add, [np.float32], [(_NUM_FEATURES,)])
+    batches_values = [[np.sum(batch, axis=0)] for batch in _make_batches()]
+    self._benchmark_combiner('InPlaceNumPyCombiner', combiner, batches_values)
+
+  def benchmarkWeightedMeanAndVarCombiner(self):
+    combiner = analyzers.WeightedMeanAndVarCombiner(
+        np.float32, output_shape=(_NUM_FEATURES,))
+    batches_values = [
+        analyzers._WeightedMeanAndVarAccumulator(  # pylint: disable=protected-access
+            count=np.full(_NUM_FEATURES, _BATCH_SIZE),
+            mean=np.mean(batch, axis=0),
+            variance=np.var(batch, axis=0),
+            weight=np.zeros(_NUM_FEATURES)) for batch in _make_batches()
+    ]
+    self._benchmark_combiner('WeightedMeanAndVarCombiner', combiner,
+                             batches_values)
+
+  def benchmarkQuantilesCombiner(self):
+    combiner = analyzers.QuantilesCombiner(
+        num_quantiles=10, epsilon=0.01, bucket_numpy_dtype=np.float32)
+    combiner.initialize_local_state()
+    batches_values = [[batch] for batch in _make_batches()]
+    self._benchmark_combiner('QuantilesCombiner', combiner, batches_values)
+
+  def benchmarkCovarianceCombiner(self):
+    combiner = analyzers.CovarianceCombiner(numpy_dtype=np.float64)
+    batches_values = [[batch] for batch in _make_batches()]
+    self._benchmark_combiner('CovarianceCombiner', combiner, batches_values)
+
+
+if __name__ == '__main__':
+  test_case.main()
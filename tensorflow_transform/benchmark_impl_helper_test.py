@@ -0,0 +1,64 @@
+# Copyright 2019 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks of the batching and unbatching of instances in impl_helper.
+
+Run with `--benchmarks=.`, see `benchmark_utils` for how to write and compare
+JSON reports.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+# GOOGLE-INITIALIZATION
+
+from tensorflow_transform import benchmark_utils
+from tensorflow_transform import impl_helper
+from tensorflow_transform import test_case
+from tensorflow_transform.tf_metadata import dataset_schema
+
+_NUM_INSTANCES = 10000
+
+
+class ImplHelperBenchmark(benchmark_utils.Benchmark):
+  """Benchmarks `make_feed_list` and `to_instance_dicts`."""
+
+  def _benchmark_impl_helper(self, feature_spec_name):
+    feature_spec = benchmark_utils.FEATURE_SPECS[feature_spec_name]
+    schema = dataset_schema.from_feature_spec(feature_spec)
+    column_names = sorted(feature_spec.keys())
+    instances = benchmark_utils.make_synthetic_instances(
+        feature_spec, _NUM_INSTANCES)
+    fetches = benchmark_utils.make_synthetic_fetches(schema, instances)
+
+    self.run_and_report_benchmark(
+        'make_feed_list.{}'.format(feature_spec_name),
+        lambda: impl_helper.make_feed_list(column_names, schema, instances),
+        _NUM_INSTANCES)
+    self.run_and_report_benchmark(
+        'to_instance_dicts.{}'.format(feature_spec_name),
+        lambda: impl_helper.to_instance_dicts(schema, fetches), _NUM_INSTANCES)
+
+  def benchmarkDense(self):
+    self._benchmark_impl_helper('dense')
+
+  def benchmarkVarLen(self):
+    self._benchmark_impl_helper('varlen')
+
+  def benchmarkSparse(self):
+    self._benchmark_impl_helper('sparse')
+
+
+if __name__ == '__main__':
+  test_case.main()
@@ -0,0 +1,351 @@
+# Copyright 2019 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Utilities for the tf.Transform benchmarks.
+
+The benchmarks are `tf.test.Benchmark`s that run offline on synthetic data,
+e.g.
+
+  python tensorflow_transform/coders/benchmark_coders_test.py --benchmarks=.
+
+Each benchmark records its throughput in rows per second and the peak memory
+allocated by Python while it ran.  If the environment variable
+`TFT_BENCHMARK_REPORT_FILE` is set, the results are also written to that JSON
+file, and the reports of two runs can be compared with `find_regressions`, or
+from the command line:
+
+  python -m tensorflow_transform.benchmark_utils baseline.json report.json
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import json
+import os
+import sys
+import time
+
+# GOOGLE-INITIALIZATION
+
+import numpy as np
+import six
+import tensorflow as tf
+from tensorflow_transform import impl_helper
+from tensorflow_transform.coders import csv_coder
+from tensorflow_transform.tf_metadata import dataset_schema
+
+try:
+  import tracemalloc  # pylint: disable=g-import-not-at-top
+except ImportError:
+  # tracemalloc is not available in python 2, in which case peak memory is not
+  # recorded.
+  tracemalloc = None
+
+REPORT_FILE_ENV_VAR = 'TFT_BENCHMARK_REPORT_FILE'
+
+# Feature specs of the synthetic schemas that the benchmarks run on.
+DENSE_FEATURE_SPEC = {
+    'int_feature': tf.io.FixedLenFeature([], tf.int64),
+    'float_feature': tf.io.FixedLenFeature([], tf.float32),
+    'string_feature': tf.io.FixedLenFeature([], tf.string),
+    'vector_feature': tf.io.FixedLenFeature([4], tf.float32),
+}
+VARLEN_FEATURE_SPEC = {
+    'varlen_int_feature': tf.io.VarLenFeature(tf.int64),
+    'varlen_float_feature': tf.io.VarLenFeature(tf.float32),
+    'varlen_string_feature': tf.io.VarLenFeature(tf.string),
+}
+SPARSE_FEATURE_SPEC = {
+    'sparse_float_feature':
+        tf.io.SparseFeature('float_idx', 'float_value', tf.float32, 100),
+    'sparse_string_feature':
+        tf.io.SparseFeature('string_idx', 'string_value', tf.string, 100),
+}
+FEATURE_SPECS = collections.OrderedDict([
+    ('dense', DENSE_FEATURE_SPEC),
+    ('varlen', VARLEN_FEATURE_SPEC),
+    ('sparse', SPARSE_FEATURE_SPEC),
+])
+
+# The maximum number of values of a synthetic VarLenFeature or SparseFeature.
+_MAX_NUM_VALUES = 10
+
+
+def _make_values(dtype, num_values, random_state):
+  if dtype == tf.string:
+    return [
+        b'value_%d' % value
+        for value in random_state.randint(1000, size=num_values)
+    ]
+  elif dtype.is_integer:
+    return random_state.randint(1000, size=num_values).tolist()
+  else:
+    return random_state.uniform(size=num_values).astype(
+        dtype.as_numpy_dtype).tolist()
+
+
+def make_synthetic_instances(feature_spec, num_instances, seed=0):
+  """Returns a list of random instance dicts matching a feature spec.
+
+  Args:
+    feature_spec: A feature spec of `FixedLenFeature`s, `VarLenFeature`s and
+      one dimensional `SparseFeature`s.
+    num_instances: The number of instances to generate.
+    seed: The seed of the random number generator.
+
+  Returns:
+    A list of `num_instances` instance dicts in the in-memory representation.
+
+  Raises:
+    ValueError: If `feature_spec` contains an unsupported feature.
+  """
+  random_state = np.random.RandomState(seed)
+  instances = [{} for _ in range(num_instances)]
+  for name, spec in sorted(six.iteritems(feature_spec)):
+    for instance in instances:
+      if isinstance(spec, tf.io.FixedLenFeature):
+        size = int(np.prod(spec.shape))
+        values = _make_values(spec.dtype, size, random_state)
+        if spec.shape:
+          instance[name] = np.reshape(
+              np.array(values, dtype=spec.dtype.as_numpy_dtype), spec.shape)
+        else:
+          instance[name] = values[0]
+      elif isinstance(spec, tf.io.VarLenFeature):
+        num_values = random_state.randint(_MAX_NUM_VALUES + 1)
+        instance[name] = _make_values(spec.dtype, num_values, random_state)
+      elif isinstance(spec, tf.io.SparseFeature):
+        num_values = random_state.randint(min(_MAX_NUM_VALUES, spec.size) + 1)
+        instance[spec.index_key] = sorted(
+            random_state.choice(spec.size, num_values, replace=False).tolist())
+        instance[spec.value_key] = _make_values(spec.dtype, num_values,
+                                                random_state)
+      else:
+        raise ValueError('Invalid feature spec {}.'.format(spec))
+  return instances
+
+
+def make_synthetic_fetches(schema, instances):
+  """Returns the batch of `instances` in the format returned by `Session.run`.
+
+  Args:
+    schema: A `Schema` object.
+    instances: A list of instance dicts, e.g. from `make_synthetic_instances`.
+
+  Returns:
+    A dict from feature name to an ndarray or a `SparseTensorValue` of
+    ndarrays, which can be passed to `impl_helper.to_instance_dicts`.
+  """
+  feature_spec = schema.as_feature_spec()
+  column_names = sorted(feature_spec.keys())
+  feed_list = impl_helper.make_feed_list(column_names, schema, instances)
+  fetches = {}
+  for name, feed_value in zip(column_names, feed_list):
+    np_dtype = feature_spec[name].dtype.as_numpy_dtype
+    if isinstance(feed_value, tf.compat.v1.SparseTensorValue):
+      fetches[name] = tf.compat.v1.SparseTensorValue(
+          np.reshape(np.asarray(feed_value.indices, dtype=np.int64), [-1, 2]),
+          np.asarray(feed_value.values, dtype=np_dtype),
+          np.asarray(feed_value.dense_shape, dtype=np.int64))
+    else:
+      fetches[name] = np.asarray(feed_value, dtype=np_dtype)
+  return fetches
+
+
+def make_csv_coder(feature_spec):
+  """Returns a `CsvCoder` for instances matching a feature spec.
+
+  The CSV lines have a column for each feature, or for the index and value of
+  each `SparseFeature`, in sorted order.  Values of features that are not
+  scalars are separated by '|'.
+
+  Args:
+    feature_spec: A feature spec, e.g. one of `FEATURE_SPECS`.
+
+  Returns:
+    A `CsvCoder`.
+  """
+  column_names = []
+  multivalent_columns = []
+  for name, spec in sorted(six.iteritems(feature_spec)):
+    if isinstance(spec, tf.io.SparseFeature):
+      column_names.extend([spec.index_key, spec.value_key])
+    else:
+      column_names.append(name)
+    if not isinstance(spec, tf.io.FixedLenFeature) or spec.shape:
+      multivalent_columns.append(name)
+  return csv_coder.CsvCoder(
+      column_names,
+      dataset_schema.from_feature_spec(feature_spec),
+      secondary_delimiter='|',
+      multivalent_columns=multivalent_columns)
+
+
+class BenchmarkResult(
+    collections.namedtuple('BenchmarkResult', [
+        'name', 'num_rows', 'wall_time_secs', 'rows_per_sec',
+        'peak_memory_bytes'
+    ])):
+  """The result of a benchmark.
+
+  Fields:
+    name: The name of the benchmark.
+    num_rows: The number of rows processed by each iteration of the benchmark.
+    wall_time_secs: The wall time of the fastest iteration in seconds.
+    rows_per_sec: The throughput of the fastest iteration.
+    peak_memory_bytes: The peak memory allocated by Python while an iteration
+      ran, or None if it is not known.
+  """
+
+
+def run_benchmark(name, fn, num_rows, iters=3):
+  """Runs a benchmark and returns its `BenchmarkResult`.
+
+  Args:
+    name: The name of the benchmark.
+    fn: A function of no arguments which processes `num_rows` rows.
+    num_rows: The number of rows processed by each call of `fn`.
+    iters: The number of times to call `fn`.  The fastest call is reported, to
+      reduce noise.
+
+  Returns:
+    A `BenchmarkResult`.
+  """
+  wall_times = []
+  for _ in range(iters):
+    start = time.time()
+    fn()
+    wall_times.append(time.time() - start)
+  wall_time_secs = min(wall_times)
+
+  # Tracing allocations slows down the benchmark, so peak memory is measured in
+  # a separate iteration.
+  peak_memory_bytes = None
+  if tracemalloc is not None and not tracemalloc.is_tracing():
+    tracemalloc.start()
+    try:
+      fn()
+      _, peak_memory_bytes = tracemalloc.get_traced_memory()
+    finally:
+      tracemalloc.stop()
+
+  rows_per_sec = num_rows / wall_time_secs if wall_time_secs else float('inf')
+  return BenchmarkResult(name, num_rows, wall_time_secs, rows_per_sec,
+                         peak_memory_bytes)
+
+
+def load_json_report(path):
+  """Returns the `BenchmarkResult`s in a JSON report, keyed by name."""
+  with tf.io.gfile.GFile(path, 'r') as f:
+    report = json.loads(f.read())
+  return {
+      name: BenchmarkResult(name=name, **fields)
+      for name, fields in six.iteritems(report)
+  }
+
+
+def update_json_report(path, results):
+  """Adds `BenchmarkResult`s to a JSON report, replacing older results.
+
+  Args:
+    path: The path of the JSON report, which is created if it does not exist.
+    results: A list of `BenchmarkResult`s.
+  """
+  report = load_json_report(path) if tf.io.gfile.exists(path) else {}
+  for result in results:
+    report[result.name] = result
+  serialized = {}
+  for name, result in six.iteritems(report):
+    fields = result._asdict()
+    del fields['name']
+    serialized[name] = fields
+  with tf.io.gfile.GFile(path, 'w') as f:
+    f.write(json.dumps(serialized, indent=2, sort_keys=True))
+
+
+def find_regressions(baseline, results, max_slowdown=0.1,
+                     max_memory_increase=0.1):
+  """Compares the results of benchmarks with a baseline.
+
+  Args:
+    baseline: A dict from name to `BenchmarkResult`, e.g. from
+      `load_json_report`.
+    results: A dict from name to `BenchmarkResult`.  Benchmarks that are not
+      in `baseline` are ignored.
+    max_slowdown: The largest allowed relative decrease of rows per second.
+    max_memory_increase: The largest allowed relative increase of peak memory.
+
+  Returns:
+    A sorted list of strings describing the regressions.
+  """
+  regressions = []
+  for name, result in sorted(six.iteritems(results)):
+    expected = baseline.get(name)
+    if expected is None:
+      continue
+    if result.rows_per_sec < expected.rows_per_sec * (1 - max_slowdown):
+      regressions.append('{}: {:.1f} rows/sec, baseline {:.1f} rows/sec'.format(
+          name, result.rows_per_sec, expected.rows_per_sec))
+    if (result.peak_memory_bytes is not None and
+        expected.peak_memory_bytes is not None and
+        result.peak_memory_bytes >
+        expected.peak_memory_bytes * (1 + max_memory_increase)):
+      regressions.append(
+          '{}: peak memory {} bytes, baseline {} bytes'.format(
+              name, result.peak_memory_bytes, expected.peak_memory_bytes))
+  return regressions
+
+
+class Benchmark(tf.test.Benchmark):
+  """A `tf.test.Benchmark` which also writes its results to a JSON report."""
+
+  def run_and_report_benchmark(self, name, fn, num_rows, iters=3):
+    """Runs a benchmark with `run_benchmark` and reports its result.
+
+    Args:
+      name: The name of the benchmark.
+      fn: A function of no arguments which processes `num_rows` rows.
+      num_rows: The number of rows processed by each call of `fn`.
+      iters: The number of times to call `fn`.
+
+    Returns:
+      The `BenchmarkResult`.
+    """
+    result = run_benchmark(name, fn, num_rows, iters)
+    extras = {'num_rows': num_rows, 'rows_per_sec': result.rows_per_sec}
+    if result.peak_memory_bytes is not None:
+      extras['peak_memory_bytes'] = result.peak_memory_bytes
+    self.report_benchmark(
+        name=name, iters=iters, wall_time=result.wall_time_secs, extras=extras)
+    report_file = os.environ.get(REPORT_FILE_ENV_VAR)
+    if report_file:
+      update_json_report(report_file, [result])
+    return result
+
+
+def main(argv):
+  """Compares two JSON reports, returning 1 if there are regressions."""
+  if len(argv) != 3:
+    print('Usage: {} BASELINE_REPORT REPORT'.format(argv[0]))
+    return 2
+  regressions = find_regressions(
+      load_json_report(argv[1]), load_json_report(argv[2]))
+  for regression in regressions:
+    print(regression)
+  return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv))
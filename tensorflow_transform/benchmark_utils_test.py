@@ -0,0 +1,101 @@
+# Copyright 2019 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for tensorflow_transform.benchmark_utils."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+# GOOGLE-INITIALIZATION
+
+import numpy as np
+from tensorflow_transform import benchmark_utils
+from tensorflow_transform import impl_helper
+from tensorflow_transform import test_case
+from tensorflow_transform.tf_metadata import dataset_schema
+
+
+class BenchmarkUtilsTest(test_case.TransformTestCase):
+
+  @test_case.named_parameters(
+      dict(testcase_name='dense', feature_spec_name='dense'),
+      dict(testcase_name='varlen', feature_spec_name='varlen'),
+      dict(testcase_name='sparse', feature_spec_name='sparse'),
+  )
+  def testSyntheticInstancesAndFetches(self, feature_spec_name):
+    feature_spec = benchmark_utils.FEATURE_SPECS[feature_spec_name]
+    schema = dataset_schema.from_feature_spec(feature_spec)
+    instances = benchmark_utils.make_synthetic_instances(feature_spec, 10)
+    self.assertEqual(len(instances), 10)
+    np.testing.assert_equal(
+        benchmark_utils.make_synthetic_instances(feature_spec, 10), instances)
+
+    fetches = benchmark_utils.make_synthetic_fetches(schema, instances)
+    self.assertCountEqual(fetches.keys(), feature_spec.keys())
+    for expected, actual in zip(
+        instances, impl_helper.to_instance_dicts(schema, fetches)):
+      self.assertCountEqual(expected.keys(), actual.keys())
+      for key in expected:
+        np.testing.assert_equal(np.asarray(actual[key]),
+                                np.asarray(expected[key]))
+
+    coder = benchmark_utils.make_csv_coder(feature_spec)
+    for instance in instances:
+      coder.decode(coder.encode(instance))
+
+  def testRunBenchmark(self):
+    calls = []
+    result = benchmark_utils.run_benchmark(
+        'my_benchmark', lambda: calls.append(1), num_rows=10, iters=2)
+    self.assertEqual(result.name, 'my_benchmark')
+    self.assertEqual(result.num_rows, 10)
+    self.assertGreaterEqual(result.wall_time_secs, 0)
+    self.assertGreater(result.rows_per_sec, 0)
+    # One more call measures the peak memory, when it is available.
+    self.assertEqual(len(calls), 2 if result.peak_memory_bytes is None else 3)
+
+  def testJsonReport(self):
+    path = os.path.join(self.get_temp_dir(), 'report.json')
+    a = benchmark_utils.BenchmarkResult('a', 10, 1.0, 10.0, 100)
+    b = benchmark_utils.BenchmarkResult('b', 10, 2.0, 5.0, None)
+    benchmark_utils.update_json_report(path, [a, b])
+    new_b = b._replace(wall_time_secs=1.0, rows_per_sec=10.0)
+    benchmark_utils.update_json_report(path, [new_b])
+    self.assertEqual(
+        benchmark_utils.load_json_report(path), {'a': a, 'b': new_b})
+
+  def testFindRegressions(self):
+    baseline = {
+        'a': benchmark_utils.BenchmarkResult('a', 10, 1.0, 100.0, 1000),
+        'b': benchmark_utils.BenchmarkResult('b', 10, 1.0, 100.0, None),
+    }
+    results = {
+        'a': benchmark_utils.BenchmarkResult('a', 10, 1.0, 95.0, 1200),
+        'b': benchmark_utils.BenchmarkResult('b', 10, 1.0, 80.0, 1000),
+        'c': benchmark_utils.BenchmarkResult('c', 10, 1.0, 1.0, 1000),
+    }
+    self.assertEqual(
+        benchmark_utils.find_regressions(baseline, results), [
+            'a: peak memory 1200 bytes, baseline 1000 bytes',
+            'b: 80.0 rows/sec, baseline 100.0 rows/sec',
+        ])
+    self.assertEqual(
+        benchmark_utils.find_regressions(
+            baseline, results, max_slowdown=0.5, max_memory_increase=0.5), [])
+
+
+if __name__ == '__main__':
+  test_case.main()
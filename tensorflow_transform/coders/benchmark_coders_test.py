@@ -0,0 +1,108 @@
+# Copyright 2019 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Benchmarks of the tf.Transform coders.
+
+Run with `--benchmarks=.`, see `benchmark_utils` for how to write and compare
+JSON reports.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import functools
+
+# GOOGLE-INITIALIZATION
+
+from tensorflow_transform import benchmark_utils
+from tensorflow_transform import test_case
+from tensorflow_transform.coders import example_proto_coder
+from tensorflow_transform.tf_metadata import dataset_schema
+
+_NUM_INSTANCES = 10000
+
+
+class CodersBenchmark(benchmark_utils.Benchmark):
+  """Benchmarks encoding and decoding with `CsvCoder` and `ExampleProtoCoder`.
+
+  Each benchmark processes synthetic instances of a schema of dense, varlen or
+  sparse features.
+  """
+
+  def _benchmark_coder(self, coder_name, coder, feature_spec_name):
+    instances = benchmark_utils.make_synthetic_instances(
+        benchmark_utils.FEATURE_SPECS[feature_spec_name], _NUM_INSTANCES)
+    records = [coder.encode(instance) for instance in instances]
+
+    def encode():
+      for instance in instances:
+        coder.encode(instance)
+
+    def decode():
+      for record in records:
+        coder.decode(record)
+
+    def decode_batch():
+      coder.decode_batch(records)
+
+    for method_name, fn in [('encode', encode), ('decode', decode),
+                            ('decode_batch', decode_batch)]:
+      self.run_and_report_benchmark(
+          '{}.{}.{}'.format(coder_name, method_name, feature_spec_name), fn,
+          _NUM_INSTANCES)
+
+  def _benchmark_csv_coder(self, feature_spec_name):
+    coder = benchmark_utils.make_csv_coder(
+        benchmark_utils.FEATURE_SPECS[feature_spec_name])
+    self._benchmark_coder('CsvCoder', coder, feature_spec_name)
+
+  def _benchmark_example_proto_coder(self, feature_spec_name):
+    schema = dataset_schema.from_feature_spec(
+        benchmark_utils.FEATURE_SPECS[feature_spec_name])
+    coder = example_proto_coder.ExampleProtoCoder(schema)
+    self._benchmark_coder('ExampleProtoCoder', coder, feature_spec_name)
+
+    batch = benchmark_utils.make_synthetic_fetches(
+        schema,
+        benchmark_utils.make_synthetic_instances(
+            benchmark_utils.FEATURE_SPECS[feature_spec_name], _NUM_INSTANCES))
+    for fast_serialization in [False, True]:
+      self.run_and_report_benchmark(
+          'ExampleProtoCoder.encode_batch{}.{}'.format(
+              '_fast' if fast_serialization else '', feature_spec_name),
+          functools.partial(
+              coder.encode_batch, batch,
+              fast_serialization=fast_serialization), _NUM_INSTANCES)
+
+  def benchmarkCsvCoderDense(self):
+    self._benchmark_csv_coder('dense')
+
+  def benchmarkCsvCoderVarLen(self):
+    self._benchmark_csv_coder('varlen')
+
+  def benchmarkCsvCoderSparse(self):
+    self._benchmark_csv_coder('sparse')
+
+  def benchmarkExampleProtoCoderDense(self):
+    self._benchmark_example_proto_coder('dense')
+
+  def benchmarkExampleProtoCoderVarLen(self):
+    self._benchmark_example_proto_coder('varlen')
+
+  def benchmarkExampleProtoCoderSparse(self):
+    self._benchmark_example_proto_coder('sparse')
+
+
+if __name__ == '__main__':
+  test_case.main()
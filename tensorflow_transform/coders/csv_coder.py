@@ -17,12 +17,18 @@ from __future__ import division
 from __future__ import print_function
 
 import csv
+import itertools
 # GOOGLE-INITIALIZATION
 
 import numpy as np
 import six
 from six import moves
 import tensorflow as tf
+from tensorflow_transform import impl_helper
+
+# The line terminator of encoded rows, which is removed from them.  Values
+# containing its characters are quoted.
+_LINE_TERMINATOR = '\r\n'
 
 
 # This is in agreement with Tensorflow conversions for Unicode values for both
@@ -79,6 +85,27 @@ def _make_cast_fn(dtype):
     return _elements_to_bytes
 
 
+def _make_column_cast_fn(dtype):
+  """Return a function to cast a list of strings to a 1-d ndarray.
+
+  The cast is vectorized for numeric dtypes, and raises a ValueError or an
+  OverflowError if any of the strings can't be cast.
+
+  Args:
+    dtype: The type of the Tensorflow feature.
+
+  Returns:
+    A function from a list of strings to a 1-d ndarray of the corresponding
+    numpy dtype.
+  """
+  np_dtype = dtype.as_numpy_dtype
+  if dtype.is_integer or dtype.is_floating:
+    return lambda column: np.asarray(column, dtype=np_dtype)
+  else:
+    return lambda column: np.asarray(  # pylint: disable=g-long-lambda
+        [_to_bytes(x) for x in column], dtype=np_dtype)
+
+
 def _decode_with_reader(value, reader):
   """Parse the input value into a list of strings.
 
@@ -109,6 +136,7 @@ class _FixedLenFeatureHandler(object):
   def __init__(self, name, feature_spec, index, reader=None, encoder=None):
     self._name = name
     self._cast_fn = _make_cast_fn(feature_spec.dtype)
+    self._column_cast_fn = _make_column_cast_fn(feature_spec.dtype)
     self._default_value = feature_spec.default_value
     self._index = index
     self._reader = reader
@@ -163,6 +191,77 @@ class _FixedLenFeatureHandler(object):
     else:
       return np.asarray(values, dtype=self._np_dtype).reshape(self._shape)
 
+  def make_parse_fn(self):
+    """Returns a function like parse_value, specialized for this feature.
+
+    The rank and default value of a feature which is not multivalent are
+    resolved ahead of time.  Missing and multivalent values are parsed by
+    parse_value.
+    """
+    if self._reader:
+      return self.parse_value
+    index = self._index
+    cast_fn = self._cast_fn
+    parse_value = self.parse_value
+    if self._rank == 0:
+      default_value = self._default_value
+
+      def parse_scalar(string_list):
+        value_str = string_list[index]
+        if value_str:
+          return cast_fn(value_str)
+        elif default_value is not None:
+          return default_value
+        return parse_value(string_list)
+
+      return parse_scalar
+    elif self._rank == 1:
+      np_dtype = self._np_dtype
+
+      def parse_vector(string_list):
+        value_str = string_list[index]
+        if value_str:
+          return np.asarray([cast_fn(value_str)], dtype=np_dtype)
+        return parse_value(string_list)
+
+      return parse_vector
+    else:
+      return parse_value
+
+  def parse_batch(self, string_lists):
+    """Parse the values of this feature from a batch of split CSV lines.
+
+    Args:
+      string_lists: A list of string lists split from CSV lines.
+
+    Returns:
+      An ndarray of shape [len(string_lists)] + shape.
+    """
+    batch_shape = [len(string_lists)] + list(self._shape)
+    if not self._reader:
+      column = [string_list[self._index] for string_list in string_lists]
+      present = [bool(value_str) for value_str in column]
+      try:
+        if all(present):
+          return self._column_cast_fn(column).reshape(batch_shape)
+        result = np.empty(len(column), dtype=self._np_dtype)
+        result[present] = self._column_cast_fn(
+            [value_str for value_str in column if value_str])
+      except (ValueError, OverflowError):
+        # Fall back to parsing each value, which raises the same error as
+        # parse_value.
+        pass
+      else:
+        # Rows with missing values get the default value, or raise the same
+        # error as parse_value.
+        for row, string_list in enumerate(string_lists):
+          if not present[row]:
+            result[row] = np.reshape(self.parse_value(string_list), [])
+        return result.reshape(batch_shape)
+    return np.asarray([
+        self.parse_value(string_list) for string_list in string_lists
+    ], dtype=self._np_dtype).reshape(batch_shape)
+
   def encode_value(self, string_list, values):
     """Encode the value of this feature into the CSV line."""
 
@@ -184,6 +283,17 @@ class _FixedLenFeatureHandler(object):
     else:
       string_list[self._index] = _to_string(flattened_values[0])
 
+  def make_encode_fn(self):
+    """Returns a function like encode_value, specialized for this feature."""
+    if self._encoder or self._rank != 0:
+      return self.encode_value
+    index = self._index
+
+    def encode_scalar(string_list, values):
+      string_list[index] = _to_string(values)
+
+    return encode_scalar
+
 
 class _VarLenFeatureHandler(object):
   """Handler for `VarLenFeature` values.
@@ -196,6 +306,7 @@ class _VarLenFeatureHandler(object):
   def __init__(self, name, dtype, index, reader=None, encoder=None):
     self._name = name
     self._cast_fn = _make_cast_fn(dtype)
+    self._column_cast_fn = _make_column_cast_fn(dtype)
     self._np_dtype = dtype.as_numpy_dtype
     self._index = index
     self._reader = reader
@@ -216,6 +327,46 @@ class _VarLenFeatureHandler(object):
     else:
       return []
 
+  def parse_batch(self, string_lists):
+    """Parse the values of this feature from a batch of split CSV lines.
+
+    Args:
+      string_lists: A list of string lists split from CSV lines.
+
+    Returns:
+      An `impl_helper.VarLenBatch` of the values of all rows.
+    """
+    if self._reader:
+      row_values = [
+          self.parse_value(string_list) for string_list in string_lists
+      ]
+      return impl_helper.VarLenBatch(
+          np.asarray(
+              list(itertools.chain.from_iterable(row_values)),
+              dtype=self._np_dtype),
+          np.asarray([len(values) for values in row_values], dtype=np.int64))
+
+    column = [string_list[self._index] for string_list in string_lists]
+    present = [value_str for value_str in column if value_str]
+    try:
+      values = self._column_cast_fn(present)
+    except (ValueError, OverflowError):
+      # Raises the same error as parse_value.
+      values = np.asarray(list(map(self._cast_fn, present)),
+                          dtype=self._np_dtype)
+    return impl_helper.VarLenBatch(
+        values,
+        np.asarray([1 if value_str else 0 for value_str in column],
+                   dtype=np.int64))
+
+  def make_parse_fn(self):
+    """Returns a function like parse_value, specialized for this feature."""
+    return self.parse_value
+
+  def make_encode_fn(self):
+    """Returns a function like encode_value, specialized for this feature."""
+    return self.encode_value
+
   def encode_value(self, string_list, values):
     """Encode the value of this feature into the CSV line."""
     if self._encoder:
@@ -224,6 +375,47 @@ class _VarLenFeatureHandler(object):
       string_list[self._index] = _to_string(values[0]) if values else ''
 
 
+def _split_column_tensor(column, delimiter):
+  """Splits a column of CSV values in the TF graph.
+
+  Args:
+    column: A 1-D string `Tensor` of the values of a column.
+    delimiter: The secondary delimiter of a multivalent column, or None.
+
+  Returns:
+    A string `SparseTensor` of shape [batch_size, max_num_values] of the
+    non-empty values of each row, which are split by delimiter if it is set.
+  """
+  if delimiter:
+    return tf.compat.v1.string_split(column, delimiter=delimiter)
+  present = tf.not_equal(column, '')
+  row_ids = tf.compat.v1.where(present)[:, 0]
+  return tf.SparseTensor(
+      indices=tf.stack([row_ids, tf.zeros_like(row_ids)], axis=1),
+      values=tf.boolean_mask(column, present),
+      dense_shape=tf.stack([
+          tf.size(column, out_type=tf.int64),
+          tf.cast(tf.reduce_any(present), tf.int64)
+      ]))
+
+
+def _cast_values_tensor(values, dtype):
+  """Casts a string `Tensor` of values to dtype in the TF graph."""
+  if dtype == tf.string:
+    return values
+  return tf.strings.to_number(values, out_type=dtype)
+
+
+def _row_lengths_tensor(sparse_tensor):
+  """Returns the number of values in each row of a 2-D `SparseTensor`."""
+  batch_size = tf.cast(sparse_tensor.dense_shape[0], tf.int32)
+  return tf.math.bincount(
+      tf.cast(sparse_tensor.indices[:, 0], tf.int32),
+      minlength=batch_size,
+      maxlength=batch_size,
+      dtype=tf.int64)
+
+
 class DecodeError(Exception):
   """Base decode error."""
   pass
@@ -279,15 +471,37 @@ class CsvCoder(object):
       self._reader = csv.reader(
           self._line_generator, delimiter=_to_string(delimiter))
 
-    def read_record(self, x):
-      """Reads out bytes for PY2 and Unicode for PY3."""
+    def _to_line(self, x):
       if six.PY2:
-        line = _to_bytes(x)
+        return _to_bytes(x)
       else:
-        line = _to_string(x)
-      self._line_generator.push_line(line)
+        return _to_string(x)
+
+    def read_record(self, x):
+      """Reads out bytes for PY2 and Unicode for PY3."""
+      self._line_generator.push_line(self._to_line(x))
       return next(self._reader)
 
+    def read_records(self, xs):
+      """Reads a list of records in a single pass of a csv reader.
+
+      Args:
+        xs: A list of records.
+
+      Returns:
+        A list with a list of strings (bytes for PY2 and Unicode for PY3) for
+        each record, or None if the records were not read as exactly one row
+        each, e.g. because of an unterminated quote.
+      """
+      lines = [self._to_line(x) for x in xs]
+      try:
+        result = list(csv.reader(lines, delimiter=_to_string(self._state)))
+      except csv.Error:
+        return None
+      if len(result) != len(lines):
+        return None
+      return result
+
     def __getstate__(self):
       return self._state
 
@@ -306,10 +520,11 @@ class CsvCoder(object):
       self._state = (delimiter)
       self._buffer = moves.cStringIO()
 
-      # Since we use self._writer to encode individual rows, we set
-      # lineterminator='' so that self._writer doesn't add a newline.
+      # Since we use self._writer to encode individual rows, the line
+      # terminator it adds is removed from each row.  It is not set to '', so
+      # that values containing newlines are quoted.
       self._writer = csv.writer(
-          self._buffer, lineterminator='', delimiter=delimiter)
+          self._buffer, lineterminator=_LINE_TERMINATOR, delimiter=delimiter)
 
     def encode_record(self, record):
       """Converts the record to bytes.
@@ -325,7 +540,8 @@ class CsvCoder(object):
         Bytes representation input.
       """
       self._writer.writerow([_to_string(x) for x in record])
-      result = tf.compat.as_bytes(self._buffer.getvalue())
+      result = tf.compat.as_bytes(
+          self._buffer.getvalue()[:-len(_LINE_TERMINATOR)])
       # Reset the buffer.
       self._buffer.seek(0)
       self._buffer.truncate(0)
@@ -421,6 +637,14 @@ class CsvCoder(object):
             'tf.VarLenFeature or tf.SparseFeature: {!r} was {!r}'.format(
                 name, type(feature_spec)))
 
+    # Functions specialized for each feature, which decode and encode the
+    # values of all features without dispatching on their shape and default
+    # values.
+    self._parse_fns = [(feature_handler.name, feature_handler.make_parse_fn())
+                       for feature_handler in self._feature_handlers]
+    self._encode_fns = [(feature_handler.name, feature_handler.make_encode_fn())
+                        for feature_handler in self._feature_handlers]
+
   def __reduce__(self):
     return CsvCoder, (self._column_names, self._schema, self._delimiter,
                       self._secondary_delimiter, self._multivalent_columns)
@@ -436,13 +660,11 @@ class CsvCoder(object):
       A csv-formatted string. The order of the columns is given by column_names.
     """
     string_list = [None] * len(self._column_names)
-    for feature_handler in self._feature_handlers:
+    for name, encode_fn in self._encode_fns:
       try:
-        feature_handler.encode_value(string_list,
-                                     instance[feature_handler.name])
+        encode_fn(string_list, instance[name])
       except TypeError as e:
-        raise TypeError('{} while encoding feature "{}"'.format(
-            e, feature_handler.name))
+        raise TypeError('{} while encoding feature "{}"'.format(e, name))
     return self._encoder.encode_record(string_list)
 
   # Please run tensorflow_transform/coders/benchmark_coders_test.py
@@ -480,11 +702,150 @@ class CsvCoder(object):
           SparseFeature has missing indices but not values or vice versa or
           multivalent data has the wrong length.
     """
+    raw_values = self._check_raw_values(self._read_record(csv_string))
+    return {name: parse_fn(raw_values) for name, parse_fn in self._parse_fns}
+
+  # Please run tensorflow_transform/coders/benchmark_coders_test.py
+  # if you make any changes on these methods.
+  def decode_batch(self, csv_strings):
+    """Decodes a batch of string records into a columnar batch.
+
+    All records are split in a single pass of a csv reader, and the values of
+    each column are cast at once.  Missing values and errors are handled as in
+    `decode`, by falling back to parsing the values of the affected rows one at
+    a time.
+
+    Args:
+      csv_strings: A list of strings to be decoded.
+
+    Returns:
+      A dictionary from column name to an ndarray of shape
+      [len(csv_strings)] + shape for `FixedLenFeature`s, and to an
+      `impl_helper.VarLenBatch` for `VarLenFeature`s and for the index and
+      value columns of `SparseFeature`s.
+
+    Raises:
+      DecodeError: If columns do not match specified csv headers.
+      ValueError: If some numeric column has non-numeric data, or multivalent
+          data has the wrong length.
+    """
+    rows = self._reader.read_records(csv_strings)
+    if rows is None:
+      # Splitting the records one at a time, which raises the same errors as
+      # decode.
+      rows = [self._read_record(csv_string) for csv_string in csv_strings]
+    rows = [self._check_raw_values(raw_values) for raw_values in rows]
+    return {
+        feature_handler.name: feature_handler.parse_batch(rows)
+        for feature_handler in self._feature_handlers
+    }
+
+  def decode_tensors(self, csv_lines):
+    """Decodes a batch of CSV lines in the TF graph.
+
+    Lines are split with `tf.io.decode_csv`, and multivalent columns with
+    `tf.compat.v1.string_split`, so no Python decoding is needed.  This is used by
+    `tft_beam.AnalyzeDataset` and `tft_beam.TransformDataset` when they are
+    given this coder as their `input_record_coder`.
+
+    Missing values are handled as in `decode`, and invalid values fail the op
+    that parses them.  Values of multivalent columns are split on the secondary
+    delimiter without quoting, and empty values are skipped.
+
+    Args:
+      csv_lines: A 1-D string `Tensor` of CSV lines.
+
+    Returns:
+      A dict from feature name to a `Tensor` or `SparseTensor` with the same
+      type and shape as `impl_helper.feature_spec_as_batched_placeholders`.
+    """
+    feature_spec = self._schema.as_feature_spec()
+    multivalent_columns = set(self._multivalent_columns)
+    record_defaults = []
+    for name in self._column_names:
+      spec = feature_spec.get(name)
+      if (isinstance(spec, tf.io.FixedLenFeature) and
+          name not in multivalent_columns):
+        # These columns are parsed by decode_csv, which fails on missing values
+        # without a default.  Their size is 1, so the default has one value.
+        default = ([] if spec.default_value is None else np.reshape(
+            spec.default_value, [-1]).tolist())
+        record_defaults.append(tf.constant(default, dtype=spec.dtype))
+      else:
+        record_defaults.append(tf.constant([''], dtype=tf.string))
+    columns = dict(
+        zip(self._column_names,
+            tf.io.decode_csv(
+                csv_lines, record_defaults, field_delim=self._delimiter)))
+
+    def split(column_name, name):
+      delimiter = (
+          self._secondary_delimiter if name in multivalent_columns else None)
+      return _split_column_tensor(columns[column_name], delimiter)
+
+    result = {}
+    for name, spec in six.iteritems(feature_spec):
+      if isinstance(spec, tf.io.FixedLenFeature):
+        if name not in multivalent_columns:
+          result[name] = tf.reshape(columns[name], [-1] + spec.shape)
+          continue
+        values = split(name, name)
+        size = 1
+        for dim in spec.shape:
+          size *= dim
+        check_num_values = tf.debugging.assert_equal(
+            _row_lengths_tensor(values),
+            tf.constant(size, dtype=tf.int64),
+            message='FixedLenFeature "{}" got wrong number of values'.format(
+                name))
+        with tf.control_dependencies([check_num_values]):
+          result[name] = tf.reshape(
+              _cast_values_tensor(values.values, spec.dtype),
+              [-1] + spec.shape)
+      elif isinstance(spec, tf.io.VarLenFeature):
+        values = split(name, name)
+        result[name] = tf.SparseTensor(
+            indices=values.indices,
+            values=_cast_values_tensor(values.values, spec.dtype),
+            dense_shape=values.dense_shape)
+      else:
+        # TODO(KesterTong): Add support for N-d SparseFeatures.
+        indices = split(spec.index_key, name)
+        values = split(spec.value_key, name)
+        index_values = _cast_values_tensor(indices.values, tf.int64)
+        checks = [
+            tf.debugging.assert_equal(
+                _row_lengths_tensor(indices),
+                _row_lengths_tensor(values),
+                message='SparseFeature "{}" had indices and values of '
+                'different lengths'.format(name)),
+            tf.debugging.assert_non_negative(
+                index_values,
+                message='SparseFeature "{}" had negative indices'.format(name)),
+            tf.debugging.assert_less(
+                index_values,
+                tf.constant(spec.size, dtype=tf.int64),
+                message='SparseFeature "{}" had indices out of range'.format(
+                    name)),
+        ]
+        with tf.control_dependencies(checks):
+          result[name] = tf.SparseTensor(
+              indices=tf.stack([values.indices[:, 0], index_values], axis=1),
+              values=_cast_values_tensor(values.values, spec.dtype),
+              dense_shape=tf.stack([
+                  values.dense_shape[0],
+                  tf.constant(spec.size, dtype=tf.int64)
+              ]))
+    return result
+
+  def _read_record(self, csv_string):
     try:
-      raw_values = self._reader.read_record(csv_string)
+      return self._reader.read_record(csv_string)
     except Exception as e:  # pylint: disable=broad-except
       raise DecodeError('%s: %s' % (e, csv_string))
 
+  def _check_raw_values(self, raw_values):
+    """Checks that the split values of a record match the columns."""
     # An empty string when we expect a single column is potentially valid.  This
     # is probably more permissive than the csv standard but is useful for
     # testing so that we can test single column CSV lines.
@@ -496,8 +857,4 @@ class CsvCoder(object):
       raise DecodeError(
           'Columns do not match specified csv headers: {} -> {}'.format(
               self._column_names, raw_values))
-
-    return {
-        feature_handler.name: feature_handler.parse_value(raw_values)
-        for feature_handler in self._feature_handlers
-    }
+    return raw_values
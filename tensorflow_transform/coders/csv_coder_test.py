@@ -21,8 +21,10 @@ from __future__ import print_function
 import pickle
 
 import numpy as np
+import six
 import tensorflow as tf
 from tensorflow_transform.coders import csv_coder
+from tensorflow_transform import impl_helper
 from tensorflow_transform import test_case
 from tensorflow_transform.tf_metadata import dataset_schema
 
@@ -68,6 +70,20 @@ _ENCODE_DECODE_CASES = [
             'idx': [1],
             'value': [12.0],
         }),
+    dict(
+        testcase_name='multiple_columns_quoted_newlines',
+        columns=_COLUMNS,
+        feature_spec=_FEATURE_SPEC,
+        csv_line='12,"this is a\ntext","categorical\r\nvalue",1,89.0,12.0,20',
+        instance={
+            'category1': [b'categorical\r\nvalue'],
+            'numeric1': 12,
+            'numeric2': [89.0],
+            'numeric3': [20],
+            'text1': b'this is a\ntext',
+            'idx': [1],
+            'value': [12.0],
+        }),
     dict(
         testcase_name='multiple_columns_tab_separated',
         columns=_COLUMNS,
@@ -364,6 +380,78 @@ _ENCODE_ERROR_CASES = [
 ]
 
 
+_DECODE_BATCH_CASES = [
+    dict(
+        testcase_name='missing_values',
+        columns=['a', 'b', 'c', 'd'],
+        feature_spec={
+            'a': tf.io.FixedLenFeature([], tf.int64, default_value=-1),
+            'b': tf.io.FixedLenFeature([], tf.string, default_value=b'?'),
+            'c': tf.io.VarLenFeature(tf.float32),
+            'd': tf.io.FixedLenFeature([1], tf.float32, default_value=[0.5]),
+        },
+        csv_lines=['1,x,1.5,2', ',,,', '3,,,4', ',z,2.5,'],
+        expected={
+            'a': np.array([1, -1, 3, -1]),
+            'b': np.array([b'x', b'?', b'?', b'z'], np.object),
+            'c': impl_helper.VarLenBatch(
+                np.array([1.5, 2.5], np.float32), np.array([1, 0, 0, 1])),
+            'd': np.array([[2.], [.5], [4.], [.5]], np.float32),
+        }),
+    dict(
+        testcase_name='multivalent',
+        columns=['x', 'y'],
+        feature_spec={
+            'x': tf.io.FixedLenFeature([2], tf.int64),
+            'y': tf.io.VarLenFeature(tf.string),
+        },
+        csv_lines=['1|2,a|b', '3|4,', '5|6,c'],
+        expected={
+            'x': np.array([[1, 2], [3, 4], [5, 6]]),
+            'y': impl_helper.VarLenBatch(
+                np.array([b'a', b'b', b'c'], np.object), np.array([2, 0, 1])),
+        },
+        secondary_delimiter='|',
+        multivalent_columns=['x', 'y']),
+    dict(
+        testcase_name='empty_batch',
+        columns=['x', 'y'],
+        feature_spec={
+            'x': tf.io.FixedLenFeature([1], tf.int64),
+            'y': tf.io.VarLenFeature(tf.string),
+        },
+        csv_lines=[],
+        expected={
+            'x': np.zeros([0, 1], np.int64),
+            'y': impl_helper.VarLenBatch(
+                np.array([], np.object), np.array([], np.int64)),
+        }),
+]
+
+
+def _decode_as_columns(coder, feature_spec, csv_lines):
+  """Decodes csv_lines one at a time into the format of decode_batch."""
+  instances = [coder.decode(csv_line) for csv_line in csv_lines]
+  result = {}
+
+  def var_len_batch(name, dtype):
+    values = [instance[name] for instance in instances]
+    return impl_helper.VarLenBatch(
+        np.array([v for row in values for v in row], dtype.as_numpy_dtype),
+        np.array([len(row) for row in values], np.int64))
+
+  for name, spec in six.iteritems(feature_spec):
+    if isinstance(spec, tf.io.FixedLenFeature):
+      result[name] = np.array([instance[name] for instance in instances],
+                              spec.dtype.as_numpy_dtype)
+    elif isinstance(spec, tf.io.VarLenFeature):
+      result[name] = var_len_batch(name, spec.dtype)
+    else:
+      result[spec.index_key] = var_len_batch(spec.index_key, tf.int64)
+      result[spec.value_key] = var_len_batch(spec.value_key, spec.dtype)
+  return result
+
+
 class TestCSVCoder(test_case.TransformTestCase):
 
   @test_case.named_parameters(*(_ENCODE_DECODE_CASES + _DECODE_ONLY_CASES))
@@ -372,6 +460,125 @@ class TestCSVCoder(test_case.TransformTestCase):
     coder = csv_coder.CsvCoder(columns, schema, **kwargs)
     np.testing.assert_equal(coder.decode(csv_line), instance)
 
+  @test_case.named_parameters(*(_ENCODE_DECODE_CASES + _DECODE_ONLY_CASES))
+  def test_decode_batch_matches_decode(self, columns, feature_spec, csv_line,
+                                       instance, **kwargs):
+    del instance  # unused
+    schema = dataset_schema.from_feature_spec(feature_spec)
+    coder = csv_coder.CsvCoder(columns, schema, **kwargs)
+    csv_lines = [csv_line] * 3
+    np.testing.assert_equal(
+        coder.decode_batch(csv_lines),
+        _decode_as_columns(coder, feature_spec, csv_lines))
+
+  @test_case.named_parameters(*_DECODE_BATCH_CASES)
+  def test_decode_batch(self, columns, feature_spec, csv_lines, expected,
+                        **kwargs):
+    schema = dataset_schema.from_feature_spec(feature_spec)
+    coder = csv_coder.CsvCoder(columns, schema, **kwargs)
+    result = coder.decode_batch(csv_lines)
+    np.testing.assert_equal(result, expected)
+    for name, value in six.iteritems(result):
+      if isinstance(value, impl_helper.VarLenBatch):
+        self.assertEqual(value.values.dtype, expected[name].values.dtype)
+        self.assertEqual(value.row_lengths.dtype, np.int64)
+      else:
+        self.assertEqual(value.dtype, expected[name].dtype)
+        self.assertEqual(value.shape, expected[name].shape)
+
+  def test_decode_batch_unterminated_quote(self):
+    schema = dataset_schema.from_feature_spec(
+        {'x': tf.io.FixedLenFeature([], tf.string)})
+    coder = csv_coder.CsvCoder(['x', 'y'], schema)
+    # A single pass of a csv reader would read both lines as a single row.
+    with self.assertRaises(csv_coder.DecodeError):
+      coder.decode_batch(['"a,b', 'c,d'])
+    np.testing.assert_equal(
+        coder.decode_batch(['a,"b\nc"', 'd,e']),
+        {'x': np.array([b'a', b'd'], np.object)})
+
+  @test_case.named_parameters(*(_ENCODE_DECODE_CASES + [
+      case for case in _DECODE_BATCH_CASES if case['csv_lines']
+  ]))
+  def test_decode_tensors(self,
+                          columns,
+                          feature_spec,
+                          csv_line=None,
+                          csv_lines=None,
+                          instance=None,
+                          expected=None,
+                          **kwargs):
+    del instance, expected  # unused
+    if csv_lines is None:
+      csv_lines = [csv_line] * 3
+    schema = dataset_schema.from_feature_spec(feature_spec)
+    coder = csv_coder.CsvCoder(columns, schema, **kwargs)
+    with tf.compat.v1.Graph().as_default():
+      records = tf.compat.v1.placeholder(tf.string, [None])
+      tensors = coder.decode_tensors(records)
+      with tf.compat.v1.Session() as session:
+        result = session.run(
+            tensors,
+            feed_dict={records: [tf.compat.as_bytes(x) for x in csv_lines]})
+
+    # The decoded tensors are fed to the graph in place of the feed list of
+    # the instances decoded in Python.
+    names = sorted(feature_spec.keys())
+    feed_list = impl_helper.make_feed_list(
+        names, schema, [coder.decode(x) for x in csv_lines])
+    self.assertCountEqual(result.keys(), names)
+    for name, feed_value in zip(names, feed_list):
+      if isinstance(feed_value, tf.compat.v1.SparseTensorValue):
+        np.testing.assert_equal(
+            result[name].indices,
+            np.asarray(feed_value.indices, np.int64).reshape([-1, 2]))
+        np.testing.assert_equal(
+            result[name].values,
+            np.asarray(feed_value.values, result[name].values.dtype))
+        np.testing.assert_equal(result[name].dense_shape,
+                                feed_value.dense_shape)
+      else:
+        np.testing.assert_equal(
+            result[name], np.asarray(feed_value, result[name].dtype))
+
+  @test_case.named_parameters(
+      dict(
+          testcase_name='missing_value',
+          columns=['x'],
+          feature_spec={'x': tf.io.FixedLenFeature([], tf.int64)},
+          csv_line=''),
+      dict(
+          testcase_name='non_numeric_value',
+          columns=['x'],
+          feature_spec={'x': tf.io.VarLenFeature(tf.float32)},
+          csv_line='a'),
+      dict(
+          testcase_name='multivalent_wrong_number_of_values',
+          columns=['x'],
+          feature_spec={'x': tf.io.FixedLenFeature([2], tf.int64)},
+          csv_line='1|2|3',
+          secondary_delimiter='|',
+          multivalent_columns=['x']),
+      dict(
+          testcase_name='sparse_lengths_mismatch',
+          columns=['idx', 'value'],
+          feature_spec={
+              'x': tf.io.SparseFeature('idx', 'value', tf.float32, 10)
+          },
+          csv_line='1|2,1.0',
+          secondary_delimiter='|',
+          multivalent_columns=['x']),
+  )
+  def test_decode_tensors_error(self, columns, feature_spec, csv_line,
+                                **kwargs):
+    schema = dataset_schema.from_feature_spec(feature_spec)
+    coder = csv_coder.CsvCoder(columns, schema, **kwargs)
+    with tf.compat.v1.Graph().as_default():
+      tensors = coder.decode_tensors(tf.constant([csv_line]))
+      with tf.compat.v1.Session() as session:
+        with self.assertRaises(tf.errors.InvalidArgumentError):
+          session.run(tensors)
+
   @test_case.named_parameters(*_ENCODE_DECODE_CASES)
   def test_encode(self, columns, feature_spec, csv_line, instance, **kwargs):
     schema = dataset_schema.from_feature_spec(feature_spec)
@@ -402,6 +609,19 @@ class TestCSVCoder(test_case.TransformTestCase):
     with self.assertRaisesRegexp(error_type, error_msg):
       coder.decode(csv_line)
 
+  @test_case.named_parameters(*_DECODE_ERROR_CASES)
+  def test_decode_batch_error(self,
+                              columns,
+                              feature_spec,
+                              csv_line,
+                              error_msg,
+                              error_type=ValueError,
+                              **kwargs):
+    schema = dataset_schema.from_feature_spec(feature_spec)
+    coder = csv_coder.CsvCoder(columns, schema, **kwargs)
+    with self.assertRaisesRegexp(error_type, error_msg):
+      coder.decode_batch([csv_line])
+
   @test_case.named_parameters(*_ENCODE_ERROR_CASES)
   def test_encode_error(self,
                         columns,
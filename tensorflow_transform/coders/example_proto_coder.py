@@ -22,11 +22,14 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import itertools
+
 # GOOGLE-INITIALIZATION
 
 import numpy as np
 import six
 import tensorflow as tf
+from tensorflow_transform import impl_helper
 
 
 # This function needs to be called at pipeline execution time as it depends on
@@ -99,6 +102,101 @@ def _make_cast_fn(np_dtype):
     return string_cast
 
 
+# Wire format tags (field number << 3 | wire type) of the fields that are
+# written when serializing Examples directly.  All of them are length
+# delimited (wire type 2): Example.features, Features.feature (a map entry),
+# the map entry's key and value, the Feature's bytes_list, float_list and
+# int64_list, and the (packed) value of those lists.
+_FIELD_1_TAG = b'\x0a'
+_FIELD_2_TAG = b'\x12'
+_FIELD_3_TAG = b'\x1a'
+
+_UINT64_MASK = (1 << 64) - 1
+
+
+def _encode_varint(value):
+  """Encodes a non-negative int as a protocol buffer varint."""
+  result = bytearray()
+  while value > 0x7f:
+    result.append((value & 0x7f) | 0x80)
+    value >>= 7
+  result.append(value)
+  return bytes(result)
+
+
+def _encode_length_delimited(tag, payload):
+  return tag + _encode_varint(len(payload)) + payload
+
+
+def _make_serialize_list_fn(dtype):
+  """Return a function to serialize values as a Feature with a list of dtype.
+
+  Args:
+    dtype: The type of the Tensorflow feature.
+  Returns:
+    A function from a 1-d ndarray or list of values to a serialized Feature.
+  """
+  if dtype.is_integer:
+
+    def serialize_int64_list(values):
+      packed = b''.join(
+          _encode_varint(value & _UINT64_MASK)
+          for value in np.asarray(values, dtype=np.int64).tolist())
+      return _encode_length_delimited(
+          _FIELD_3_TAG,
+          _encode_length_delimited(_FIELD_1_TAG, packed) if packed else b'')
+
+    return serialize_int64_list
+  elif dtype.is_floating:
+
+    def serialize_float_list(values):
+      packed = np.asarray(values, dtype='<f4').tobytes()
+      return _encode_length_delimited(
+          _FIELD_2_TAG,
+          _encode_length_delimited(_FIELD_1_TAG, packed) if packed else b'')
+
+    return serialize_float_list
+  else:
+
+    def serialize_bytes_list(values):
+      return _encode_length_delimited(
+          _FIELD_1_TAG,
+          b''.join(
+              _encode_length_delimited(_FIELD_1_TAG, tf.compat.as_bytes(value))
+              for value in values))
+
+    return serialize_bytes_list
+
+
+def _split_sparse_batch(sparse_value, batch_size, name):
+  """Splits a `SparseTensorValue` batch into the offsets of its rows.
+
+  Args:
+    sparse_value: A `SparseTensorValue` representing a batch, whose indices are
+      sorted by row.
+    batch_size: The size of the batch.
+    name: The name of the feature, for error messages.
+
+  Returns:
+    A pair of an ndarray of the indices of the batch, and an ndarray of length
+    batch_size + 1 of the offsets of each row's values in the batch.
+
+  Raises:
+    ValueError: If sparse_value is not a `SparseTensorValue` or its indices are
+      not sorted by row.
+  """
+  if not isinstance(sparse_value, tf.compat.v1.SparseTensorValue):
+    raise ValueError('Expected a SparseTensorValue for feature %r, but got %s'
+                     % (name, sparse_value))
+  indices = np.asarray(sparse_value.indices).reshape(
+      [-1, len(sparse_value.dense_shape)])
+  rows = indices[:, 0]
+  if np.any(rows[1:] < rows[:-1]):
+    raise ValueError(
+        'Encountered out-of-order sparse index for feature %r' % name)
+  return indices, np.searchsorted(rows, np.arange(batch_size + 1))
+
+
 def _make_feature_value_fn(dtype):
   """Return a function to extract the typed value from the feature.
 
@@ -129,6 +227,9 @@ class _FixedLenFeatureHandler(object):
     self._name = name
     self._np_dtype = feature_spec.dtype.as_numpy_dtype
     self._value_fn = _make_feature_value_fn(feature_spec.dtype)
+    self._serialize_list_fn = _make_serialize_list_fn(feature_spec.dtype)
+    self._serialized_key = _encode_length_delimited(
+        _FIELD_1_TAG, tf.compat.as_bytes(name))
     self._shape = feature_spec.shape
     self._rank = len(feature_spec.shape)
     self._size = 1
@@ -159,8 +260,8 @@ class _FixedLenFeatureHandler(object):
     self._cast_fn = _make_cast_fn(self._np_dtype)
     self._value = self._value_fn(example.features.feature[self._name])
 
-  def parse_value(self, feature_map):
-    """Non-Mutating Decode of a feature into its TF.Transform representation."""
+  def _get_values(self, feature_map):
+    """Returns the flat list of values of this feature in feature_map."""
     if self._name in feature_map:
       feature = feature_map[self._name]
       if feature.WhichOneof('kind') is None:
@@ -175,7 +276,11 @@ class _FixedLenFeatureHandler(object):
     if len(values) != self._size:
       raise ValueError('FixedLenFeature %r got wrong number of values. Expected'
                        ' %d but got %d' % (self._name, self._size, len(values)))
+    return values
 
+  def parse_value(self, feature_map):
+    """Non-Mutating Decode of a feature into its TF.Transform representation."""
+    values = self._get_values(feature_map)
     if self._rank == 0:
       # Encode the values as a scalar if shape == [].
       return values[0]
@@ -185,6 +290,53 @@ class _FixedLenFeatureHandler(object):
     else:
       return np.asarray(values, dtype=self._np_dtype).reshape(self._shape)
 
+  def make_parse_fn(self):
+    """Returns a function like parse_value, specialized for this feature.
+
+    The rank and default value of the feature are resolved ahead of time, and
+    the values of a feature with the expected number of values are returned
+    without checking its kind.  Other features are decoded by parse_value.
+    """
+    name = self._name
+    size = self._size
+    value_fn = self._value_fn
+    parse_value = self.parse_value
+    if self._rank == 0:
+      default_value = (
+          None if self._default_value is None else self._default_value[0])
+
+      def parse_scalar(feature_map):
+        if name in feature_map:
+          values = value_fn(feature_map[name])
+          if len(values) == 1:
+            return values[0]
+        elif default_value is not None:
+          return default_value
+        return parse_value(feature_map)
+
+      return parse_scalar
+    elif self._rank == 1:
+      np_dtype = self._np_dtype
+
+      def parse_vector(feature_map):
+        if name in feature_map:
+          values = value_fn(feature_map[name])
+          if len(values) == size:
+            return np.asarray(values, dtype=np_dtype)
+        return parse_value(feature_map)
+
+      return parse_vector
+    else:
+      return parse_value
+
+  def parse_batch(self, feature_maps):
+    """Decodes a feature of a batch into an ndarray of shape [batch] + shape."""
+    values = itertools.chain.from_iterable(
+        self._get_values(feature_map) for feature_map in feature_maps)
+    return np.asarray(
+        list(values), dtype=self._np_dtype).reshape([len(feature_maps)] +
+                                                    list(self._shape))
+
   def encode_value(self, values):
     """Encodes a feature into its Example proto representation."""
     del self._value[:]
@@ -200,6 +352,33 @@ class _FixedLenFeatureHandler(object):
                          (self._name, self._size, len(flattened_values)))
       self._value.extend(self._cast_fn(flattened_values))
 
+  def make_encode_fn(self):
+    """Returns a function like encode_value, specialized for this feature.
+
+    Must be called after initialize_encode_cache.
+    """
+    if self._rank != 0:
+      return self.encode_value
+    value = self._value
+    cast_fn = self._cast_fn
+
+    def encode_scalar(values):
+      del value[:]
+      value.append(cast_fn(values))
+
+    return encode_scalar
+
+  def serialize_value(self, values):
+    """Serializes a feature as an entry of a Features' feature map."""
+    flattened_values = np.reshape(values, [-1])
+    if len(flattened_values) != self._size:
+      raise ValueError('FixedLenFeature %r got wrong number of values. '
+                       'Expected %d but got %d' %
+                       (self._name, self._size, len(flattened_values)))
+    return _encode_length_delimited(
+        _FIELD_1_TAG, self._serialized_key + _encode_length_delimited(
+            _FIELD_2_TAG, self._serialize_list_fn(flattened_values)))
+
 
 class _VarLenFeatureHandler(object):
   """Handler for `VarLenFeature` values.
@@ -211,6 +390,9 @@ class _VarLenFeatureHandler(object):
     self._name = name
     self._np_dtype = dtype.as_numpy_dtype
     self._value_fn = _make_feature_value_fn(dtype)
+    self._serialize_list_fn = _make_serialize_list_fn(dtype)
+    self._serialized_key = _encode_length_delimited(
+        _FIELD_1_TAG, tf.compat.as_bytes(name))
 
   @property
   def name(self):
@@ -234,6 +416,28 @@ class _VarLenFeatureHandler(object):
     else:
       return None
 
+  def parse_batch(self, feature_maps):
+    """Decodes a feature of a batch into an `impl_helper.VarLenBatch`."""
+    values = []
+    row_lengths = np.zeros(len(feature_maps), dtype=np.int64)
+    for row, feature_map in enumerate(feature_maps):
+      if self._name in feature_map:
+        feature = feature_map[self._name]
+        if feature.WhichOneof('kind') is not None:
+          row_values = self._value_fn(feature)
+          values.extend(row_values)
+          row_lengths[row] = len(row_values)
+    return impl_helper.VarLenBatch(
+        np.asarray(values, dtype=self._np_dtype), row_lengths)
+
+  def make_parse_fn(self):
+    """Returns a function like parse_value, specialized for this feature."""
+    return self.parse_value
+
+  def make_encode_fn(self):
+    """Returns a function like encode_value, specialized for this feature."""
+    return self.encode_value
+
   def encode_value(self, values):
     if values is None:
       self._feature.Clear()
@@ -244,6 +448,16 @@ class _VarLenFeatureHandler(object):
       del self._value[:]
       self._value.extend(self._cast_fn(values))
 
+  def serialize_value(self, values):
+    """Serializes a feature as an entry of a Features' feature map."""
+    if values is None:
+      serialized_feature = b''
+    else:
+      serialized_feature = self._serialize_list_fn(values)
+    return _encode_length_delimited(
+        _FIELD_1_TAG, self._serialized_key +
+        _encode_length_delimited(_FIELD_2_TAG, serialized_feature))
+
 
 class ExampleProtoCoder(object):
   """A coder between maybe-serialized TF Examples and tf.Transform datasets."""
@@ -279,39 +493,49 @@ class ExampleProtoCoder(object):
     self._encode_example_cache = tf.train.Example()
     self._decode_example_cache = tf.train.Example()
     self._feature_handlers = []
+    # Pairs of a feature name and its handlers, in the same order as
+    # self._feature_handlers, used to encode batches.
+    self._feature_handlers_by_feature = []
     for name, feature_spec in six.iteritems(schema.as_feature_spec()):
       if isinstance(feature_spec, tf.io.FixedLenFeature):
-        self._feature_handlers.append(
-            _FixedLenFeatureHandler(name, feature_spec))
+        handlers = [_FixedLenFeatureHandler(name, feature_spec)]
       elif isinstance(feature_spec, tf.io.VarLenFeature):
-        self._feature_handlers.append(
-            _VarLenFeatureHandler(name, feature_spec.dtype))
+        handlers = [_VarLenFeatureHandler(name, feature_spec.dtype)]
       elif isinstance(feature_spec, tf.io.SparseFeature):
-        self._feature_handlers.append(
-            _VarLenFeatureHandler(feature_spec.index_key, tf.int64))
-        self._feature_handlers.append(
-            _VarLenFeatureHandler(feature_spec.value_key, feature_spec.dtype))
+        handlers = [
+            _VarLenFeatureHandler(feature_spec.index_key, tf.int64),
+            _VarLenFeatureHandler(feature_spec.value_key, feature_spec.dtype)
+        ]
       else:
         raise ValueError('feature_spec should be one of tf.FixedLenFeature, '
                          'tf.VarLenFeature or tf.SparseFeature: %s was %s' %
                          (name, type(feature_spec)))
+      self._feature_handlers.extend(handlers)
+      self._feature_handlers_by_feature.append((name, handlers))
 
     for feature_handler in self._feature_handlers:
       feature_handler.initialize_encode_cache(self._encode_example_cache)
 
+    # Functions specialized for each feature, which decode and encode the
+    # values of all features without dispatching on their shape and default
+    # values.
+    self._parse_fns = [(feature_handler.name, feature_handler.make_parse_fn())
+                       for feature_handler in self._feature_handlers]
+    self._encode_fns = [(feature_handler.name, feature_handler.make_encode_fn())
+                        for feature_handler in self._feature_handlers]
+
   def __reduce__(self):
     return ExampleProtoCoder, (self._schema, self._serialized)
 
   def encode(self, instance):
     """Encode a tf.transform encoded dict as tf.Example."""
     # The feature handles encode using the self._encode_example_cache.
-    for feature_handler in self._feature_handlers:
-      value = instance[feature_handler.name]
+    for name, encode_fn in self._encode_fns:
+      value = instance[name]
       try:
-        feature_handler.encode_value(value)
+        encode_fn(value)
       except TypeError as e:
-        raise TypeError('%s while encoding feature "%s"' %
-                        (e, feature_handler.name))
+        raise TypeError('%s while encoding feature "%s"' % (e, name))
 
     if self._serialized:
       return self._encode_example_cache.SerializeToString()
@@ -320,6 +544,116 @@ class ExampleProtoCoder(object):
       result.CopyFrom(self._encode_example_cache)
       return result
 
+  def _split_batch(self, batch):
+    """Splits a batch into the values of each row for each feature handler.
+
+    Args:
+      batch: A dict from feature name to an ndarray of shape [batch_size] +
+        shape for `FixedLenFeature`s and a `SparseTensorValue` for
+        `VarLenFeature`s and `SparseFeature`s, as output by the transform
+        function.
+
+    Returns:
+      A pair of the batch size, and a list of pairs of a feature handler and
+      a list of the values of the feature for each row.
+
+    Raises:
+      ValueError: If the batch is invalid.
+    """
+    batch_size = None
+    for name, handlers in self._feature_handlers_by_feature:
+      value = batch[name]
+      if isinstance(value, tf.compat.v1.SparseTensorValue):
+        feature_batch_size = value.dense_shape[0]
+      else:
+        feature_batch_size = len(value)
+      if batch_size is None:
+        batch_size = feature_batch_size
+      elif feature_batch_size != batch_size:
+        raise ValueError(
+            'Inconsistent batch sizes: %r had batch dimension %d, expected %d'
+            % (name, feature_batch_size, batch_size))
+
+    result = []
+    for name, handlers in self._feature_handlers_by_feature:
+      value = batch[name]
+      if isinstance(handlers[0], _FixedLenFeatureHandler):
+        result.append((handlers[0], value))
+        continue
+      indices, offsets = _split_sparse_batch(value, batch_size, name)
+      values = np.asarray(value.values)
+      if len(handlers) == 1:
+        # Values of a VarLenFeature must be at consecutive positions from the
+        # start of each row.
+        positions = np.arange(len(indices)) - np.repeat(
+            offsets[:-1], np.diff(offsets))
+        if indices.shape[1] != 2 or np.any(indices[:, 1] != positions):
+          raise ValueError('Encountered a SparseTensorValue that cannot be '
+                           'decoded by ListColumnRepresentation.')
+        sources = [values]
+      else:
+        # TODO(KesterTong): Add support for N-d SparseFeatures.
+        sources = [indices[:, 1], values]
+      for handler, source in zip(handlers, sources):
+        result.append((handler, [
+            source[offsets[row]:offsets[row + 1]] for row in range(batch_size)
+        ]))
+    return batch_size or 0, result
+
+  def encode_batch(self, batch, fast_serialization=False):
+    """Encodes a batch output by the transform function as tf.Examples.
+
+    This is equivalent to encoding each instance of
+    `impl_helper.to_instance_dicts(schema, batch)`, without creating the
+    instances.
+
+    Args:
+      batch: A dict from feature name to an ndarray of shape [batch_size] +
+        shape for `FixedLenFeature`s and a `SparseTensorValue` for
+        `VarLenFeature`s and `SparseFeature`s, e.g. as output by
+        `tft_beam.TransformDataset` with `output_batches=True`.
+      fast_serialization: Whether to write the serialized Examples directly in
+        the protocol buffer wire format from the numpy values, instead of
+        populating a tf.train.Example for each row.  Only supported by coders
+        with serialized=True.
+
+    Returns:
+      A list of tf.Examples, serialized if this coder was constructed with
+      serialized=True.
+
+    Raises:
+      ValueError: If the batch is invalid, or fast_serialization is requested
+        for a coder of non serialized Examples.
+    """
+    if fast_serialization and not self._serialized:
+      raise ValueError(
+          'fast_serialization requires an ExampleProtoCoder with '
+          'serialized=True')
+    batch_size, handler_rows = self._split_batch(batch)
+
+    result = []
+    for row in range(batch_size):
+      if fast_serialization:
+        result.append(
+            _encode_length_delimited(
+                _FIELD_1_TAG,
+                b''.join(
+                    handler.serialize_value(rows[row])
+                    for handler, rows in handler_rows)))
+        continue
+      for handler, rows in handler_rows:
+        try:
+          handler.encode_value(rows[row])
+        except TypeError as e:
+          raise TypeError('%s while encoding feature "%s"' % (e, handler.name))
+      if self._serialized:
+        result.append(self._encode_example_cache.SerializeToString())
+      else:
+        example = tf.train.Example()
+        example.CopyFrom(self._encode_example_cache)
+        result.append(example)
+    return result
+
   def decode(self, example_proto):
     """Decode tf.Example as a tf.transform encoded dict."""
     if self._serialized:
@@ -329,5 +663,54 @@ class ExampleProtoCoder(object):
       example = example_proto
 
     feature_map = example.features.feature
-    return {feature_handler.name: feature_handler.parse_value(feature_map)
+    return {name: parse_fn(feature_map) for name, parse_fn in self._parse_fns}
+
+  def decode_batch(self, example_protos):
+    """Decode a batch of tf.Examples as a columnar batch.
+
+    Args:
+      example_protos: A list of tf.Examples, serialized if this coder was
+        constructed with serialized=True.
+
+    Returns:
+      A dictionary from column name to an ndarray of shape
+      [len(example_protos)] + shape for `FixedLenFeature`s, and to an
+      `impl_helper.VarLenBatch` for `VarLenFeature`s and for the index and
+      value columns of `SparseFeature`s.  This can be fed to a graph with
+      `impl_helper.make_feed_list_from_columns`.
+    """
+    if self._serialized:
+      examples = [
+          tf.train.Example.FromString(example_proto)
+          for example_proto in example_protos
+      ]
+    else:
+      examples = example_protos
+
+    feature_maps = [example.features.feature for example in examples]
+    return {feature_handler.name: feature_handler.parse_batch(feature_maps)
             for feature_handler in self._feature_handlers}
+
+  def decode_tensors(self, serialized_examples):
+    """Decodes a batch of serialized tf.Examples in the TF graph.
+
+    Examples are parsed with `tf.io.parse_example`, so no Python decoding is
+    needed.  This is used by `tft_beam.AnalyzeDataset` and
+    `tft_beam.TransformDataset` when they are given this coder as their
+    `input_record_coder`.
+
+    Args:
+      serialized_examples: A 1-D string `Tensor` of serialized tf.Examples.
+
+    Returns:
+      A dict from feature name to a `Tensor` or `SparseTensor` with the same
+      type and shape as `impl_helper.feature_spec_as_batched_placeholders`.
+
+    Raises:
+      ValueError: If this coder was constructed with serialized=False.
+    """
+    if not self._serialized:
+      raise ValueError(
+          'decode_tensors requires an ExampleProtoCoder with serialized=True')
+    return tf.io.parse_example(serialized_examples,
+                               self._schema.as_feature_spec())
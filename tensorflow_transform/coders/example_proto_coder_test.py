@@ -32,8 +32,10 @@ elif any(arg.startswith('--proto_implementation_type') for arg in sys.argv):
 
 # pylint: disable=g-import-not-at-top
 import numpy as np
+import six
 import tensorflow as tf
 from tensorflow_transform.coders import example_proto_coder
+from tensorflow_transform import impl_helper
 from tensorflow_transform import test_case
 from tensorflow_transform.coders import example_proto_coder_test_cases
 from tensorflow_transform.tf_metadata import dataset_schema
@@ -60,6 +62,29 @@ def _binary_to_example(serialized_proto):
   return tf.train.Example.FromString(serialized_proto)
 
 
+def _decode_as_columns(coder, feature_spec, serialized_protos):
+  """Decodes serialized_protos one at a time into the decode_batch format."""
+  instances = [coder.decode(proto) for proto in serialized_protos]
+  result = {}
+
+  def var_len_batch(name, dtype):
+    values = [instance[name] or [] for instance in instances]
+    return impl_helper.VarLenBatch(
+        np.array([v for row in values for v in row], dtype.as_numpy_dtype),
+        np.array([len(row) for row in values], np.int64))
+
+  for name, spec in six.iteritems(feature_spec):
+    if isinstance(spec, tf.io.FixedLenFeature):
+      result[name] = np.array([instance[name] for instance in instances],
+                              spec.dtype.as_numpy_dtype)
+    elif isinstance(spec, tf.io.VarLenFeature):
+      result[name] = var_len_batch(name, spec.dtype)
+    else:
+      result[spec.index_key] = var_len_batch(spec.index_key, tf.int64)
+      result[spec.value_key] = var_len_batch(spec.value_key, spec.dtype)
+  return result
+
+
 class ExampleProtoCoderTest(test_case.TransformTestCase):
 
   def setUp(self):
@@ -89,6 +114,32 @@ class ExampleProtoCoderTest(test_case.TransformTestCase):
     proto = _ascii_to_example(ascii_proto)
     np.testing.assert_equal(coder.decode(proto), instance)
 
+  @test_case.named_parameters(*(
+      example_proto_coder_test_cases.ENCODE_DECODE_CASES +
+      example_proto_coder_test_cases.DECODE_ONLY_CASES))
+  def test_decode_batch(self, feature_spec, ascii_proto, instance, **kwargs):
+    del instance  # unused
+    schema = dataset_schema.from_feature_spec(feature_spec)
+    coder = example_proto_coder.ExampleProtoCoder(schema, **kwargs)
+    serialized_protos = [
+        _ascii_to_binary(ascii_proto),
+        _ascii_to_binary(''),
+        _ascii_to_binary(ascii_proto)
+    ]
+    # The empty Example is only valid if all features are optional.
+    try:
+      expected = _decode_as_columns(coder, feature_spec, serialized_protos)
+    except ValueError:
+      serialized_protos = serialized_protos[:1]
+      expected = _decode_as_columns(coder, feature_spec, serialized_protos)
+    np.testing.assert_equal(coder.decode_batch(serialized_protos), expected)
+
+    coder = example_proto_coder.ExampleProtoCoder(
+        schema, serialized=False, **kwargs)
+    np.testing.assert_equal(
+        coder.decode_batch(list(map(_binary_to_example, serialized_protos))),
+        expected)
+
   @test_case.named_parameters(*(
       example_proto_coder_test_cases.ENCODE_DECODE_CASES +
       example_proto_coder_test_cases.ENCODE_ONLY_CASES))
@@ -109,6 +160,100 @@ class ExampleProtoCoderTest(test_case.TransformTestCase):
     proto = _ascii_to_example(ascii_proto)
     np.testing.assert_equal(coder.encode(instance), proto)
 
+  @test_case.named_parameters(*(
+      example_proto_coder_test_cases.ENCODE_DECODE_CASES +
+      example_proto_coder_test_cases.ENCODE_ONLY_CASES))
+  def test_encode_batch(self, feature_spec, ascii_proto, instance, **kwargs):
+    del ascii_proto  # unused
+    schema = dataset_schema.from_feature_spec(feature_spec)
+    coder = example_proto_coder.ExampleProtoCoder(schema, **kwargs)
+    column_names = sorted(feature_spec.keys())
+    batch = dict(
+        zip(column_names,
+            impl_helper.make_feed_list(column_names, schema,
+                                       [instance, instance])))
+    expected = [
+        coder.encode(batch_instance)
+        for batch_instance in impl_helper.to_instance_dicts(schema, batch)
+    ]
+    for fast_serialization in (False, True):
+      actual = coder.encode_batch(batch, fast_serialization=fast_serialization)
+      self.assertEqual(len(actual), 2)
+      for actual_proto, expected_proto in zip(actual, expected):
+        self.assertSerializedProtosEqual(actual_proto, expected_proto)
+
+  def test_encode_batch_non_serialized(self):
+    feature_spec = example_proto_coder_test_cases.FEATURE_SPEC
+    instance = example_proto_coder_test_cases.ENCODE_DECODE_CASES[0]['instance']
+    schema = dataset_schema.from_feature_spec(feature_spec)
+    coder = example_proto_coder.ExampleProtoCoder(schema, serialized=False)
+    column_names = sorted(feature_spec.keys())
+    batch = dict(
+        zip(column_names,
+            impl_helper.make_feed_list(column_names, schema, [instance])))
+    self.assertEqual(coder.encode_batch(batch), [coder.encode(instance)])
+    with self.assertRaisesRegexp(ValueError, 'requires an ExampleProtoCoder'):
+      coder.encode_batch(batch, fast_serialization=True)
+
+  def test_encode_batch_error(self):
+    schema = dataset_schema.from_feature_spec(
+        {'varlen': tf.io.VarLenFeature(tf.int64)})
+    coder = example_proto_coder.ExampleProtoCoder(schema)
+    with self.assertRaisesRegexp(ValueError, 'out-of-order sparse index'):
+      coder.encode_batch({
+          'varlen':
+              tf.compat.v1.SparseTensorValue(
+                  indices=[[1, 0], [0, 0]], values=[1, 2], dense_shape=[2, 1])
+      })
+    with self.assertRaisesRegexp(ValueError, 'ListColumnRepresentation'):
+      coder.encode_batch({
+          'varlen':
+              tf.compat.v1.SparseTensorValue(
+                  indices=[[0, 1]], values=[1], dense_shape=[1, 2])
+      })
+
+  @test_case.named_parameters(*(
+      example_proto_coder_test_cases.ENCODE_DECODE_CASES +
+      example_proto_coder_test_cases.DECODE_ONLY_CASES))
+  def test_decode_tensors(self, feature_spec, ascii_proto, instance, **kwargs):
+    del instance  # unused
+    schema = dataset_schema.from_feature_spec(feature_spec)
+    coder = example_proto_coder.ExampleProtoCoder(schema, **kwargs)
+    serialized_protos = [_ascii_to_binary(ascii_proto)] * 2
+    with tf.compat.v1.Graph().as_default():
+      records = tf.compat.v1.placeholder(tf.string, [None])
+      tensors = coder.decode_tensors(records)
+      with tf.compat.v1.Session() as session:
+        result = session.run(tensors, feed_dict={records: serialized_protos})
+
+    # The decoded tensors are fed to the graph in place of the feed list of
+    # the instances decoded in Python.
+    names = sorted(feature_spec.keys())
+    feed_list = impl_helper.make_feed_list(
+        names, schema, [coder.decode(proto) for proto in serialized_protos])
+    self.assertCountEqual(result.keys(), names)
+    for name, feed_value in zip(names, feed_list):
+      if isinstance(feed_value, tf.compat.v1.SparseTensorValue):
+        np.testing.assert_equal(
+            result[name].indices,
+            np.asarray(feed_value.indices, np.int64).reshape([-1, 2]))
+        np.testing.assert_equal(
+            result[name].values,
+            np.asarray(feed_value.values, result[name].values.dtype))
+        np.testing.assert_equal(result[name].dense_shape,
+                                feed_value.dense_shape)
+      else:
+        np.testing.assert_equal(
+            result[name], np.asarray(feed_value, result[name].dtype))
+
+  def test_decode_tensors_non_serialized(self):
+    schema = dataset_schema.from_feature_spec(
+        example_proto_coder_test_cases.FEATURE_SPEC)
+    coder = example_proto_coder.ExampleProtoCoder(schema, serialized=False)
+    with tf.compat.v1.Graph().as_default():
+      with self.assertRaisesRegexp(ValueError, 'requires an ExampleProtoCoder'):
+        coder.decode_tensors(tf.compat.v1.placeholder(tf.string, [None]))
+
   @test_case.named_parameters(
       *example_proto_coder_test_cases.DECODE_ERROR_CASES)
   def test_decode_error(self,
@@ -122,6 +267,8 @@ class ExampleProtoCoderTest(test_case.TransformTestCase):
     serialized_proto = _ascii_to_binary(ascii_proto)
     with self.assertRaisesRegexp(error_type, error_msg):
       coder.decode(serialized_proto)
+    with self.assertRaisesRegexp(error_type, error_msg):
+      coder.decode_batch([serialized_proto])
 
   @test_case.named_parameters(
       *example_proto_coder_test_cases.ENCODE_ERROR_CASES)
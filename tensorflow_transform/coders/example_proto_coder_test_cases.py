@@ -116,7 +116,30 @@ features {
         instance={'unicode_feature': u'Hello κόσμε'}),
 ]
 
-DECODE_ONLY_CASES = []
+DECODE_ONLY_CASES = [
+    dict(
+        testcase_name='missing_with_defaults',
+        feature_spec={
+            'scalar_feature': tf.io.FixedLenFeature(
+                [], tf.int64, default_value=-1),
+            'vector_feature': tf.io.FixedLenFeature(
+                [2], tf.float32, default_value=[0.5, 1.5]),
+            'present_feature': tf.io.FixedLenFeature(
+                [], tf.string, default_value=b'?'),
+        },
+        ascii_proto="""\
+features {
+  feature {
+    key: "present_feature"
+    value { bytes_list { value: [ "abc" ] } }
+  }
+}""",
+        instance={
+            'scalar_feature': -1,
+            'vector_feature': np.array([0.5, 1.5], np.float32),
+            'present_feature': b'abc',
+        }),
+]
 
 DECODE_ERROR_CASES = [
     dict(
@@ -93,6 +93,9 @@ class _SourceInfo(
 class _GraphAnalyzer(object):
   """Class that analyzes a graph to determine readiness of tensors.
 
+  Results are memoized, and can be updated incrementally when the readiness of
+  sources changes, see `update_source_info`.
+
   Args:
     source_info_dict: A dict from `Tensor` or `Operation` to `_SourceInfo`.
     translate_path_fn: A function with the signature:
@@ -104,31 +107,55 @@ class _GraphAnalyzer(object):
     self._memoized_analyze_tensor_result = {}
     self._source_info_dict = source_info_dict
     self._translate_path_fn = translate_path_fn
+    # A map from each analyzed `Tensor` or `Operation` to those which were
+    # analyzed using its result.
+    self._children = collections.defaultdict(set)
+    # Paths of tensors and operations whose readiness needs to be recomputed,
+    # these stay the same as long as the names of sources don't change.
+    self._stale_paths = {}
+
+  def _get_parents(self, tensor_or_op):
+    """Returns the parents of a non source `Tensor` or `Operation`."""
+    if isinstance(tensor_or_op, tf.Operation):
+      if tensor_or_op.type in _INITIALIZABLE_TABLE_OP_TYPES:
+        raise _UnexpectedTableError(tensor_or_op)
+      if tensor_or_op.type == 'Placeholder':
+        raise _UnexpectedPlaceholderError(tensor_or_op)
+      return itertools.chain(tensor_or_op.inputs, tensor_or_op.control_inputs)
+    elif isinstance(tensor_or_op, tf.Tensor):
+      return iter([tensor_or_op.op])
+    else:
+      raise TypeError('Expected Tensor or Operation, got {} of type {}'.format(
+          tensor_or_op, type(tensor_or_op)))
 
-  def _maybe_analyze_tensor(self, tensor_or_op, stack=None):
-    """Implements memoization for graph analysis."""
-    if tensor_or_op in self._memoized_analyze_tensor_result:
-      return self._memoized_analyze_tensor_result[tensor_or_op]
-
-    result = self._analyze_tensor_internal(tensor_or_op, stack)
+  def _maybe_analyze_source(self, tensor_or_op):
+    """Returns the memoized `_AnalysisResult` of a source, or None."""
+    if tensor_or_op not in self._source_info_dict:
+      return None
+    source_info = self._source_info_dict[tensor_or_op]
+    # source_info.name may be None but that just means that it relies on an
+    # output of a previous analyzer, so that's ok.
+    result = _AnalysisResult(
+        is_ready_to_run=source_info.is_ready_to_run,
+        path=self._translate_path_fn(source_info.name))
     self._memoized_analyze_tensor_result[tensor_or_op] = result
     return result
 
-  def _analyze_tensor_internal(self, tensor_or_op, stack):
-    """Returns whether a given  `Tensor` or `Operation` is ready to run.
+  def _maybe_analyze_tensor(self, tensor_or_op):
+    """Returns whether a given `Tensor` or `Operation` is ready to run.
 
-    Recursively computes whether a tensor or operation is ready to run, using
-    `source_info_dict` as terminal nodes.  An error is thrown if a table or
-    placeholder is reached: they must be set using source_info_dict.
-    This function is memoized using the _maybe_analyze_tensor method to cache
-    computed values, therefore it should not be called directly.
-    Cycles are ignored (so a cycle is considered ready to run) and cycles are
-    detected using `stack`.
+    Computes whether a tensor or operation is ready to run, using
+    `source_info_dict` as terminal nodes, and memoizes the results for it and
+    all of its ancestors.  An error is thrown if a table or placeholder is
+    reached: they must be set using source_info_dict.
+
+    The graph is traversed depth first using an explicit stack, so that deep
+    graphs don't exceed the recursion limit.  Cycles are ignored (so a cycle is
+    considered ready to run) and cycles are detected using the set of tensors
+    and operations that are being analyzed.
 
     Args:
       tensor_or_op: A `Tensor` or `Operation`.
-      stack: (optional) The tensors or operations that are on the stack (used to
-          avoid cycles).
 
     Returns:
       An _AnalysisResult which includes whether this op or tensor is ready to
@@ -138,45 +165,88 @@ class _GraphAnalyzer(object):
       _UnexpectedTableError: If an initializable table op is encountered.
       _UnexpectedPlaceholderError: If a placeholder is encountered.
     """
-    if tensor_or_op in self._source_info_dict:
-      source_info = self._source_info_dict[tensor_or_op]
-      # source_info.name may be None but that just means that it relies on an
-      # output of a previous analyzer, so that's ok.
-      return _AnalysisResult(
-          is_ready_to_run=source_info.is_ready_to_run,
-          path=self._translate_path_fn(source_info.name))
-
-    if isinstance(tensor_or_op, tf.Operation):
-      if tensor_or_op.type in _INITIALIZABLE_TABLE_OP_TYPES:
-        raise _UnexpectedTableError(tensor_or_op)
-      if tensor_or_op.type == 'Placeholder':
-        raise _UnexpectedPlaceholderError(tensor_or_op)
-      parents = itertools.chain(tensor_or_op.inputs,
-                                tensor_or_op.control_inputs)
-    elif isinstance(tensor_or_op, tf.Tensor):
-      parents = [tensor_or_op.op]
-    else:
-      raise TypeError('Expected Tensor or Operation, got {} of type {}'.format(
-          tensor_or_op, type(tensor_or_op)))
-
-    # Check that all parents are ready to run, ignoring parents that result
-    # in a loop.  We assume that any loop is a valid while loop and so it will
-    # be able to run as long as all the other parents are ready.
-    if stack is None:
-      stack = []
-    stack.append(tensor_or_op)
-    parent_results = [
-        self._maybe_analyze_tensor(parent, stack)
-        for parent in parents
-        if parent not in stack
-    ]
-    result = _AnalysisResult(
-        all(res.is_ready_to_run for res in parent_results),
-        self._translate_path_fn(
-            tensor_or_op, parents=[res.path for res in parent_results]))
-    assert tensor_or_op is stack.pop()
+    memoized_results = self._memoized_analyze_tensor_result
+    if tensor_or_op in memoized_results:
+      return memoized_results[tensor_or_op]
+    source_result = self._maybe_analyze_source(tensor_or_op)
+    if source_result is not None:
+      return source_result
+
+    # Each stack frame holds a tensor or op, an iterator over its parents, and
+    # the results of those parents that were analyzed so far.
+    stack = [(tensor_or_op, self._get_parents(tensor_or_op), [])]
+    in_progress = {tensor_or_op}
+    while True:
+      current, parents, parent_results = stack[-1]
+      next_parent = None
+      for parent in parents:
+        self._children[parent].add(current)
+        # Check that all parents are ready to run, ignoring parents that result
+        # in a loop.  We assume that any loop is a valid while loop and so it
+        # will be able to run as long as all the other parents are ready.
+        if parent in in_progress:
+          continue
+        parent_result = memoized_results.get(parent)
+        if parent_result is None:
+          parent_result = self._maybe_analyze_source(parent)
+        if parent_result is None:
+          next_parent = parent
+          break
+        parent_results.append(parent_result)
+
+      if next_parent is not None:
+        stack.append((next_parent, self._get_parents(next_parent), []))
+        in_progress.add(next_parent)
+        continue
+
+      if current in self._stale_paths:
+        path = self._stale_paths.pop(current)
+      else:
+        path = self._translate_path_fn(
+            current, parents=[res.path for res in parent_results])
+      result = _AnalysisResult(
+          all(res.is_ready_to_run for res in parent_results), path)
+      memoized_results[current] = result
+      stack.pop()
+      in_progress.remove(current)
+      if not stack:
+        return result
+      stack[-1][2].append(result)
+
+  def update_source_info(self, source, source_info):
+    """Updates a source, invalidating the results that depend on it.
+
+    Results of tensors and operations that don't depend on `source` are kept.
+    If only the readiness of `source` changed, the paths of those that depend on
+    it are kept as well, and only their readiness is recomputed.
 
-    return result
+    Args:
+      source: A `Tensor` or `Operation`.
+      source_info: A `_SourceInfo` for `source`.
+    """
+    previous_source_info = self._source_info_dict.get(source)
+    if previous_source_info == source_info:
+      return
+    self._source_info_dict[source] = source_info
+    keep_paths = (
+        previous_source_info is not None and
+        previous_source_info.name == source_info.name)
+    self._memoized_analyze_tensor_result.pop(source, None)
+
+    visited = set()
+    to_invalidate = list(self._children.get(source, ()))
+    while to_invalidate:
+      tensor_or_op = to_invalidate.pop()
+      if tensor_or_op in visited:
+        continue
+      visited.add(tensor_or_op)
+      result = self._memoized_analyze_tensor_result.pop(tensor_or_op, None)
+      if keep_paths:
+        if result is not None:
+          self._stale_paths[tensor_or_op] = result.path
+      else:
+        self._stale_paths.pop(tensor_or_op, None)
+      to_invalidate.extend(self._children.get(tensor_or_op, ()))
 
   def ready_to_run(self, tensor_or_op):
     """Determine if a given tensor or op is ready to run.
@@ -277,6 +347,10 @@ class InitializableGraphAnalyzer(object):
     if translate_path_fn is None:
       translate_path_fn = lambda x, parents=None: None
 
+    self._translate_path_fn = translate_path_fn
+    self._table_init_ops = graph.get_collection(
+        tf.compat.v1.GraphKeys.TABLE_INITIALIZERS)
+    self._replaced_tensors_ready = dict(replaced_tensors_ready)
     self._ready_table_initializers = []
 
     initial_source_infos_dict = self._make_source_infos_dict(
@@ -285,27 +359,60 @@ class InitializableGraphAnalyzer(object):
     # Determine which table initializers are ready, based on the replaced
     # tensors. Since no input tensors are fed during table initialization, we do
     # not set the value of any tensors in `input_signature`.
-    graph_analyzer_for_table_init = _GraphAnalyzer(initial_source_infos_dict,
-                                                   translate_path_fn)
+    self._graph_analyzer_for_table_init = _GraphAnalyzer(
+        initial_source_infos_dict, translate_path_fn)
     complete_source_info_dict = self._make_source_infos_dict(
         input_signature, replaced_tensors_ready)
 
-    for table_init_op in graph.get_collection(
-        tf.compat.v1.GraphKeys.TABLE_INITIALIZERS):
+    # Tensors are analyzed once the tables have been initialized.
+    self._graph_analyzer = _GraphAnalyzer(complete_source_info_dict,
+                                          translate_path_fn)
+    self._update_table_initializers()
+
+  def _update_table_initializers(self):
+    """Determines which table initializers are ready to run."""
+    self._ready_table_initializers = []
+    for table_init_op in self._table_init_ops:
       source_info = self._get_table_init_op_source_info(
-          table_init_op, graph_analyzer_for_table_init, translate_path_fn)
+          table_init_op, self._graph_analyzer_for_table_init,
+          self._translate_path_fn)
 
       # We are using the table init op information and the table op information,
       # since that is a unique description of the table op.
       table_op = table_init_op.inputs[0].op
-      complete_source_info_dict[table_op] = source_info
+      self._graph_analyzer.update_source_info(table_op, source_info)
       if source_info.is_ready_to_run:
         self._ready_table_initializers.append(table_init_op)
 
-    # Now determine which tensors are ready to run once the table has been
-    # initialized.
-    self._graph_analyzer = _GraphAnalyzer(complete_source_info_dict,
-                                          translate_path_fn)
+  def update_replaced_tensors_ready(self, replaced_tensors_ready):
+    """Updates the readiness of replaced tensors, e.g. for the next phase.
+
+    This is equivalent to creating a new `InitializableGraphAnalyzer` with the
+    given `replaced_tensors_ready`, but only the tensors and ops that depend on
+    replaced tensors whose readiness changed are analyzed again, and their
+    paths are not recomputed.
+
+    Args:
+      replaced_tensors_ready: a dict from `Tensor` to bool indicating whether a
+          `Tensor` is ready in this phase.  Its keys must be the same as those
+          this analyzer was created with.
+
+    Raises:
+      ValueError: If the replaced tensors are not the same as before.
+    """
+    if set(replaced_tensors_ready) != set(self._replaced_tensors_ready):
+      raise ValueError(
+          'The replaced tensors cannot change, only their readiness')
+    for tensor_or_op, is_ready in six.iteritems(replaced_tensors_ready):
+      if self._replaced_tensors_ready[tensor_or_op] == is_ready:
+        continue
+      self._replaced_tensors_ready[tensor_or_op] = is_ready
+      for component in _decompose_tensor_or_sparse_tensor(tensor_or_op):
+        source_info = _SourceInfo(is_ready, None)
+        self._graph_analyzer_for_table_init.update_source_info(
+            component, source_info)
+        self._graph_analyzer.update_source_info(component, source_info)
+    self._update_table_initializers()
 
   def _make_source_infos_dict(self, input_signature, replaced_tensors_ready):
     """Builds a dictionary from source tensors to _SourceInfos.
@@ -19,6 +19,7 @@ from __future__ import print_function
 
 import abc
 import collections
+import sys
 
 # GOOGLE-INITIALIZATION
 
@@ -465,6 +466,44 @@ class GraphToolsTest(test_case.TransformTestCase):
       tensor = tensors[fetch]
       graph_analyzer.ready_to_run(tensor)
 
+  def testInitializableGraphAnalyzerUpdateReplacedTensorsReady(self):
+    tensors = _create_graph_with_y_function_of_x_and_table()
+    translated = []
+
+    def translate_path_fn(x, parents=None):
+      translated.append(x)
+      if isinstance(x, (tf.Operation, tf.Tensor)):
+        return '{}({})'.format(x.name, ','.join(map(str, parents or [])))
+      return x
+
+    graph_analyzer = graph_tools.InitializableGraphAnalyzer(
+        tf.compat.v1.get_default_graph(), {'x': tensors['x']},
+        {tensors['filename']: False}, translate_path_fn)
+    self.assertFalse(graph_analyzer.ready_to_run(tensors['y']))
+    self.assertEqual(len(graph_analyzer.ready_table_initializers), 0)
+    path = graph_analyzer.get_unique_path(tensors['y'])
+
+    del translated[:]
+    graph_analyzer.update_replaced_tensors_ready({tensors['filename']: True})
+    self.assertTrue(graph_analyzer.ready_to_run(tensors['y']))
+    self.assertEqual(len(graph_analyzer.ready_table_initializers), 1)
+    self.assertEqual(graph_analyzer.get_unique_path(tensors['y']), path)
+    # Paths of tensors that depend on the updated source are not recomputed.
+    self.assertNotIn(tensors['y'], translated)
+
+    with self.assertRaisesRegexp(ValueError, 'replaced tensors cannot change'):
+      graph_analyzer.update_replaced_tensors_ready({})
+
+  def testInitializableGraphAnalyzerDeepGraph(self):
+    x = tf.compat.v1.placeholder(tf.int64)
+    y = x
+    # The graph is deeper than the recursion limit.
+    for _ in range(sys.getrecursionlimit()):
+      y = tf.add(y, 1)
+    graph_analyzer = graph_tools.InitializableGraphAnalyzer(
+        tf.compat.v1.get_default_graph(), {'x': x}, {})
+    self.assertTrue(graph_analyzer.ready_to_run(y))
+
 
 class GraphToolsTestUniquePath(test_case.TransformTestCase):
 
@@ -18,6 +18,7 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import collections
 import itertools
 
 # GOOGLE-INITIALIZATION
@@ -32,6 +33,21 @@ import tensorflow as tf
 _CACHED_EMPTY_ARRAY_BY_DTYPE = {}
 
 
+class VarLenBatch(
+    collections.namedtuple('VarLenBatch', ['values', 'row_lengths'])):
+  """A batch of variable length values of a column, in columnar form.
+
+  Coders which decode batches of records into a columnar batch return a dict
+  from column name to an ndarray of shape [batch_size] + shape for
+  `FixedLenFeature`s, and a `VarLenBatch` for `VarLenFeature`s and for the
+  index and value columns of `SparseFeature`s.
+
+  Fields:
+    values: A 1-d ndarray of the values of all rows, concatenated.
+    row_lengths: A 1-d int64 ndarray of the number of values in each row.
+  """
+
+
 def _get_empty_array(dtype):
   if dtype not in _CACHED_EMPTY_ARRAY_BY_DTYPE:
     empty_array = np.array([], dtype)
@@ -171,6 +187,82 @@ def make_feed_list(column_names, schema, instances):
   return result
 
 
+def _var_len_batch_indices(batch, index_values=None):
+  """Returns the indices of a `SparseTensorValue` batch of a `VarLenBatch`.
+
+  Args:
+    batch: A `VarLenBatch`.
+    index_values: (Optional) the values of the second dimension of the indices,
+      by default the position of each value within its row.
+
+  Returns:
+    An int64 ndarray of shape [num_values, 2].
+  """
+  row_lengths = np.asarray(batch.row_lengths, dtype=np.int64)
+  row_ids = np.repeat(np.arange(len(row_lengths), dtype=np.int64), row_lengths)
+  if index_values is None:
+    row_starts = np.cumsum(row_lengths) - row_lengths
+    index_values = (
+        np.arange(len(row_ids), dtype=np.int64) -
+        np.repeat(row_starts, row_lengths))
+  return np.stack([row_ids, np.asarray(index_values, dtype=np.int64)], axis=1)
+
+
+def make_feed_list_from_columns(column_names, schema, columns):
+  """Creates a feed list for passing a columnar batch to the graph.
+
+  This is equivalent to `make_feed_list` for a columnar batch, as returned by
+  the `decode_batch` method of coders, without the intermediate instances.
+
+  Args:
+    column_names: A list of column names.
+    schema: A `Schema` object.
+    columns: A dict from column name to an ndarray of shape
+      [batch_size] + shape for `FixedLenFeature`s, and to a `VarLenBatch` for
+      `VarLenFeature`s and for the index and value columns of
+      `SparseFeature`s.
+
+  Returns:
+    A list of batches in the format required by a tf `Callable`.
+
+  Raises:
+    ValueError: If `schema` is invalid, or a `SparseFeature` has invalid
+      indices.
+  """
+  result = []
+  feature_spec = schema.as_feature_spec()
+  for name in column_names:
+    spec = feature_spec[name]
+    if isinstance(spec, tf.io.FixedLenFeature):
+      feed_value = columns[name]
+
+    elif isinstance(spec, tf.io.VarLenFeature):
+      batch = columns[name]
+      max_index = np.max(batch.row_lengths) if len(batch.row_lengths) else 0
+      feed_value = tf.compat.v1.SparseTensorValue(
+          _var_len_batch_indices(batch), batch.values,
+          (len(batch.row_lengths), max_index))
+
+    elif isinstance(spec, tf.io.SparseFeature):
+      # TODO(KesterTong): Add support for N-d SparseFeatures.
+      indices = columns[spec.index_key]
+      values = columns[spec.value_key]
+      if not np.array_equal(indices.row_lengths, values.row_lengths):
+        raise ValueError(
+            'Sparse column {} has indices and values of different lengths: '
+            'values: {}, indices: {}'.format(name, values, indices))
+      _check_valid_sparse_batch(indices.values, spec.size, name)
+      feed_value = tf.compat.v1.SparseTensorValue(
+          _var_len_batch_indices(indices, indices.values), values.values,
+          (len(indices.row_lengths), spec.size))
+
+    else:
+      raise ValueError('Invalid feature spec {}.'.format(spec))
+    result.append(feed_value)
+
+  return result
+
+
 def to_instance_dicts(schema, fetches):
   """Maps the values fetched by `tf.Session.run` to the internal batch format.
 
@@ -299,6 +391,122 @@ def to_instance_dicts(schema, fetches):
           for instance_values in zip(*six.itervalues(batch_dict))]
 
 
+def _sparse_batch_row_lengths(sparse_value):
+  """Returns the row lengths of a `SparseTensorValue` batch of rank 2.
+
+  Args:
+    sparse_value: A `SparseTensorValue` representing a batch of N sparse
+      instances. The indices of the SparseTensorValue are expected to be
+      sorted by row order.
+
+  Returns:
+    An int64 ndarray of shape [N].
+
+  Raises:
+    ValueError: If `sparse_value` is not of rank 2, or contains out-of-order
+      indices.
+  """
+  batch_indices, _, batch_shape = sparse_value
+  batch_indices = np.asarray(batch_indices, dtype=np.int64)
+  if len(batch_shape) != 2:
+    raise ValueError(
+        'Encountered a SparseTensorValue of rank {} that cannot be converted '
+        'to columns.'.format(len(batch_shape)))
+  rows = batch_indices[:, 0]
+  out_of_order = np.flatnonzero(rows[1:] < rows[:-1])
+  if len(out_of_order):  # pylint: disable=g-explicit-length-test
+    raise ValueError('Encountered out-of-order sparse index: {}.'.format(
+        batch_indices[out_of_order[0] + 1]))
+  return np.bincount(rows, minlength=batch_shape[0]).astype(np.int64)
+
+
+def to_columns(schema, fetches):
+  """Maps the values fetched by `tf.Session.run` to a columnar batch.
+
+  This is the columnar equivalent of `to_instance_dicts`.  The values of
+  `FixedLenFeature`s, and the values and indices of `SparseTensorValue`s are
+  not copied.
+
+  Args:
+    schema: A `Schema` object.
+    fetches: A dict representing a batch of data, as returned by `Session.run`.
+
+  Returns:
+    A dict from column name to an ndarray of shape [batch_size] + shape for
+    `FixedLenFeature`s, and to a `VarLenBatch` for `VarLenFeature`s and for the
+    index and value columns of `SparseFeature`s, as accepted by
+    `make_feed_list_from_columns`.
+
+  Raises:
+    ValueError: If `schema` is invalid, or the batch sizes of `fetches` are
+      inconsistent.
+  """
+  columns = {}
+  batch_sizes = {}
+  feature_spec = schema.as_feature_spec()
+  for name, value in six.iteritems(fetches):
+    spec = feature_spec[name]
+    if isinstance(spec, tf.io.FixedLenFeature):
+      columns[name] = value
+      batch_sizes[name] = value.shape[0]
+
+    elif isinstance(spec, tf.io.VarLenFeature):
+      if not isinstance(value, tf.compat.v1.SparseTensorValue):
+        raise ValueError(
+            'Expected a SparseTensorValue, but got {}'.format(value))
+      if len(value.dense_shape) != 2:
+        raise ValueError('Encountered a SparseTensorValue that cannot be '
+                         'decoded by ListColumnRepresentation.')
+      batch = VarLenBatch(value.values, _sparse_batch_row_lengths(value))
+      if not np.array_equal(
+          np.asarray(value.indices, dtype=np.int64)[:, 1],
+          _var_len_batch_indices(batch)[:, 1]):
+        raise ValueError('Encountered a SparseTensorValue that cannot be '
+                         'decoded by ListColumnRepresentation.')
+      columns[name] = batch
+      batch_sizes[name] = len(batch.row_lengths)
+
+    elif isinstance(spec, tf.io.SparseFeature):
+      if not isinstance(value, tf.compat.v1.SparseTensorValue):
+        raise ValueError(
+            'Expected a SparseTensorValue, but got {}'.format(value))
+      # TODO(KesterTong): Add support for N-d SparseFeatures.
+      row_lengths = _sparse_batch_row_lengths(value)
+      columns[spec.index_key] = VarLenBatch(
+          np.asarray(value.indices, dtype=np.int64)[:, 1], row_lengths)
+      columns[spec.value_key] = VarLenBatch(value.values, row_lengths)
+      batch_sizes[name] = len(row_lengths)
+
+    else:
+      raise ValueError('Invalid feature spec {}.'.format(spec))
+
+  # Check batch size is the same for each output.  Note this assumes that
+  # fetches is not empty.
+  batch_size = next(six.itervalues(batch_sizes))
+  for name, batch_size_for_name in six.iteritems(batch_sizes):
+    if batch_size_for_name != batch_size:
+      raise ValueError(
+          'Inconsistent batch sizes: "{}" had batch dimension {}, "{}" had'
+          ' batch dimension {}'.format(name, batch_size_for_name,
+                                       next(six.iterkeys(batch_sizes)),
+                                       batch_size))
+  return columns
+
+
+def get_columns_batch_size(columns):
+  """Returns the number of instances in a non-empty columnar batch.
+
+  Args:
+    columns: A columnar batch, see `make_feed_list_from_columns`.  Columns
+      which are neither a `VarLenBatch` nor an ndarray, e.g. of pass-through
+      keys, are lists of the values of each instance.
+  """
+  column = next(six.itervalues(columns))
+  if isinstance(column, VarLenBatch):
+    return len(column.row_lengths)
+  return len(column)
+
+
 # TODO(b/36040669): Consider moving this to where it can be shared with coders.
 def check_valid_sparse_tensor(indices, values, size, name):
   # Check that all indices are in range.
@@ -316,6 +524,31 @@ def check_valid_sparse_tensor(indices, values, size, name):
         'values: {}, indices: {}'.format(name, values, indices))
 
 
+def _check_valid_sparse_batch(indices, size, name):
+  """Like `check_valid_sparse_tensor` for the indices of a columnar batch.
+
+  The indices are checked with vectorized numpy operations, rather than by
+  iterating over them.  The caller is responsible for checking that the
+  indices and values have the same lengths.
+
+  Args:
+    indices: A 1-d ndarray of the indices of all instances in a batch.
+    size: The size of the `SparseFeature`.
+    name: The name of the `SparseFeature`.
+
+  Raises:
+    ValueError: If an index is out of the range [0, size).
+  """
+  indices = np.asarray(indices)
+  if indices.size:
+    i_min, i_max = np.min(indices), np.max(indices)
+    if i_min < 0 or i_max >= size:
+      i_bad = i_min if i_min < 0 else i_max
+      raise ValueError(
+          'Sparse column {} has index {} out of range [0, {})'.format(
+              name, i_bad, size))
+
+
 def copy_tensors(tensors):
   """Makes deep copies of a dict of tensors.
 
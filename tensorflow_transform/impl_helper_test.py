@@ -20,6 +20,7 @@ from __future__ import print_function
 # GOOGLE-INITIALIZATION
 
 import numpy as np
+import six
 import tensorflow as tf
 from tensorflow_transform import impl_helper
 from tensorflow_transform import test_case
@@ -241,6 +242,17 @@ _MAKE_FEED_LIST_ERROR_CASES = [
             'val': [1.0, 2.0]
         }],
         error_msg='has index .* out of range'),
+    dict(
+        testcase_name='sparse_feature_index_equal_to_size',
+        feature_spec={'a': tf.io.SparseFeature('idx', 'val', tf.float32, 10)},
+        instances=[{
+            'idx': [2],
+            'val': [1.0]
+        }, {
+            'idx': [10],
+            'val': [2.0]
+        }],
+        error_msg='has index 10 out of range'),
     dict(
         testcase_name='sparse_feature_indices_and_values_different_lengths',
         feature_spec={'a': tf.io.SparseFeature('idx', 'val', tf.float32, 10)},
@@ -320,6 +332,31 @@ _TO_INSTANCE_DICT_ERROR_CASES = [
 ]
 
 
+def _instances_to_columns(feature_spec, instances):
+  """Converts instances to the columnar batch format of coders."""
+  result = {}
+
+  def var_len_batch(name, dtype):
+    values = [
+        [] if instance[name] is None else instance[name]
+        for instance in instances
+    ]
+    return impl_helper.VarLenBatch(
+        np.array([v for row in values for v in row], dtype.as_numpy_dtype),
+        np.array([len(row) for row in values], np.int64))
+
+  for name, spec in six.iteritems(feature_spec):
+    if isinstance(spec, tf.io.FixedLenFeature):
+      result[name] = np.array([instance[name] for instance in instances],
+                              spec.dtype.as_numpy_dtype)
+    elif isinstance(spec, tf.io.VarLenFeature):
+      result[name] = var_len_batch(name, spec.dtype)
+    else:
+      result[spec.index_key] = var_len_batch(spec.index_key, tf.int64)
+      result[spec.value_key] = var_len_batch(spec.value_key, spec.dtype)
+  return result
+
+
 class ImplHelperTest(test_case.TransformTestCase):
 
   def test_feature_spec_as_batched_placeholders(self):
@@ -364,6 +401,30 @@ class ImplHelperTest(test_case.TransformTestCase):
     with self.assertRaisesRegexp(error_type, error_msg):
       impl_helper.make_feed_list(tensors, schema, instances)
 
+  @test_case.named_parameters(*(_ROUNDTRIP_CASES + _MAKE_FEED_DICT_CASES))
+  def test_make_feed_list_from_columns(self, feature_spec, instances,
+                                       feed_dict):
+    schema = dataset_schema.from_feature_spec(feature_spec)
+    feature_names = list(feature_spec.keys())
+    expected_feed_list = [feed_dict[key] for key in feature_names]
+    np.testing.assert_equal(
+        impl_helper.make_feed_list_from_columns(
+            feature_names, schema,
+            _instances_to_columns(feature_spec, instances)),
+        expected_feed_list)
+
+  @test_case.named_parameters(*_MAKE_FEED_LIST_ERROR_CASES[1:])
+  def test_make_feed_list_from_columns_error(self,
+                                             feature_spec,
+                                             instances,
+                                             error_msg,
+                                             error_type=ValueError):
+    schema = dataset_schema.from_feature_spec(feature_spec)
+    columns = _instances_to_columns(feature_spec, instances)
+    with self.assertRaisesRegexp(error_type, error_msg):
+      impl_helper.make_feed_list_from_columns(
+          list(feature_spec.keys()), schema, columns)
+
   @test_case.named_parameters(*_ROUNDTRIP_CASES)
   def test_to_instance_dicts(self, feature_spec, instances, feed_dict):
     schema = dataset_schema.from_feature_spec(feature_spec)
@@ -378,6 +439,22 @@ class ImplHelperTest(test_case.TransformTestCase):
     with self.assertRaisesRegexp(error_type, error_msg):
       impl_helper.to_instance_dicts(schema, feed_dict)
 
+  @test_case.named_parameters(*_ROUNDTRIP_CASES)
+  def test_to_columns(self, feature_spec, instances, feed_dict):
+    schema = dataset_schema.from_feature_spec(feature_spec)
+    columns = impl_helper.to_columns(schema, feed_dict)
+    np.testing.assert_equal(
+        columns, _instances_to_columns(feature_spec, instances))
+    self.assertEqual(impl_helper.get_columns_batch_size(columns),
+                     len(instances))
+
+  @test_case.named_parameters(*_TO_INSTANCE_DICT_ERROR_CASES)
+  def test_to_columns_error(self, feature_spec, feed_dict, error_msg,
+                            error_type=ValueError):
+    schema = dataset_schema.from_feature_spec(feature_spec)
+    with self.assertRaisesRegexp(error_type, error_msg):
+      impl_helper.to_columns(schema, feed_dict)
+
   def test_copy_tensors_produces_different_tensors(self):
     tensors = {
         'dense':
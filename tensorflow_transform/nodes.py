@@ -229,7 +229,6 @@ class Traverser(object):
 
   def __init__(self, visitor):
     self._cached_value_nodes_values = {}
-    self._stack = []
     self._visitor = visitor
 
   def visit_value_node(self, value_node):
@@ -259,15 +258,49 @@ class Traverser(object):
     return self._cached_value_nodes_values[value_node]
 
   def _visit_operation(self, operation):
-    """Visit an `OperationNode`."""
-    if operation in self._stack:
-      cycle = self._stack[self._stack.index(operation):] + [operation]
-      # For readability, just print the label of `operation_def`s
-      cycle = ', '.join(operation.operation_def.label for operation in cycle)
-      raise AssertionError('Cycle detected: [{}]'.format(cycle))
-    self._stack.append(operation)
-    input_values = tuple(map(self._maybe_visit_value_node, operation.inputs))
-    assert operation is self._stack.pop()
+    """Visit an `OperationNode` and its ancestors which were not visited yet.
+
+    Operations are visited in the same (depth first) order as a recursive
+    traversal would, but using an explicit stack so that the depth of the graph
+    is not limited by the recursion limit.
+
+    Args:
+      operation: An `OperationNode`.
+    """
+    # Each stack frame holds an operation and an iterator over its inputs that
+    # haven't been checked yet.
+    stack = [(operation, iter(operation.inputs))]
+    in_progress = {operation}
+    while stack:
+      current, inputs = stack[-1]
+      next_operation = None
+      for value_node in inputs:
+        if value_node not in self._cached_value_nodes_values:
+          next_operation = value_node.parent_operation
+          break
+
+      if next_operation is None:
+        stack.pop()
+        in_progress.remove(current)
+        self._apply_visitor(current)
+        continue
+
+      if next_operation in in_progress:
+        stack_operations = [frame[0] for frame in stack]
+        cycle = stack_operations[stack_operations.index(next_operation):] + [
+            next_operation
+        ]
+        # For readability, just print the label of `operation_def`s
+        cycle = ', '.join(operation.operation_def.label for operation in cycle)
+        raise AssertionError('Cycle detected: [{}]'.format(cycle))
+      stack.append((next_operation, iter(next_operation.inputs)))
+      in_progress.add(next_operation)
+
+  def _apply_visitor(self, operation):
+    """Visits an `OperationNode` whose inputs have all been visited."""
+    input_values = tuple(
+        self._cached_value_nodes_values[value_node]
+        for value_node in operation.inputs)
     output_values = self._visitor.visit(operation.operation_def, input_values)
     outputs = operation.outputs
 
@@ -18,6 +18,8 @@ from __future__ import division
 from __future__ import print_function
 
 import collections
+import sys
+import time
 
 # GOOGLE-INITIALIZATION
 
@@ -49,6 +51,44 @@ class _Identity(collections.namedtuple('_Identity', ['label']),
   pass
 
 
+class _CountingVisitor(nodes.Visitor):
+  """Visitor whose value for each node is the number of nodes visited."""
+
+  def __init__(self):
+    self.num_visited = 0
+
+  def visit(self, operation_def, input_values):
+    self.num_visited += 1
+    return (self.num_visited,) * operation_def.num_outputs
+
+  def validate_value(self, value):
+    assert isinstance(value, int)
+
+
+def _make_chain_graph(num_operations):
+  """Returns the output of a chain of `num_operations` operations."""
+  value_node = nodes.apply_operation(_Constant, value='a', label='Constant[a]')
+  for i in range(1, num_operations):
+    value_node = nodes.apply_operation(
+        _Identity, value_node, label='Identity[{}]'.format(i))
+  return value_node
+
+
+def _make_dag_graph(num_operations):
+  """Returns the output of a DAG where operations have many descendants."""
+  value_nodes = [
+      nodes.apply_operation(_Constant, value='a', label='Constant[a]')
+  ]
+  for i in range(1, num_operations):
+    value_nodes.append(
+        nodes.apply_operation(
+            _Concat,
+            value_nodes[i - 1],
+            value_nodes[i // 2],
+            label='Concat[{}]'.format(i)))
+  return value_nodes[-1]
+
+
 class NodesTest(test_case.TransformTestCase):
 
   def testApplyOperationWithKwarg(self):
@@ -213,6 +253,19 @@ class NodesTest(test_case.TransformTestCase):
         'Cycle detected: [Identity[2], Identity[1], Identity[0], Identity[2]]'):
       nodes.Traverser(mock_visitor).visit_value_node(x_2)
 
+  def testTraverserDeepGraph(self):
+    # The graph is deeper than the recursion limit.
+    num_operations = sys.getrecursionlimit() * 2
+    visitor = _CountingVisitor()
+    self.assertEqual(
+        nodes.Traverser(visitor).visit_value_node(
+            _make_chain_graph(num_operations)), num_operations)
+
+  def testTraverserDAG(self):
+    visitor = _CountingVisitor()
+    self.assertEqual(
+        nodes.Traverser(visitor).visit_value_node(_make_dag_graph(100)), 100)
+
   def testGetDotGraph(self):
     a = nodes.apply_operation(_Constant, value='a', label='Constant[a]')
     b = nodes.apply_operation(_Constant, value='b', label='Constant[b]')
@@ -242,5 +295,34 @@ node [shape=Mrecord];
         msg='Result dot graph is:\n{}'.format(dot_string))
 
 
+class TraverserBenchmark(tf.test.Benchmark):
+  """Benchmarks `nodes.Traverser` on large synthetic graphs.
+
+  Run with `--benchmarks=TraverserBenchmark`.
+  """
+
+  def _benchmark_traverser(self, name, value_node, num_operations):
+    visitor = _CountingVisitor()
+    start = time.time()
+    nodes.Traverser(visitor).visit_value_node(value_node)
+    wall_time = time.time() - start
+    assert visitor.num_visited == num_operations
+    self.report_benchmark(
+        name=name,
+        iters=1,
+        wall_time=wall_time,
+        extras={'num_operations': num_operations})
+
+  def benchmarkTraverseChain(self):
+    num_operations = 100000
+    self._benchmark_traverser('chain', _make_chain_graph(num_operations),
+                              num_operations)
+
+  def benchmarkTraverseDAG(self):
+    num_operations = 100000
+    self._benchmark_traverser('dag', _make_dag_graph(num_operations),
+                              num_operations)
+
+
 if __name__ == '__main__':
   test_case.main()
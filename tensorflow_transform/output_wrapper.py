@@ -29,6 +29,34 @@ from tensorflow_transform.tf_metadata import metadata_io
 from tensorflow_metadata.proto.v0 import schema_pb2
 
 
+# Marker files which WriteTransformFn writes into the transform_fn directory
+# before copying its files, and once all of them are copied.
+TRANSFORM_FN_WRITE_STARTED_FILE = '_WRITE_STARTED'
+TRANSFORM_FN_WRITE_COMMITTED_FILE = '_SUCCESS'
+
+
+def check_transform_fn_committed(transform_fn_dir):
+  """Raises a ValueError if the transform_fn dir is still being written.
+
+  A transform_fn directory without any marker files was written before the
+  markers were introduced, or by other means, and is considered complete.
+
+  Args:
+    transform_fn_dir: The path of a transform_fn directory.
+
+  Raises:
+    ValueError: If `transform_fn_dir` is being written by `WriteTransformFn`,
+      or its write failed.
+  """
+  if (tf.io.gfile.exists(
+      os.path.join(transform_fn_dir, TRANSFORM_FN_WRITE_STARTED_FILE)) and
+      not tf.io.gfile.exists(
+          os.path.join(transform_fn_dir, TRANSFORM_FN_WRITE_COMMITTED_FILE))):
+    raise ValueError(
+        'The transform_fn at {} is incomplete, its write is still in progress '
+        'or failed'.format(transform_fn_dir))
+
+
 class TFTransformOutput(object):
   """A wrapper around the output of the tf.Transform.
 
@@ -48,6 +76,7 @@ class TFTransformOutput(object):
     # Lazily constructed properties.
     self._transformed_metadata = None
     self._raw_metadata = None
+    self._transform_fn_committed = False
 
   @property
   def transformed_metadata(self):
@@ -61,7 +90,12 @@ class TFTransformOutput(object):
   @property
   def transform_savedmodel_dir(self):
     """A python str."""
-    return os.path.join(self._transform_output_dir, self.TRANSFORM_FN_DIR)
+    transform_fn_dir = os.path.join(self._transform_output_dir,
+                                    self.TRANSFORM_FN_DIR)
+    if not self._transform_fn_committed:
+      check_transform_fn_committed(transform_fn_dir)
+      self._transform_fn_committed = True
+    return transform_fn_dir
 
   def transformed_feature_spec(self):
     """Returns a feature_spec for the transformed features.
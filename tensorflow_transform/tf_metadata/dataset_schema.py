@@ -32,15 +32,22 @@ class Schema(object):
   This is an in-memory representation that may be serialized and deserialized to
   and from a variety of disk representations.
 
+  The feature spec and domains of the schema proto are computed once, when
+  they are first needed, since this is expensive for schemas with many features.
+  The schema proto is copied on construction, and copies of the cached results
+  are returned, so the cache can't be invalidated by mutations.
+
   Args:
     column_schemas: (optional) A dict from logical column names to
         `ColumnSchema`s.
   """
 
   def __init__(self, column_schemas):
+    self._feature_spec_and_domains = None
     if isinstance(column_schemas, schema_pb2.Schema):
       # NOTE: users should not rely on this, for internal use only.
-      self._schema_proto = column_schemas
+      self._schema_proto = schema_pb2.Schema()
+      self._schema_proto.CopyFrom(column_schemas)
     else:
       feature_spec = {name: spec
                       for name, (_, spec) in column_schemas.items()}
@@ -66,6 +73,13 @@ class Schema(object):
   # e.g. new_schema = make_parseable(old_schema).  As it stands,
   # as_feature_spec() may return dtypes that tf.parse_example doesn't support.
 
+  def _get_feature_spec_and_domains(self):
+    # Computing the result twice in concurrent calls is harmless.
+    if self._feature_spec_and_domains is None:
+      self._feature_spec_and_domains = schema_utils.schema_as_feature_spec(
+          self._schema_proto)
+    return self._feature_spec_and_domains
+
   def as_feature_spec(self):
     """Returns a representation of this Schema as a feature spec.
 
@@ -75,13 +89,17 @@ class Schema(object):
     Returns:
       A representation of this Schema as a feature spec.
     """
-    return schema_utils.schema_as_feature_spec(
-        self._schema_proto)[0]
+    # Returns a copy so that callers can modify the result.
+    return dict(self._get_feature_spec_and_domains().feature_spec)
 
   def domains(self):
     """Returns the domains for this feature spec."""
-    return schema_utils.schema_as_feature_spec(
-        self._schema_proto)[1]
+    # Returns copies so that callers can modify the result.
+    result = {}
+    for name, domain in self._get_feature_spec_and_domains().domains.items():
+      result[name] = type(domain)()
+      result[name].CopyFrom(domain)
+    return result
 
   # Implement reduce so that the proto is serialized using proto serialization
   # instead of the default pickling.
@@ -89,6 +107,7 @@ class Schema(object):
     return self._schema_proto.SerializeToString()
 
   def __setstate__(self, state):
+    self._feature_spec_and_domains = None
     self._schema_proto = schema_pb2.Schema()
     self._schema_proto.MergeFromString(state)
 
@@ -18,12 +18,15 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import pickle
+
 # GOOGLE-INITIALIZATION
 import tensorflow as tf
 
 from tensorflow_transform.tf_metadata import test_common
 from tensorflow_transform.tf_metadata import dataset_schema as sch
 import unittest
+from tensorflow_metadata.proto.v0 import schema_pb2
 
 
 class DatasetSchemaTest(unittest.TestCase):
@@ -33,6 +36,41 @@ class DatasetSchemaTest(unittest.TestCase):
     generated_feature_spec = schema.as_feature_spec()
     self.assertEqual(test_common.test_feature_spec, generated_feature_spec)
 
+  def test_feature_spec_and_domains_are_cached(self):
+    schema = sch.from_feature_spec(
+        test_common.test_feature_spec,
+        {'fixed_int': schema_pb2.IntDomain(min=0, max=5)})
+    feature_spec = schema.as_feature_spec()
+    domains = schema.domains()
+    del feature_spec['fixed_int']
+    domains['fixed_int'].max = 10
+    self.assertEqual(test_common.test_feature_spec, schema.as_feature_spec())
+    self.assertEqual({'fixed_int': schema_pb2.IntDomain(min=0, max=5)},
+                     schema.domains())
+
+    # The schema proto is copied on construction.
+    schema_proto = schema_pb2.Schema()
+    schema_proto.CopyFrom(schema._schema_proto)
+    schema_from_proto = sch.Schema(schema_proto)
+    self.assertEqual(test_common.test_feature_spec,
+                     schema_from_proto.as_feature_spec())
+    del schema_proto.feature[:]
+    self.assertEqual(test_common.test_feature_spec,
+                     schema_from_proto.as_feature_spec())
+    self.assertEqual(schema, schema_from_proto)
+
+    other_schema = sch.from_feature_spec(
+        {'fixed_int': tf.io.FixedLenFeature([], tf.int64)})
+    other_schema.as_feature_spec()
+    # Restoring the state of a schema invalidates its cached feature spec.
+    other_schema.__setstate__(schema.__getstate__())
+    self.assertEqual(test_common.test_feature_spec,
+                     other_schema.as_feature_spec())
+    unpickled_schema = pickle.loads(pickle.dumps(schema))
+    self.assertEqual(test_common.test_feature_spec,
+                     unpickled_schema.as_feature_spec())
+    self.assertEqual(schema.domains(), unpickled_schema.domains())
+
   def test_feature_spec_unsupported_dtype(self):
     with self.assertRaisesRegexp(ValueError, 'invalid dtype'):
       sch.Schema({